@@ -1,92 +1,137 @@
 from flask import Flask, request, jsonify # type: ignore
 from flask_cors import CORS # type: ignore
-import pickle
+import itertools
+import joblib
+import os
 import numpy as np # type: ignore
 
+from candidate_grid import candidate_points, is_spatial
+from demand_table import DemandTable, high_index, model_intensities
+from encoders import CompiledEncoder
+from flat_forest import load_forest
+from road_network import add_routing_endpoints, load_network
+
 # -----------------------------
 # Load model + encoders
 # -----------------------------
-MODEL_PATH = "C:\Pragun\Project\Final project\Simulation part\Last try\Trained models\landmark_demand_predictor.pkl"
-LE_DAY_PATH = "C:\Pragun\Project\Final project\Simulation part\Last try\Trained models\label_encoder_day.pkl"
-LE_TIME_PATH = "C:\Pragun\Project\Final project\Simulation part\Last try\Trained models\label_encoder_time.pkl"
-LE_TYPE_PATH = "C:\Pragun\Project\Final project\Simulation part\Last try\Trained models\label_encoder_type.pkl"         # optional if you use "type"
-LE_LABEL_PATH = "C:\Pragun\Project\Final project\Simulation part\Last try\Trained models\label_encoder_label.pkl"        # encodes y (e.g., High/Low)
-
-model = pickle.load(open(MODEL_PATH, "rb"))
-le_day = pickle.load(open(LE_DAY_PATH, "rb"))
-le_time = pickle.load(open(LE_TIME_PATH, "rb"))
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "Trained models")
+
+MODEL_PATH = os.path.join(MODEL_DIR, "landmark_demand_predictor.pkl")
+LE_DAY_PATH = os.path.join(MODEL_DIR, "label_encoder_day.pkl")
+LE_TIME_PATH = os.path.join(MODEL_DIR, "label_encoder_time.pkl")
+LE_TYPE_PATH = os.path.join(MODEL_DIR, "label_encoder_type.pkl")         # optional if you use "type"
+LE_LABEL_PATH = os.path.join(MODEL_DIR, "label_encoder_label.pkl")        # encodes y (e.g., High/Low)
+
+# Flattened copy of the forest (flat_forest.py): same probabilities as the
+# sklearn model, without its per-call overhead
+model = load_forest(MODEL_PATH)
+# Encoders are written with joblib (see retrain_endcoders.py), which plain pickle can't read
+le_day = joblib.load(LE_DAY_PATH)
+le_time = joblib.load(LE_TIME_PATH)
 # If you didn’t train with "type", set le_type = None and handle below
 try:
-    le_type = pickle.load(open(LE_TYPE_PATH, "rb"))
+    le_type = joblib.load(LE_TYPE_PATH)
 except Exception:
     le_type = None
-le_label = pickle.load(open(LE_LABEL_PATH, "rb"))
+le_label = joblib.load(LE_LABEL_PATH)
 
-# Which label index is "High" (if it exists)?
-try:
-    HIGH_IDX = int(np.where(le_label.classes_ == "High")[0][0])
-except Exception:
-    # If you used numeric labels, fallback to the max-prob class
-    HIGH_IDX = None
+# Unseen values default to the first class to avoid errors
+enc_day = CompiledEncoder(le_day)
+enc_time = CompiledEncoder(le_time)
+enc_type = CompiledEncoder(le_type)
 
-# -----------------------------
-# Build candidate grid (NYC area: Manhattan/Brooklyn/Queens)
-# -----------------------------
-LAT_MIN, LAT_MAX = 40.64, 40.82
-LON_MIN, LON_MAX = -74.05, -73.85
-# 25 x 25 = 625 candidates (tweak as you like)
-GRID_STEPS = 25
-
-def candidate_points():
-    lats = np.linspace(LAT_MIN, LAT_MAX, GRID_STEPS)
-    lons = np.linspace(LON_MIN, LON_MAX, GRID_STEPS)
-    pts = []
-    for la in lats:
-        for lo in lons:
-            # quick-and-dirty water masks (avoid obvious rivers/bay)
-            if lo < -74.02:      # Hudson
-                continue
-            if -73.99 < lo < -73.94:  # East River band
-                continue
-            if la < 40.68 and lo < -74.0:  # Upper Bay
-                continue
-            pts.append((float(la), float(lo)))
-    return pts
+# Which label index is "High" (if it exists)? If you used numeric labels,
+# None falls back to the max-prob class
+HIGH_IDX = high_index(le_label)
 
 CANDIDATES = candidate_points()
+CANDIDATE_ARRAY = np.array(CANDIDATES, dtype=float).reshape(-1, 2)
 
-def safe_transform(le, values):
-    """
-    If a value is unseen, default to the first class to avoid errors.
-    """
-    if le is None:
-        # If encoder doesn't exist (e.g., not trained with 'type'), return zeros
-        return np.zeros(len(values), dtype=int)
-    out = []
-    classes = set(le.classes_)
-    fallback = int(le.transform([le.classes_[0]])[0])
-    for v in values:
-        if v in classes:
-            out.append(int(le.transform([v])[0]))
-        else:
-            out.append(fallback)
-    return np.array(out, dtype=int)
+# Spatial models (Models.py with lat/lon data) score each candidate cell.
+# Temporal-only models give every candidate the same row, so that row is
+# evaluated once and broadcast.
+SPATIAL = is_spatial(model)
+
+# Every (day, time, type) answer, precomputed and memory-mapped from disk.
+# A retrain (new model and encoder pickles) is picked up while serving.
+# Falls back to live model evaluation if the table can't be built.
+try:
+    demand_table = DemandTable(MODEL_PATH, enc_day, enc_time, enc_type, HIGH_IDX,
+                               candidates=CANDIDATE_ARRAY, model=model,
+                               encoder_paths={"day": LE_DAY_PATH, "time": LE_TIME_PATH,
+                                              "type": LE_TYPE_PATH, "label": LE_LABEL_PATH})
+except Exception:
+    demand_table = None
 
 def build_feature_matrix(day, time, typ, n_rows):
-    day_enc = safe_transform(le_day, [day] * n_rows)
-    time_enc = safe_transform(le_time, [time] * n_rows)
-    type_enc = safe_transform(le_type, [typ] * n_rows)  # zeros if le_type is None
+    day_enc = enc_day.full(day, n_rows)
+    time_enc = enc_time.full(time, n_rows)
+    type_enc = enc_type.full(typ, n_rows)  # zeros if le_type is None
 
     # Must match your training feature order:
     X = np.column_stack([day_enc, time_enc, type_enc])
+    if SPATIAL:
+        X = np.column_stack([X, CANDIDATE_ARRAY[:n_rows]])
     return X
 
+def live_intensities(day, time, typ):
+    n_rows = len(CANDIDATES) if SPATIAL else 1
+    X = build_feature_matrix(day, time, typ, n_rows)
+
+    # Predict probabilities (works best if your classifier supports predict_proba)
+    try:
+        proba = model.predict_proba(X)  # shape: [n_samples, n_classes]
+        if HIGH_IDX is not None and HIGH_IDX < proba.shape[1]:
+            intensities = proba[:, HIGH_IDX]
+        else:
+            # If no explicit HIGH label, take max class prob
+            intensities = proba.max(axis=1)
+    except Exception:
+        # Fall back to decision_function or raw predict (less ideal)
+        try:
+            score = model.decision_function(X).astype(float)
+            # min-max normalize
+            intensities = (score - score.min()) / (score.ptp() + 1e-9)
+        except Exception:
+            # Last resort: uniform intensity
+            intensities = np.ones(n_rows, dtype=float)
+    return np.broadcast_to(intensities, (len(CANDIDATES),))
+
+def batch_intensities(days, times, types):
+    """
+    Intensity per (day, time, type) query and candidate, shape
+    (n_rows, n_cells) with n_cells == 1 for temporal-only models. Duplicate
+    rows are only evaluated once, in a single predict_proba call.
+    """
+    if demand_table is not None:
+        demand_table.maybe_refresh()
+        # Encoded with the table's own encoders, which follow a retrain
+        return demand_table.lookup_many(days, times, types)
+    codes = np.column_stack([enc_day.encode(days), enc_time.encode(times), enc_type.encode(types)])
+    uniq, inverse = np.unique(codes, axis=0, return_inverse=True)
+    X = uniq
+    if SPATIAL:
+        X = np.column_stack([np.repeat(uniq, len(CANDIDATE_ARRAY), axis=0),
+                             np.tile(CANDIDATE_ARRAY, (len(uniq), 1))])
+    try:
+        vals = model_intensities(model, X, HIGH_IDX).reshape(len(uniq), -1)
+    except Exception:
+        vals = np.ones((len(uniq), 1), dtype=float)
+    return vals[inverse.ravel()]
+
 # -----------------------------
 # Flask app
 # -----------------------------
 app = Flask(__name__)
 CORS(app)  # allow local file frontend to call the API
 
+# /nearest, /route and /route/batch for the map front ends, from a local road
+# graph (road_network.py) instead of the public OSRM server. An unset,
+# missing or broken $ROAD_NETWORK_PATH only disables those endpoints.
+road_network = load_network()
+add_routing_endpoints(app, road_network)
+
 @app.route("/predict", methods=["POST"])
 def predict():
     """
@@ -103,33 +148,23 @@ def predict():
     }
     """
     payload = request.get_json(force=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "request body must be a JSON object"}), 400
     day = payload.get("day", "Monday")
     time = payload.get("time", "09:00")
     typ = payload.get("type", "General")
-    top_k = int(payload.get("top_k", 6))
+    top_k = _top_k(payload)
+    if top_k is None:
+        return jsonify({"error": "top_k must be an integer"}), 400
 
     if not CANDIDATES:
         return jsonify({"demands": []})
 
-    X = build_feature_matrix(day, time, typ, len(CANDIDATES))
-
-    # Predict probabilities (works best if your classifier supports predict_proba)
-    try:
-        proba = model.predict_proba(X)  # shape: [n_samples, n_classes]
-        if HIGH_IDX is not None and HIGH_IDX < proba.shape[1]:
-            intensities = proba[:, HIGH_IDX]
-        else:
-            # If no explicit HIGH label, take max class prob
-            intensities = proba.max(axis=1)
-    except Exception:
-        # Fall back to decision_function or raw predict (less ideal)
-        try:
-            score = model.decision_function(X).astype(float)
-            # min-max normalize
-            intensities = (score - score.min()) / (score.ptp() + 1e-9)
-        except Exception:
-            # Last resort: uniform intensity
-            intensities = np.ones(len(CANDIDATES), dtype=float)
+    if demand_table is not None:
+        demand_table.maybe_refresh()  # picks up a retrained model pickle
+        intensities = np.broadcast_to(demand_table.lookup(day, time, typ), (len(CANDIDATES),))
+    else:
+        intensities = live_intensities(day, time, typ)
 
     # pick top_k
     idx = np.argsort(intensities)[-top_k:][::-1]
@@ -144,6 +179,85 @@ def predict():
 
     return jsonify({"demands": out})
 
+def _top_k(payload):
+    """Requested top_k clamped to 1..len(CANDIDATES); None if it isn't an integer."""
+    try:
+        top_k = int(payload.get("top_k", 6))
+    except (TypeError, ValueError):
+        return None
+    return max(1, min(top_k, len(CANDIDATES)))
+
+# Guard against a single request asking for an unbounded product
+MAX_BATCH_QUERIES = 20000
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Request JSON, either an explicit list:
+    {
+      "queries": [{"day": "Monday", "time": "36", "type": "Metro"}, ...],
+      "top_k": 6
+    }
+    or a cartesian product (missing keys use the /predict defaults):
+    {
+      "product": {"day": ["Monday", ...], "time": ["0", ..., "95"], "type": ["Metro", ...]},
+      "top_k": 6
+    }
+    Response (columnar, one entry per query in request order):
+    {
+      "day": [...], "time": [...], "type": [...],
+      "candidates": {"lat": [...], "lng": [...]},
+      "top_idx": [[...], ...],      # indices into candidates, best first
+      "intensity": [[...], ...]
+    }
+    top_k is clamped to 1..number of candidates. Axes that aren't lists,
+    queries that aren't objects and a non-integer top_k answer 400.
+    """
+    payload = request.get_json(force=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "request body must be a JSON object"}), 400
+    top_k = _top_k(payload)
+    if top_k is None:
+        return jsonify({"error": "top_k must be an integer"}), 400
+
+    if "product" in payload:
+        spec = payload["product"] or {}
+        if not isinstance(spec, dict):
+            return jsonify({"error": "product must be an object of lists"}), 400
+        axes = [spec.get("day", ["Monday"]), spec.get("time", ["09:00"]), spec.get("type", ["General"])]
+        # A bare string would otherwise be taken one character at a time
+        if not all(isinstance(a, list) for a in axes):
+            return jsonify({"error": "product day, time and type must be lists"}), 400
+        n_queries = int(np.prod([len(a) for a in axes]))
+        if n_queries > MAX_BATCH_QUERIES:
+            return jsonify({"error": f"batch too large ({n_queries} > {MAX_BATCH_QUERIES})"}), 400
+        queries = list(itertools.product(*axes))
+    else:
+        raw = payload.get("queries", [])
+        if not isinstance(raw, list) or not all(isinstance(q, dict) for q in raw):
+            return jsonify({"error": "queries must be a list of objects"}), 400
+        if len(raw) > MAX_BATCH_QUERIES:
+            return jsonify({"error": f"batch too large ({len(raw)} > {MAX_BATCH_QUERIES})"}), 400
+        queries = [(q.get("day", "Monday"), q.get("time", "09:00"), q.get("type", "General")) for q in raw]
+
+    days = [q[0] for q in queries]
+    times = [q[1] for q in queries]
+    types = [q[2] for q in queries]
+    out = {
+        "day": days, "time": times, "type": types,
+        "candidates": {"lat": [la for la, _ in CANDIDATES], "lng": [lo for _, lo in CANDIDATES]},
+        "top_idx": [], "intensity": [],
+    }
+    if not queries or not CANDIDATES:
+        return jsonify(out)
+
+    # Temporal-only models broadcast one value per query; same top_k rule as /predict
+    intensities = np.broadcast_to(batch_intensities(days, times, types), (len(queries), len(CANDIDATES)))
+    idx = np.argsort(intensities, axis=1)[:, -top_k:][:, ::-1]
+    out["top_idx"] = idx.tolist()
+    out["intensity"] = np.take_along_axis(intensities, idx, axis=1).tolist()
+    return jsonify(out)
+
 if __name__ == "__main__":
     # Run: python app.py
     app.run(host="127.0.0.1", port=5000, debug=True)
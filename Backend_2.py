@@ -1,66 +1,234 @@
 # backend.py
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask_cors import CORS
 import joblib
+import json
+import math
 import random
 import os
+import threading
+import time
+import numpy as np
+from scipy.spatial import cKDTree
+
+from candidate_grid import candidate_points
+from encoders import CompiledEncoder, load_encoder
+from flat_forest import load_forest
+from demand_table import load_label_schedule
+from road_network import add_routing_endpoints, load_network
+from sim_clock import SharedClock, TICKS_PER_DAY, keep_on_start, split_tick
 
 app = Flask(__name__)
+CORS(app)  # the front ends are opened as local files
 
 # Base path (current file's directory)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Load trained model + encoders using relative paths
-model = joblib.load(open(os.path.join(BASE_DIR, "Trained models", "landmark_demand_predictor.pkl"), "rb"))
-le_day = joblib.load(open(os.path.join(BASE_DIR, "Trained models", "label_encoder_day.pkl"), "rb"))
-le_time = joblib.load(open(os.path.join(BASE_DIR, "Trained models", "label_encoder_time.pkl"), "rb"))
-le_type = joblib.load(open(os.path.join(BASE_DIR, "Trained models", "label_encoder_type.pkl"), "rb"))
-
-# Simulation clock
-current_day_index = 0  # 0=Monday
-current_time_index = 0  # each tick = 15 mins, 0 = 00:00
+MODEL_DIR = os.path.join(BASE_DIR, "Trained models")
+MODEL_PATH = os.path.join(MODEL_DIR, "landmark_demand_predictor.pkl")
+LE_DAY_PATH = os.path.join(MODEL_DIR, "label_encoder_day.pkl")
+LE_TIME_PATH = os.path.join(MODEL_DIR, "label_encoder_time.pkl")
+LE_TYPE_PATH = os.path.join(MODEL_DIR, "label_encoder_type.pkl")
+
+# MODEL_LOAD_MODE=mmap (default): the flattened forest (flat_forest.py) and
+# the encoder classes are memory-mapped from their .npy exports, so every
+# gunicorn worker shares one physical copy and sklearn is never imported.
+# MODEL_LOAD_MODE=pickle: each worker unpickles its own sklearn objects.
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "mmap")
+
+# Encoders raise on unseen values, like LabelEncoder.transform
+if MODEL_LOAD_MODE == "pickle":
+    model = joblib.load(open(MODEL_PATH, "rb"))
+    enc_day = CompiledEncoder(joblib.load(open(LE_DAY_PATH, "rb")), unseen="error")
+    enc_time = CompiledEncoder(joblib.load(open(LE_TIME_PATH, "rb")), unseen="error")
+    enc_type = CompiledEncoder(joblib.load(open(LE_TYPE_PATH, "rb")), unseen="error")
+else:
+    model = load_forest(MODEL_PATH)
+    enc_day = load_encoder(LE_DAY_PATH, unseen="error")
+    enc_time = load_encoder(LE_TIME_PATH, unseen="error")
+    enc_type = load_encoder(LE_TYPE_PATH, unseen="error")
+
+# Simulation clock, shared by every worker/thread (see sim_clock.py)
+# each tick = 15 mins, tick 0 = Monday 00:00; starting the server resets it
+# unless SIM_CLOCK_KEEP=1
+clock = SharedClock(reset=not keep_on_start())
 days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+LANDMARK_TYPES = ["Metro", "Stadium", "Mall", "Office", "Temple"]
+TYPE_INDEX = {t: i for i, t in enumerate(LANDMARK_TYPES)}
+
+# Every label the clock can ask for, [day_index, time_index, type_index, cell]
+# in the order above. The model-code table is cached next to the model (see
+# demand_table.py) and reordered once here. A spatial model (Models.py with
+# lat/lon data) has one label per candidate cell and each event is labelled
+# from the cell nearest to it; a temporal-only model has a single cell.
+_label_table, SCHEDULE_CELLS = load_label_schedule(MODEL_PATH, enc_day, enc_time, enc_type,
+                                                   model=model, candidates=candidate_points())
+WEEK_SCHEDULE = np.asarray(_label_table[np.ix_(
+    enc_day.encode(days),
+    enc_time.encode([str(i) for i in range(TICKS_PER_DAY)]),
+    enc_type.encode(LANDMARK_TYPES),
+    np.arange(_label_table.shape[3]),
+)])
+_cell_tree = cKDTree(SCHEDULE_CELLS) if SCHEDULE_CELLS is not None else None
+
+# /nearest, /route and /route/batch for the map front ends (road_network.py),
+# as on Backend.py. An unset, missing or broken $ROAD_NETWORK_PATH only
+# disables those.
+road_network = load_network()
+add_routing_endpoints(app, road_network)
 
 # Root route (for Render health check / base test)
 @app.route("/")
 def home():
     return jsonify({"message": "Taxi Swarm Backend is running!"})
 
-@app.route("/next_demand")
-def next_demand():
-    global current_day_index, current_time_index
-
-    # Pick a random landmark type
-    landmark_types = ["Metro", "Stadium", "Mall", "Office", "Temple"]
-    landmark_type = random.choice(landmark_types)
-
-    # Encode features
-    X = [[
-        le_day.transform([days[current_day_index]])[0],
-        le_time.transform([str(current_time_index)])[0],
-        le_type.transform([landmark_type])[0]
-    ]]
-
-    # Predict demand probability (for simplicity we use prediction as strength)
-    demand_label = model.predict(X)[0]
-
-    # Generate random coords inside NYC bounding box
-    lat = 40.60 + random.random() * 0.25
-    lng = -74.05 + random.random() * 0.25
-
-    # Advance time
-    current_time_index += 1
-    if current_time_index >= 96:  # 24h * 4 ticks per hour
-        current_time_index = 0
-        current_day_index = (current_day_index + 1) % 7
-
-    return jsonify({
-        "day": days[current_day_index],
-        "time_index": current_time_index,
+def demand_events(start_tick, n):
+    """
+    Demand events for ticks [start_tick, start_tick + n), labelled from the
+    precomputed week schedule (no model call).
+    """
+    # Pick a random landmark type and random coords inside NYC bounding box
+    draws = []
+    for _ in range(n):
+        landmark_type = random.choice(LANDMARK_TYPES)
+        lat = 40.60 + random.random() * 0.25
+        lng = -74.05 + random.random() * 0.25
+        draws.append((landmark_type, lat, lng))
+
+    ticks = np.arange(start_tick, start_tick + n)
+    day_idx, time_idx = split_tick(ticks)
+
+    # Predicted demand label (for simplicity we use prediction as strength)
+    type_idx = [TYPE_INDEX[d[0]] for d in draws]
+    if _cell_tree is None:
+        cell_idx = 0
+    else:
+        _, cell_idx = _cell_tree.query([(lat, lng) for _, lat, lng in draws])
+    labels = WEEK_SCHEDULE[day_idx, time_idx, type_idx, cell_idx]
+
+    # Each event reports the clock after its tick, as next_demand always has
+    next_day_idx, next_time_idx = split_tick(ticks + 1)
+    return [{
+        "tick": int(tick),
+        "day": days[next_day_idx[i]],
+        "time_index": int(next_time_idx[i]),
         "landmark_type": landmark_type,
-        "demand_label": int(demand_label),
+        "demand_label": int(labels[i]),
         "lat": lat,
         "lng": lng
-    })
+    } for i, (tick, (landmark_type, lat, lng)) in enumerate(zip(ticks, draws))]
+
+@app.route("/next_demand")
+def next_demand():
+    # Claim this request's tick; concurrent requests never share one
+    return jsonify(demand_events(clock.advance(), 1)[0])
+
+# Every open /stream_demand response holds one gthread thread (Procfile:
+# --threads 8) for as long as its client stays connected. At most
+# MAX_DEMAND_STREAMS run per worker, so /next_demand, /schedule and routing
+# always have threads left; further streams get a 503.
+MAX_DEMAND_STREAMS = int(os.environ.get("MAX_DEMAND_STREAMS", 4))
+_stream_slots = threading.BoundedSemaphore(MAX_DEMAND_STREAMS)
+
+@app.route("/stream_demand")
+def stream_demand():
+    """
+    Push demand ticks over one long-lived response instead of one poll per tick.
+
+    A stream plays its own slice of the week: it starts at the shared clock's
+    current tick (or right after Last-Event-ID when an EventSource
+    reconnects) and counts on from there without advancing the shared clock.
+    Ticks a client never receives are not lost to anyone else, and a fast
+    stream doesn't push /next_demand or other streams ahead.
+
+    Query params:
+      rate    ticks per second (default 4, 0 = as fast as possible)
+      batch   ticks labelled per schedule lookup
+              (default: one second's worth rounded up, or 256 at rate 0;
+              max 256)
+      count   stop after this many ticks (default: stream forever)
+      format  "sse" (default, for EventSource) or "ndjson"
+    503 when MAX_DEMAND_STREAMS streams are already open on this worker.
+    """
+    rate = request.args.get("rate", 4.0, type=float)
+    count = request.args.get("count", type=int)
+    fmt = request.args.get("format", "sse")
+    batch = request.args.get("batch", type=int) or (max(1, math.ceil(rate)) if rate > 0 else 256)
+    batch = max(1, min(batch, 256))
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    start = clock.peek() if last_id is None else last_id + 1
+
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({"error": f"too many demand streams (max {MAX_DEMAND_STREAMS})"}), 503
+
+    def generate():
+        sent = 0
+        next_at = time.monotonic()
+        while count is None or sent < count:
+            n = batch if count is None else min(batch, count - sent)
+            for event in demand_events(start + sent, n):
+                if rate > 0:
+                    delay = next_at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_at = max(next_at, time.monotonic() - 1.0) + 1.0 / rate
+                payload = json.dumps(event)
+                if fmt == "ndjson":
+                    yield payload + "\n"
+                else:
+                    yield f"id: {event['tick']}\ndata: {payload}\n\n"
+                sent += 1
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "text/event-stream"
+    response = Response(stream_with_context(generate()), mimetype=mimetype,
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Runs when the stream ends or the client goes away, started or not
+    response.call_on_close(_stream_slots.release)
+    return response
+
+@app.route("/schedule")
+def schedule():
+    """
+    Slice of the precomputed week schedule, no model calls.
+
+    Query params:
+      day   day name or index 0-6 (0 = Monday); omit for the whole week
+      from  first time index, inclusive (default 0)
+      to    last time index, exclusive (default 96)
+    Response:
+    {
+      "days": ["Monday"], "from": 0, "to": 96, "types": ["Metro", ...],
+      "labels": [[[label per type] per time index] per day]
+    }
+    For a spatial model each label is a list with one entry per cell, and the
+    response adds "cells": [[lat, lng], ...].
+    """
+    day = request.args.get("day")
+    if day is None:
+        day_idx = list(range(len(days)))
+    elif day in days:
+        day_idx = [days.index(day)]
+    elif day.isdigit() and int(day) < len(days):
+        day_idx = [int(day)]
+    else:
+        return jsonify({"error": f"unknown day {day!r}"}), 400
+    start = max(0, min(request.args.get("from", 0, type=int), TICKS_PER_DAY))
+    stop = max(start, min(request.args.get("to", TICKS_PER_DAY, type=int), TICKS_PER_DAY))
+
+    labels = WEEK_SCHEDULE[day_idx, start:stop]
+    out = {
+        "days": [days[d] for d in day_idx],
+        "from": start,
+        "to": stop,
+        "types": LANDMARK_TYPES,
+    }
+    if SCHEDULE_CELLS is None:
+        out["labels"] = labels[..., 0].tolist()
+    else:
+        out["labels"] = labels.tolist()
+        out["cells"] = SCHEDULE_CELLS.tolist()
+    return jsonify(out)
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
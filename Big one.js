@@ -14,7 +14,8 @@ const NYC_CENTER = [40.7580, -73.9855];
 const N_TAXIS = 3;
 const TRAIL_LENGTH = 10;
 const STEP_SIZE = 0.0005; 
-const OSRM_URL = "https://router.project-osrm.org/route/v1/driving/";
+const ROUTER_URL = "http://127.0.0.1:5000";  // Backend.py or Backend_2.py
+const ROUTE_STEP_M = 20;  // metres between route points (taxis move one per frame)
 
 // Random point generator in NYC
 function randomPoint() {
@@ -31,20 +32,27 @@ function interpolatePoints(start,end,steps){
     return points;
 }
 
-// Fetch route from OSRM
-async function getOSRMRoute(start, end) {
-    const url = `${OSRM_URL}${start[1]},${start[0]};${end[1]},${end[0]}?overview=full&geometries=geojson`;
+// Routes from the local routing service (road_network.py behind Backend.py):
+// all legs in one request, straight lines for any it can't route
+async function getRoutes(legs) {
     try {
-        const response = await fetch(url);
+        const response = await fetch(`${ROUTER_URL}/route/batch`, {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({legs: legs.map(([from, to]) => ({from, to})), step_m: ROUTE_STEP_M})
+        });
         const data = await response.json();
-        const coords = data.routes[0].geometry.coordinates;
-        return coords.map(c => [c[1], c[0]]); 
+        return data.routes.map((r, i) => r.coordinates.length ? r.coordinates : interpolatePoints(legs[i][0], legs[i][1], 50));
     } catch (e) {
-        console.error("OSRM routing failed, fallback to straight line:", e);
-        return interpolatePoints(start, end, 50);
+        console.error("Routing failed, fallback to straight line:", e);
+        return legs.map(([start, end]) => interpolatePoints(start, end, 50));
     }
 }
 
+async function getRoute(start, end) {
+    return (await getRoutes([[start, end]]))[0];
+}
+
 // Taxi class
 class Taxi {
     constructor(start){
@@ -91,11 +99,9 @@ let drops = [];
 
 // Assign taxis to demand
 async function assignTaxisToDemand(){
-    for(let t of taxis){
-        t.target=demand.slice();
-        const route=await getOSRMRoute(t.pos,t.target);
-        t.setRoute(route);
-    }
+    taxis.forEach(t => { t.target=demand.slice(); });
+    const routes=await getRoutes(taxis.map(t => [t.pos, t.target]));
+    taxis.forEach((t, i) => t.setRoute(routes[i]));
 }
 
 // Assign individual drop-offs for a taxi
@@ -110,7 +116,7 @@ async function assignDropOff(taxi){
 
     drops.push({taxi: taxi, point: dropPoint, marker: marker});
     taxi.state = "to_drop";
-    const route = await getOSRMRoute(taxi.pos, dropPoint);
+    const route = await getRoute(taxi.pos, dropPoint);
     taxi.setRoute(route);
 }
 
@@ -1,13 +1,20 @@
+import numpy as np
 import pandas as pd
+from scipy.spatial import cKDTree
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
 import pickle
 
+from candidate_grid import candidate_points, TEMPORAL_FEATURES, SPATIAL_FEATURES
+from flat_forest import export
+
 # ----------------------------
 # 1. Load dataset
 # ----------------------------
 df = pd.read_csv("C:\Pragun\Project\Final project\Simulation part\Last try\orange_ready_colorcode.csv")  
 # Ensure it has columns: "day", "time", "type", "demand_label"
+# Optional "lat" + "lon" (or "lng") columns make the model spatially aware
+df = df.rename(columns={"lng": "lon"})
 
 # ----------------------------
 # 2. Initialize encoders
@@ -25,10 +32,27 @@ df['time_enc'] = le_time.fit_transform(df['time'])
 df['type_enc'] = le_type.fit_transform(df['type'])
 df['label_enc'] = le_label.fit_transform(df['demand_label'])
 
+# ----------------------------
+# 3b. Snap records to the candidate grid
+# ----------------------------
+# Backend.py scores the same candidate cells, so training on each record's
+# nearest cell (rather than its raw position) makes every /predict row one
+# the forest has actually seen.
+SPATIAL = {"lat", "lon"} <= set(df.columns)
+if SPATIAL:
+    cells = np.array(candidate_points())
+    _, nearest = cKDTree(cells).query(df[["lat", "lon"]].to_numpy())
+    df["lat"] = cells[nearest, 0]
+    df["lon"] = cells[nearest, 1]
+    features = SPATIAL_FEATURES
+else:
+    print("⚠️ No lat/lon columns: training a temporal-only model (same intensity for every cell)")
+    features = TEMPORAL_FEATURES
+
 # ----------------------------
 # 4. Train the model
 # ----------------------------
-X = df[['day_enc', 'time_enc', 'type_enc']]
+X = df[features]
 y = df['label_enc']
 
 model = RandomForestClassifier(n_estimators=200, random_state=42)
@@ -43,4 +67,7 @@ pickle.dump(le_time, open("label_encoder_time.pkl", "wb"))
 pickle.dump(le_type, open("label_encoder_type.pkl", "wb"))
 pickle.dump(le_label, open("label_encoder_label.pkl", "wb"))
 
+# Flattened node arrays for fast in-process inference (see flat_forest.py)
+export("landmark_demand_predictor.pkl", model)
+
 print("✅ Model and encoders saved successfully!")
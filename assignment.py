@@ -0,0 +1,327 @@
+import heapq
+
+import numpy as np # type: ignore
+
+try:
+    from scipy.optimize import linear_sum_assignment # type: ignore
+except ImportError:  # only needed for mode="optimal"
+    linear_sum_assignment = None
+
+# ---------------- DEMAND INDEX ----------------
+# Positive-demand cells kept up to date as demand_map changes, so assignment
+# never rescans the whole grid.
+#  - a lazy max-heap of (-demand, x, y) gives cells in the same order the old
+#    full sort did (highest demand first, ties in x-then-y order)
+#  - coarse spatial buckets answer "nearest demand to this taxi"
+
+BUCKET = 8  # bucket side in cells
+
+
+class DemandIndex:
+    def __init__(self):
+        self.values = {}   # (x, y) -> demand, positive cells only
+        self._heap = []
+        self.buckets = {}  # (bx, by) -> set of (x, y)
+        # Bounding box of buckets ever used (never shrinks), caps the ring search
+        self._extent = (0, 0, -1, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+    def set(self, x, y, value):
+        """Record demand_map[x, y] == value."""
+        cell = (int(x), int(y))
+        value = float(value)
+        old = self.values.get(cell)
+        if value > 0:
+            if old == value:
+                return
+            self.values[cell] = value
+            heapq.heappush(self._heap, (-value, cell[0], cell[1]))
+            if old is None:
+                key = (cell[0] // BUCKET, cell[1] // BUCKET)
+                self.buckets.setdefault(key, set()).add(cell)
+                lo_x, lo_y, hi_x, hi_y = self._extent
+                if hi_x < lo_x:
+                    self._extent = (key[0], key[1], key[0], key[1])
+                else:
+                    self._extent = (min(lo_x, key[0]), min(lo_y, key[1]),
+                                    max(hi_x, key[0]), max(hi_y, key[1]))
+        elif old is not None:
+            del self.values[cell]
+            key = (cell[0] // BUCKET, cell[1] // BUCKET)
+            bucket = self.buckets[key]
+            bucket.discard(cell)
+            if not bucket:
+                del self.buckets[key]
+        # Stale heap entries pile up as values change; compact now and then
+        if len(self._heap) > 4 * len(self.values) + 64:
+            self._heap = [(-v, x, y) for (x, y), v in self.values.items()]
+            heapq.heapify(self._heap)
+
+    def set_many(self, xs, ys, values):
+        for x, y, v in zip(xs, ys, values):
+            self.set(x, y, v)
+
+    def rebuild(self, demand_map):
+        """Full resync from the array (after a reset or restore)."""
+        self.values.clear()
+        self._heap = []
+        self.buckets.clear()
+        self._extent = (0, 0, -1, -1)
+        xs, ys = np.nonzero(demand_map > 0)
+        self.set_many(xs, ys, demand_map[xs, ys])
+
+    def ordered(self):
+        """
+        Yield positive cells highest demand first (ties by x, then y), lazily.
+        Popped entries are pushed back when the generator is closed.
+        """
+        popped = []
+        seen = set()
+        try:
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                neg, x, y = entry
+                cell = (x, y)
+                if self.values.get(cell) != -neg or cell in seen:
+                    continue  # stale or duplicate entry: drop it
+                seen.add(cell)
+                popped.append(entry)
+                yield cell, -neg
+        finally:
+            for entry in popped:
+                heapq.heappush(self._heap, entry)
+
+    def top(self, m):
+        gen = self.ordered()
+        out = []
+        for item in gen:
+            out.append(item)
+            if len(out) >= m:
+                break
+        gen.close()
+        return out
+
+    def nearest(self, x, y, exclude, skip=None, buckets=None):
+        """
+        Closest positive cell by Manhattan distance (highest demand on ties)
+        that is not in exclude and is not skip, or None. buckets: search this
+        {bucket: cells} subset of self.buckets instead.
+        """
+        if not self.values:
+            return None
+        if buckets is None:
+            buckets = self.buckets
+        bx, by = x // BUCKET, y // BUCKET
+        best = None
+        best_key = None
+        ring = 0
+        lo_x, lo_y, hi_x, hi_y = self._extent
+        max_ring = max(bx - lo_x, hi_x - bx, by - lo_y, hi_y - by)
+        while ring <= max_ring:
+            # Cells in ring r are at least (r - 1) * BUCKET + 1 away
+            if best_key is not None and best_key[0] <= (ring - 1) * BUCKET:
+                break
+            if len(buckets) <= 8 * ring:
+                # Fewer buckets left than keys in this ring: check the rest directly
+                keys = [k for k in buckets if max(abs(k[0] - bx), abs(k[1] - by)) >= ring]
+                ring = max_ring
+            elif ring == 0:
+                keys = [(bx, by)]
+            else:
+                keys = [(kx, ky) for kx in range(bx - ring, bx + ring + 1)
+                        for ky in (range(by - ring, by + ring + 1) if abs(kx - bx) == ring
+                                   else (by - ring, by + ring))]
+            for k in keys:
+                for cell in buckets.get(k, ()):
+                    if cell in exclude or cell == skip:
+                        continue
+                    key = (abs(cell[0] - x) + abs(cell[1] - y), -self.values[cell], cell)
+                    if best_key is None or key < best_key:
+                        best, best_key = cell, key
+            ring += 1
+        return best
+
+
+# ---------------- ASSIGNMENT ENGINE ----------------
+class AssignmentEngine:
+    """
+    Matches IDLE taxis to demand cells.
+
+    mode="greedy"   each idle taxi, in fleet order, takes the highest-demand
+                    cell nobody is heading to (the original behaviour)
+    mode="nearest"  each idle taxi takes the closest such cell
+    mode="optimal"  one minimum-cost matching of all idle taxis against the
+                    top demand cells (cost = road distance - demand_weight *
+                    demand); needs scipy
+
+    Taxis left without demand roam to a random free road cell, drawn from
+    rng (np.random or a RandomState) exactly as before.
+    """
+
+    def __init__(self, roads, mode="greedy", router=None, demand_weight=1.0, rng=None):
+        self.roads = roads
+        self.mode = mode
+        self.router = router
+        self.demand_weight = demand_weight
+        self.rng = np.random if rng is None else rng
+        self.index = DemandIndex()
+
+    def assign(self, taxis):
+        if hasattr(taxis, "busy_destinations"):
+            # A fleet.Fleet answers both from its arrays
+            assigned_destinations = taxis.busy_destinations()
+            idle = taxis.idle_taxis()
+        else:
+            assigned_destinations = set(t.destination for t in taxis if t.state!="IDLE")
+            idle = [t for t in taxis if t.state=="IDLE"]
+        if not idle:
+            return []
+
+        greedy = nearest = None
+        if self.mode == "optimal":
+            # Batch: match everyone first, then let the leftovers roam
+            targets = iter(self._optimal(idle, assigned_destinations) if len(self.index)
+                           else [None] * len(idle))
+            pick_for = lambda taxi: next(targets)
+        elif self.mode == "nearest":
+            nearest = _NearestPicker(self.index, assigned_destinations)
+            pick_for = nearest.pick
+        else:
+            greedy = _GreedyPicker(self.index, assigned_destinations)
+            pick_for = greedy.pick
+
+        assignments = []
+        try:
+            # One taxi at a time, so a roamer's random cell is off limits to
+            # the taxis after it, exactly as in the original loop
+            for taxi in idle:
+                target = pick_for(taxi)
+                if target is not None:
+                    assigned_destinations.add(target)
+                    assignments.append((target, taxi, "EN_ROUTE"))
+                else:
+                    cell = self._roam(assigned_destinations)
+                    if nearest is not None:
+                        nearest.claim(cell)
+                    assignments.append((cell, taxi, "ROAMING"))
+        finally:
+            if greedy is not None:
+                greedy.close()
+        return assignments
+
+    def _roam(self, assigned_destinations):
+        width, height = self.roads.shape
+        while True:
+            rx, ry = self.rng.randint(0,width), self.rng.randint(0,height)
+            if self.roads[rx, ry] and (rx, ry) not in assigned_destinations:
+                assigned_destinations.add((rx,ry))
+                return (rx, ry)
+
+    def _distance(self, starts, cells):
+        """(len(starts), len(cells)) road distances, Manhattan where unknown."""
+        s = np.array(starts).reshape(-1, 2)
+        c = np.array(cells).reshape(-1, 2)
+        dist = (np.abs(s[:, None, 0] - c[None, :, 0]) + np.abs(s[:, None, 1] - c[None, :, 1])).astype(float)
+        if self.router is not None:
+            s_ids = self.router.node_of[s[:, 0], s[:, 1]]
+            c_ids = self.router.node_of[c[:, 0], c[:, 1]]
+            ok = (s_ids[:, None] >= 0) & (c_ids[None, :] >= 0)
+            road = self.router.dist[np.maximum(s_ids, 0)[:, None], np.maximum(c_ids, 0)[None, :]].astype(float)
+            road[road < 0] = np.inf
+            dist = np.where(ok, road, dist)
+        return dist
+
+    def _optimal(self, idle, assigned_destinations):
+        if linear_sum_assignment is None:
+            raise RuntimeError('mode="optimal" needs scipy')
+        # Enough top cells to give every idle taxi a choice, not the whole grid
+        pool = [(pos, val) for pos, val in self.index.top(len(idle) + len(assigned_destinations) + 32)
+                if pos not in assigned_destinations][:max(2 * len(idle), 32)]
+        if not pool:
+            return [None] * len(idle)
+        cells = [pos for pos, _ in pool]
+        values = np.array([val for _, val in pool])
+        cost = self._distance([(t.x, t.y) for t in idle], cells) - self.demand_weight * values[None, :]
+        # Forbidden pairs: unreachable cells and a taxi's own last serviced tile
+        big = np.abs(cost[np.isfinite(cost)]).max(initial=0.0) * 4 + 1e6
+        cost[~np.isfinite(cost)] = big
+        col = {pos: j for j, pos in enumerate(cells)}
+        for i, taxi in enumerate(idle):
+            j = col.get(taxi.last_serviced_tile)
+            if j is not None:
+                cost[i, j] = big
+        rows, cols = linear_sum_assignment(cost)
+        targets = [None] * len(idle)
+        for i, j in zip(rows, cols):
+            if cost[i, j] < big:
+                targets[i] = cells[j]
+                assigned_destinations.add(cells[j])
+        return targets
+
+
+class _NearestPicker:
+    """Closest open demand cell per taxi; stops searching once none are left."""
+
+    def __init__(self, index, assigned_destinations):
+        self.index = index
+        self.assigned = assigned_destinations
+        self.open = {cell for cell in index.values if cell not in assigned_destinations}
+        # The index's buckets, open cells only: a taken cell is dropped once
+        # (claim) instead of being skipped by every later search
+        self.buckets = {}
+        for key, cells in index.buckets.items():
+            cells = cells - assigned_destinations
+            if cells:
+                self.buckets[key] = cells
+
+    def claim(self, cell):
+        """cell is taken (picked, or a roamer's); no-op if it wasn't open demand."""
+        if cell in self.open:
+            self.open.discard(cell)
+            key = (cell[0] // BUCKET, cell[1] // BUCKET)
+            bucket = self.buckets[key]
+            bucket.discard(cell)
+            if not bucket:
+                del self.buckets[key]
+
+    def pick(self, taxi):
+        if not self.open or self.open == {taxi.last_serviced_tile}:
+            return None
+        target = self.index.nearest(taxi.x, taxi.y, self.assigned, taxi.last_serviced_tile, self.buckets)
+        self.claim(target)
+        return target
+
+
+class _GreedyPicker:
+    """
+    Walks the demand heap once per tick. Each taxi gets the best cell that is
+    neither taken nor its own last serviced tile; cells before first_open
+    are known to be taken, so nobody rescans them.
+    """
+
+    def __init__(self, index, assigned_destinations):
+        self._gen = index.ordered()
+        self.assigned = assigned_destinations
+        self.candidates = []
+        self.first_open = 0
+
+    def pick(self, taxi):
+        while (self.first_open < len(self.candidates)
+               and self.candidates[self.first_open] in self.assigned):
+            self.first_open += 1
+        i = self.first_open
+        while True:
+            if i == len(self.candidates):
+                nxt = next(self._gen, None)
+                if nxt is None:
+                    return None
+                self.candidates.append(nxt[0])
+            pos = self.candidates[i]
+            if pos not in self.assigned and pos != taxi.last_serviced_tile:
+                return pos
+            i += 1
+
+    def close(self):
+        self._gen.close()
@@ -1,8 +1,12 @@
-import pygame # type: ignore
-import numpy as np # type: ignore
-import csv
-import random
-import heapq
+import argparse
+import time
+
+from renderer import Renderer
+from simulation import Simulation, ScriptedDemand
+
+# pygame is only imported by the windowed front end (init_display), so the
+# headless engine runs on machines without a display or SDL
+pygame = None
 
 # ---------------- CONFIG ----------------
 GRID_WIDTH = 20
@@ -14,227 +18,103 @@ N_TAXIS = 10  # number of taxis
 TARGET_FPS = 30
 SIMULATION_TICKS_PER_SECOND = 2
 
+# "greedy" (highest demand first), "nearest" or "optimal" (see assignment.py)
+ASSIGNMENT_MODE = "greedy"
+
 DEMAND_REDUCTION_RATE_PER_SECOND = 30
 DEMAND_REDUCTION_PER_TICK = DEMAND_REDUCTION_RATE_PER_SECOND / SIMULATION_TICKS_PER_SECOND
-FRAMES_PER_TICK = max(1, int(TARGET_FPS / SIMULATION_TICKS_PER_SECOND))
-
-# Initialize demand maps
-demand_map = np.zeros((GRID_WIDTH, GRID_HEIGHT))
-demand_history_map = np.zeros((GRID_WIDTH, GRID_HEIGHT))
-click_events = []
-
-# ---------------- ROADS & CITY LAYOUT ----------------
-roads = np.zeros((GRID_WIDTH, GRID_HEIGHT), dtype=bool)
-
-# Horizontal & vertical main roads
-horizontal_roads = [3, 6, 9, 12, 15, 18]
-vertical_roads = [3, 6, 9, 12, 15, 18]
-for y in horizontal_roads:
-    roads[:, y] = True
-for x in vertical_roads:
-    roads[x, :] = True
-
-# ---------------- TAXI CLASS ----------------
-class Taxi:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.display_x = x
-        self.display_y = y
-        self.trail = []
-        self.destination = (x, y)
-        self.state = "IDLE"
-        self.path = []
-        self.last_serviced_tile = None
-
-    def set_destination(self, target_x, target_y):
-        self.destination = (target_x, target_y)
-        if (self.x, self.y) == self.destination:
-            self.path = []
-        else:
-            self.path = find_path((self.x, self.y), self.destination)
-            if self.path and len(self.path) > 1:
-                self.path.pop(0)
-            else:
-                self.path = []
-
-    def move(self):
-        if self.state in ["EN_ROUTE", "DROPPING_OFF", "ROAMING"] and self.path:
-            next_pos = self.path.pop(0)
-            self.x, self.y = next_pos
-            self.trail.append((self.x, self.y))
-            if len(self.trail) > 2:
-                self.trail.pop(0)
-
-    def update_display_position(self, alpha=0.2):
-        self.display_x += (self.x - self.display_x) * alpha
-        self.display_y += (self.y - self.display_y) * alpha
-
-# ---------------- PATHFINDING ----------------
-def find_path(start_pos, end_pos):
-    """A* pathfinding restricted to roads."""
-    def heuristic(a, b):
-        return abs(a[0]-b[0]) + abs(a[1]-b[1])
-
-    open_list = []
-    heapq.heappush(open_list, (0, start_pos))
-    came_from = {}
-    g_score = {start_pos: 0}
-
-    while open_list:
-        _, current = heapq.heappop(open_list)
-
-        if current == end_pos:
-            path = []
-            while current in came_from:
-                path.append(current)
-                current = came_from[current]
-            path.append(start_pos)
-            return path[::-1]
-
-        for dx, dy in [(0,1),(0,-1),(1,0),(-1,0)]:
-            neighbor = (current[0]+dx, current[1]+dy)
-            if not (0 <= neighbor[0] < GRID_WIDTH and 0 <= neighbor[1] < GRID_HEIGHT):
-                continue
-            if not roads[neighbor]:
-                continue  # only move on roads
-            tentative_g_score = g_score[current]+1
-            if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
-                g_score[neighbor] = tentative_g_score
-                f_score = tentative_g_score + heuristic(neighbor, end_pos)
-                heapq.heappush(open_list, (f_score, neighbor))
-                came_from[neighbor] = current
-    return []
-
-# ---------------- DEMAND LOGIC ----------------
-def update_demand(time_tick, serviced_tiles):
-    for ce in click_events[:]:
-        if ce["ticks"] < ce["duration"]:
-            if (ce["x"], ce["y"]) not in serviced_tiles:
-                demand_map[ce["x"], ce["y"]] += ce["intensity"]
-            ce["ticks"] += 1
-        else:
-            click_events.remove(ce)
 
-def assign_unique_targets():
-    demand_cells = [((x,y), demand_map[x][y]) for x in range(GRID_WIDTH) for y in range(GRID_HEIGHT)]
-    demand_cells.sort(key=lambda item: -item[1])
-    assigned_destinations = set(t.destination for t in taxis if t.state!="IDLE")
-    assignments = []
-
-    for taxi in [t for t in taxis if t.state=="IDLE"]:
-        potential_targets = [(pos,val) for pos,val in demand_cells if val>0 and pos not in assigned_destinations and pos!=taxi.last_serviced_tile]
-        if potential_targets:
-            (x,y), _ = potential_targets[0]
-            assignments.append(((x,y), taxi, "EN_ROUTE"))
-            assigned_destinations.add((x,y))
-        else:
-            while True:
-                rx, ry = np.random.randint(0,GRID_WIDTH), np.random.randint(0,GRID_HEIGHT)
-                if roads[rx, ry] and (rx, ry) not in assigned_destinations:
-                    assignments.append(((rx,ry), taxi, "ROAMING"))
-                    assigned_destinations.add((rx,ry))
-                    break
-    return assignments
-
-# ---------------- INITIALIZE TAXIS ----------------
-taxis = []
-road_positions = [(x, y) for x in range(GRID_WIDTH) for y in range(GRID_HEIGHT) if roads[x,y]]
-for _ in range(N_TAXIS):
-    x, y = random.choice(road_positions)
-    taxis.append(Taxi(x, y))
-
-# ---------------- CSV LOG ----------------
-csv_file = open("taxi_swarm_log.csv", "w", newline="")
-csv_writer = csv.writer(csv_file)
-csv_writer.writerow(["time","taxi_id","x","y"])
-
-# ---------------- SIMULATION STEP ----------------
-def step_simulation(time_tick):
-    serviced_tiles = set((t.x, t.y) for t in taxis if t.state=="SERVICING")
-    update_demand(time_tick, serviced_tiles)
-
-    for idx, taxi in enumerate(taxis):
-        taxi.move()
-        if not taxi.path:
-            if taxi.state=="EN_ROUTE":
-                taxi.state="SERVICING"
-            elif taxi.state in ["DROPPING_OFF","ROAMING"]:
-                taxi.state="IDLE"
-
-        if taxi.state=="SERVICING":
-            if demand_map[taxi.x,taxi.y]>0:
-                demand_map[taxi.x,taxi.y]=max(0,demand_map[taxi.x,taxi.y]-DEMAND_REDUCTION_PER_TICK)
-            else:
-                demand_history_map[taxi.x,taxi.y]+=1
-                taxi.last_serviced_tile=(taxi.x,taxi.y)
-                drop_x, drop_y = random.choice(road_positions)
-                taxi.set_destination(drop_x, drop_y)
-                taxi.state="DROPPING_OFF" if taxi.path else "IDLE"
-
-        csv_writer.writerow([time_tick, idx, taxi.x, taxi.y])
-
-    assignments = assign_unique_targets()
-    for (tx,ty), taxi, new_state in assignments:
-        taxi.set_destination(tx,ty)
-        taxi.state = new_state if taxi.path else "IDLE"
+# Profiling: run with TAXI_PROFILE=taxi_profile.json to get per-phase tick
+# and frame timings plus routing / assignment counters dumped at exit
+# (profiling.py)
+
+# ---------------- SIMULATION STATE ----------------
+# The run's state lives in one Simulation object (simulation.py); the names
+# below alias its parts so the renderer and older scripts keep working.
+sim = Simulation(GRID_WIDTH, GRID_HEIGHT, N_TAXIS,
+                 horizontal_roads=[3, 6, 9, 12, 15, 18], vertical_roads=[3, 6, 9, 12, 15, 18],
+                 demand_reduction_rate=DEMAND_REDUCTION_RATE_PER_SECOND,
+                 ticks_per_second=SIMULATION_TICKS_PER_SECOND, assignment_mode=ASSIGNMENT_MODE)
+
+demand_map = sim.demand_map
+demand_history_map = sim.demand_history_map
+click_events = sim.click_events
+roads = sim.roads
+road_positions = sim.road_positions
+route_cache = sim.route_cache
+assigner = sim.assigner
+taxis = sim.taxis
+
+find_path = sim.find_path
+astar_path = sim.astar_path
+rebuild_router = sim.rebuild_router
+update_demand = sim.update_demand
+assign_unique_targets = sim.assign_unique_targets
+step_simulation = sim.step
+
+def init_taxis(n=N_TAXIS):
+    sim.init_taxis(n)
+
+def reset_simulation(seed=None, n_taxis=N_TAXIS):
+    """Fresh demand maps and fleet; with a seed, runs are reproducible."""
+    sim.reset(seed, n_taxis)
+
+# The window's log is written at least this often, so it can be followed
+# (or replayed) while the simulation runs
+LOG_FLUSH_SECONDS = 2.0
+
+def open_log(path="taxi_swarm_log.csv"):
+    """Trajectory log (trajectory.py): .csv keeps the old text, a .trj path opts into binary."""
+    sim.open_log(path, flush_interval=LOG_FLUSH_SECONDS)
+
+def close_log():
+    sim.close_log()
+
+def run_headless(max_ticks=None, max_seconds=None, demand=None, log_path=None, seed=None, events=False,
+                 checkpoint=None, checkpoint_every=None):
+    """Step as fast as the CPU allows, without pygame; see Simulation.run_headless."""
+    return sim.run_headless(max_ticks, max_seconds, demand, log_path, seed, events,
+                            checkpoint=checkpoint, checkpoint_every=checkpoint_every)
 
 # ---------------- PYGAME VISUALS ----------------
-pygame.init()
-screen = pygame.display.set_mode((GRID_WIDTH*CELL_SIZE, GRID_HEIGHT*CELL_SIZE+40))
-pygame.display.set_caption("Taxi Swarm Simulation")
-font = pygame.font.SysFont("Consolas", 12)
-clock = pygame.time.Clock()
-
-# ---------------- DEMAND VISUALS ----------------
-def draw_demand_zones():
-    for ce in click_events:
-        intensity_color = min(255, int(ce["intensity"]*10))
-        rect = pygame.Rect(ce["x"]*CELL_SIZE, ce["y"]*CELL_SIZE, CELL_SIZE, CELL_SIZE)
-        pygame.draw.rect(screen, (255, 50, 50, intensity_color), rect)
-
-# ---------------- GRID & TAXI VISUALS ----------------
-def draw_grid():
-    drop_off_points = {t.destination for t in taxis if t.state=="DROPPING_OFF"}
-    for x in range(GRID_WIDTH):
-        for y in range(GRID_HEIGHT):
-            rect = pygame.Rect(x*CELL_SIZE, y*CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            if (x,y) in drop_off_points:
-                color=(0,200,0)
-            elif roads[x,y]:
-                color=(50,50,50)
-            else:
-                color=(30,30,30)
-            pygame.draw.rect(screen,color,rect)
-            pygame.draw.rect(screen,(80,80,80),rect,1)
-
-def draw_taxis():
-    for taxi in taxis:
-        taxi.update_display_position()
-        for t in range(1,len(taxi.trail)):
-            p1=taxi.trail[t-1]; p2=taxi.trail[t]
-            pygame.draw.line(screen,(180,180,0),
-                             (p1[0]*CELL_SIZE+CELL_SIZE//2,p1[1]*CELL_SIZE+CELL_SIZE//2),
-                             (p2[0]*CELL_SIZE+CELL_SIZE//2,p2[1]*CELL_SIZE+CELL_SIZE//2),2)
-        rect = pygame.Rect(taxi.display_x*CELL_SIZE+6, taxi.display_y*CELL_SIZE+6,
-                           CELL_SIZE-12, CELL_SIZE-12)
-        color=(255,255,0) if taxi.state=="SERVICING" else (0,150,255) if taxi.state=="DROPPING_OFF" else (200,200,200)
-        pygame.draw.rect(screen,color,rect,border_radius=4)
-        pygame.draw.rect(screen,(0,0,0),rect,1,border_radius=4)
-
-def draw_labels(time_tick):
-    label = font.render(f"Time: {time_tick}", True,(255,255,255))
-    screen.blit(label,(10,GRID_HEIGHT*CELL_SIZE+10))
+screen = None
+font = None
+clock = None
+
+def init_display():
+    global pygame, screen, font, clock
+    import pygame as _pygame # type: ignore
+    pygame = _pygame
+    pygame.init()
+    screen = pygame.display.set_mode((GRID_WIDTH*CELL_SIZE, GRID_HEIGHT*CELL_SIZE+40))
+    pygame.display.set_caption("Taxi Swarm Simulation")
+    font = pygame.font.SysFont("Consolas", 12)
+    clock = pygame.time.Clock()
 
 # ---------------- RUN SIMULATION ----------------
+# Simulation and drawing run on separate clocks: ticks follow the wall clock
+# at SIMULATION_TICKS_PER_SECOND, frames are drawn at up to TARGET_FPS. When
+# the ticks are running late, or drawing (at the last frame's cost) would
+# make the next one late, the frame is dropped rather than slowing the
+# simulation down, but at least one frame is drawn every MAX_FRAME_GAP
+# seconds so the window stays responsive.
+MAX_CATCH_UP_TICKS = 5
+MAX_FRAME_GAP = 0.25
+
 def run_simulation():
+    init_display()
+    open_log()
+    renderer = Renderer(pygame, screen, sim, CELL_SIZE, font)
     time_tick=0
-    frame_counter=0
     running=True
 
     demand_intensity_setting = 15
     demand_duration_setting = 20
 
+    prof = sim.profiler
+    tick_seconds = 1 / SIMULATION_TICKS_PER_SECOND
+    next_tick = last_frame = time.perf_counter()
+    frame_cost = 0.0
     while running:
         for event in pygame.event.get():
             if event.type==pygame.QUIT:
@@ -244,10 +124,9 @@ def run_simulation():
                 gx,gy=mx//CELL_SIZE,my//CELL_SIZE
                 if 0 <= gx < GRID_WIDTH and 0 <= gy < GRID_HEIGHT and roads[gx,gy]:
                     if event.button == 1:  # left click to add demand
-                        click_events.append({"x":gx,"y":gy,"intensity":demand_intensity_setting,
-                                             "duration":demand_duration_setting,"ticks":0})
+                        click_events.add(gx, gy, demand_intensity_setting, demand_duration_setting)
                     elif event.button == 3:  # right click to remove demand
-                        click_events[:] = [ce for ce in click_events if not (ce["x"]==gx and ce["y"]==gy)]
+                        click_events.remove_at(gx, gy)
             elif event.type==pygame.KEYDOWN:
                 if event.unicode.isdigit() and event.unicode != "0":
                     demand_intensity_setting = int(event.unicode) * 5
@@ -256,24 +135,64 @@ def run_simulation():
                 elif event.key == pygame.K_RIGHTBRACKET:
                     demand_duration_setting += 5
 
-        frame_counter +=1
-        if frame_counter >= FRAMES_PER_TICK:
-            frame_counter=0
+        steps = 0
+        while time.perf_counter() >= next_tick and steps < MAX_CATCH_UP_TICKS:
             step_simulation(time_tick)
             time_tick+=1
-
-        screen.fill((30,30,30))
-        draw_grid()
-        draw_demand_zones()
-        draw_taxis()
-        draw_labels(time_tick)
-        pygame.display.flip()
+            next_tick += tick_seconds
+            steps += 1
+        now = time.perf_counter()
+        # Measured before the reset below: drawing this frame (if it costs
+        # what the last one did) would push the next tick past its due time
+        late = now + frame_cost - next_tick
+        if now >= next_tick and steps == MAX_CATCH_UP_TICKS:
+            # Hopelessly behind: let the simulation run slow instead of spiralling
+            next_tick = now + tick_seconds
+
+        if late > 0 and now - last_frame < MAX_FRAME_GAP:
+            prof.count("frames_dropped")
+        else:
+            with prof.phase("frame"):
+                renderer.draw(time_tick)
+            last_frame = now
+            frame_cost = time.perf_counter() - now
         clock.tick(TARGET_FPS)
 
-    csv_file.close()
+    close_log()
     pygame.quit()
 
 # ---------------- ENTRY POINT ----------------
 if __name__=="__main__":
-    run_simulation()
+    parser = argparse.ArgumentParser(description="Taxi swarm simulation")
+    parser.add_argument("--headless", action="store_true", help="no window, run as fast as possible")
+    parser.add_argument("--ticks", type=int, help="headless: stop at this tick")
+    parser.add_argument("--seconds", type=float, help="headless: stop after this much wall clock")
+    parser.add_argument("--demand-rate", type=float, default=0.2, help="headless: demand events per tick")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--events", action="store_true",
+                        help="headless: event-driven run, only taxis with an event are updated (same results)")
+    parser.add_argument("--log", help="headless: trajectory log path, .csv or .trj (default: no log)")
+    parser.add_argument("--checkpoint", help="headless: snapshot file to save the state to (snapshot.py)")
+    parser.add_argument("--checkpoint-every", type=int, default=10000, help="headless: ticks between snapshots")
+    parser.add_argument("--resume", help="headless: continue from this snapshot, up to tick --ticks")
+    args = parser.parse_args()
+
+    if args.headless:
+        if args.ticks is None and args.seconds is None:
+            parser.error("--headless needs --ticks and/or --seconds")
+        checkpoint = dict(checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every)
+        if args.resume:
+            import snapshot
+            sim, start_tick, demand = snapshot.load(args.resume)
+            print(f"Resuming {args.resume} at tick {start_tick}")
+            stats = sim.run_headless(args.ticks, args.seconds, demand=demand, log_path=args.log,
+                                     events=args.events, start_tick=start_tick, **checkpoint)
+        else:
+            stats = run_headless(args.ticks, args.seconds,
+                                 demand=ScriptedDemand(rate=args.demand_rate, seed=args.seed),
+                                 log_path=args.log, seed=args.seed, events=args.events, **checkpoint)
+        print(f"{stats['ticks']} ticks in {stats['seconds']:.2f}s "
+              f"({stats['ticks_per_second']:.0f} ticks/s, {stats['stepped']} stepped in full)")
+    else:
+        run_simulation()
 
@@ -0,0 +1,66 @@
+import os
+import timeit
+
+import joblib
+import numpy as np # type: ignore
+
+from encoders import CompiledEncoder
+
+# -----------------------------
+# Micro-benchmark: safe_transform vs CompiledEncoder
+# -----------------------------
+# Run: python bench_encoders.py
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "Trained models")
+N_ROWS = 625  # one /predict worth of candidates
+
+
+def safe_transform(le, values):
+    """The per-row LabelEncoder path Backend.py used before CompiledEncoder."""
+    if le is None:
+        return np.zeros(len(values), dtype=int)
+    out = []
+    classes = set(le.classes_)
+    fallback = int(le.transform([le.classes_[0]])[0])
+    for v in values:
+        if v in classes:
+            out.append(int(le.transform([v])[0]))
+        else:
+            out.append(fallback)
+    return np.array(out, dtype=int)
+
+
+def bench(label, fn, number):
+    per_call = min(timeit.repeat(fn, number=number, repeat=3)) / number
+    print(f"{label:<40} {per_call * 1e6:12.1f} us/call")
+    return per_call
+
+
+if __name__ == "__main__":
+    le_day = joblib.load(os.path.join(MODEL_DIR, "label_encoder_day.pkl"))
+    le_time = joblib.load(os.path.join(MODEL_DIR, "label_encoder_time.pkl"))
+    enc_day = CompiledEncoder(le_day)
+    enc_time = CompiledEncoder(le_time)
+
+    rng = np.random.default_rng(0)
+    mixed = rng.choice(le_time.classes_, N_ROWS).tolist()
+
+    # Results must agree before timings mean anything
+    assert (safe_transform(le_day, ["Monday"] * N_ROWS) == enc_day.full("Monday", N_ROWS)).all()
+    assert (safe_transform(le_time, mixed + ["99:99"]) == enc_time.encode(mixed + ["99:99"])).all()
+
+    print(f"--- constant column ({N_ROWS} rows, as in build_feature_matrix) ---")
+    old = bench("safe_transform", lambda: safe_transform(le_day, ["Monday"] * N_ROWS), 5)
+    new = bench("CompiledEncoder.full", lambda: enc_day.full("Monday", N_ROWS), 10000)
+    print(f"speedup: {old / new:.0f}x")
+
+    print(f"--- mixed column ({N_ROWS} rows) ---")
+    old = bench("safe_transform", lambda: safe_transform(le_time, mixed), 5)
+    new = bench("CompiledEncoder.encode", lambda: enc_time.encode(mixed), 1000)
+    print(f"speedup: {old / new:.0f}x")
+
+    print("--- single value (as in next_demand) ---")
+    old = bench("LabelEncoder.transform", lambda: le_time.transform(["37"])[0], 2000)
+    new = bench("CompiledEncoder.encode_one", lambda: enc_time.encode_one("37"), 100000)
+    print(f"speedup: {old / new:.0f}x")
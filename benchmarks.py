@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np # type: ignore
+
+# -----------------------------
+# Benchmark suite
+# -----------------------------
+# Times the hot paths: find_path on several grid sizes, assignment with
+# different fleet / demand sizes, a headless step loop, and the Flask
+# endpoints (/predict, /predict/batch, /route/batch, /next_demand) through
+# the test client. Runs offline and headless. The endpoint benchmarks need the
+# trained models in "Trained models/".
+#
+#   python benchmarks.py --save                 record bench_baseline.json
+#   python benchmarks.py                        compare against it; exit 1 if any
+#                                               benchmark is more than --threshold
+#                                               (default 25%) slower than baseline
+#   python benchmarks.py --only find_path step  run a subset (name prefixes)
+#
+# Baselines are machine-specific, so none is committed. Without one the
+# timings are printed and the regression check is skipped (exit 0).
+#
+# Every benchmark reports the median time per operation over several rounds,
+# which holds up better than the mean against a noisy machine.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BASE_DIR, "bench_baseline.json")
+BENCHMARKS = {}  # name -> setup(); setup returns (op, ops per call)
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def measure(op, ops_per_call, rounds, min_time):
+    """Median and best seconds per operation; each round runs op() for at least min_time."""
+    op()  # warm up caches and lazy imports
+    samples = []
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            op()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        samples.append(elapsed / (calls * ops_per_call))
+    return {"median_s": float(np.median(samples)), "min_s": float(min(samples)), "rounds": rounds}
+
+
+# ---------------- SIMULATION ----------------
+def _grid_sim(size, spacing, n_taxis=10, seed=0):
+    from simulation import Simulation
+    roads = list(range(spacing, size, spacing))
+    return Simulation(size, size, n_taxis, horizontal_roads=roads, vertical_roads=roads, seed=seed)
+
+
+def _find_path_bench(size, spacing):
+    def setup():
+        sim = _grid_sim(size, spacing)
+        rng = random.Random(0)
+        pairs = [(rng.choice(sim.road_positions), rng.choice(sim.road_positions)) for _ in range(200)]
+
+        def op():
+            # Fresh cache each call: measure routing, not cache hits
+            sim.route_cache.clear()
+            for start, end in pairs:
+                sim.find_path(start, end)
+        return op, len(pairs)
+    return setup
+
+
+# Router tables (<= 2048 road cells) and A* + cache above that
+for _size, _spacing in ((20, 3), (60, 5), (150, 10)):
+    benchmark(f"find_path/{_size}x{_size}")(_find_path_bench(_size, _spacing))
+
+
+def _assign_bench(size, n_taxis, n_demand, mode="greedy"):
+    def setup():
+        sim = _grid_sim(size, 5, n_taxis)
+        sim.assigner.mode = mode
+        rng = np.random.default_rng(0)
+        cells = np.array(sim.road_positions)[rng.choice(len(sim.road_positions), n_demand, replace=False)]
+        sim.demand_map[cells[:, 0], cells[:, 1]] = rng.integers(1, 50, n_demand)
+        sim.assigner.index.rebuild(sim.demand_map)
+        return sim.assign_unique_targets, 1
+    return setup
+
+
+for _taxis, _demand in ((100, 50), (1000, 200), (1000, 2000)):
+    benchmark(f"assign/greedy/{_taxis}taxis_{_demand}cells")(_assign_bench(200, _taxis, _demand))
+benchmark("assign/nearest/1000taxis_200cells")(_assign_bench(200, 1000, 200, "nearest"))
+
+
+@benchmark("step/headless_20x20_10taxis")
+def _step_small():
+    from simulation import ScriptedDemand
+    sim = _grid_sim(20, 3, 10)
+
+    def op():
+        sim.run_headless(max_ticks=500, demand=ScriptedDemand(rate=0.5, seed=1), seed=1)
+    return op, 500
+
+
+@benchmark("step/headless_100x100_500taxis")
+def _step_large():
+    from simulation import ScriptedDemand
+    sim = _grid_sim(100, 5, 500)
+
+    def op():
+        sim.run_headless(max_ticks=50, demand=ScriptedDemand(rate=5, seed=1), seed=1)
+    return op, 50
+
+
+# ---------------- BACKENDS ----------------
+@benchmark("backend/predict")
+def _predict():
+    import Backend
+    client = Backend.app.test_client()
+    # time is a 15-minute slot index, like the encoder's classes ("72" = 18:00)
+    body = {"day": "Friday", "time": "72", "type": "Office", "top_k": 6}
+
+    def op():
+        resp = client.post("/predict", json=body)
+        assert resp.status_code == 200, resp.status_code
+    return op, 1
+
+
+@benchmark("backend/predict_batch_672")
+def _predict_batch():
+    import Backend
+    client = Backend.app.test_client()
+    # One week of 15-minute slots for one landmark type
+    body = {"product": {"day": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+                        "time": [str(t) for t in range(96)], "type": ["Office"]}, "top_k": 6}
+
+    def op():
+        resp = client.post("/predict/batch", json=body)
+        assert resp.status_code == 200, resp.status_code
+    return op, 1
+
+
+@benchmark("backend/route_batch_100")
+def _route_batch():
+    from flask import Flask # type: ignore
+    from road_network import RoadNetwork, add_routing_endpoints
+    # The backends' endpoints on the synthetic grid, whatever $ROAD_NETWORK_PATH says
+    app = Flask(__name__)
+    add_routing_endpoints(app, RoadNetwork.synthetic_grid())
+    client = app.test_client()
+    rng = np.random.default_rng(0)
+
+    def points(n):
+        return np.column_stack([40.60 + rng.random(n) * 0.25, -74.05 + rng.random(n) * 0.25]).tolist()
+
+    # A fleet's worth of legs from 100 taxis; trees are cached after the warm-up call
+    body = {"legs": [{"from": a, "to": b} for a, b in zip(points(100), points(100))], "step_m": 20}
+
+    def op():
+        resp = client.post("/route/batch", json=body)
+        assert resp.status_code == 200, resp.status_code
+    return op, 1
+
+
+@benchmark("backend/next_demand")
+def _next_demand():
+    # Private clock file, so benchmarking never moves a running server's clock
+    os.environ.setdefault("SIM_CLOCK_PATH", os.path.join(tempfile.mkdtemp(), "bench_clock.sqlite"))
+    import Backend_2
+    client = Backend_2.app.test_client()
+
+    def op():
+        resp = client.get("/next_demand")
+        assert resp.status_code == 200, resp.status_code
+    return op, 1
+
+
+# ---------------- RUNNER ----------------
+def run(names, rounds, min_time):
+    results = {}
+    for name in names:
+        try:
+            op, ops = BENCHMARKS[name]()
+            results[name] = measure(op, ops, rounds, min_time)
+        except Exception as exc:  # e.g. model files missing: report it and keep going
+            results[name] = {"error": f"{type(exc).__name__}: {exc}"}
+        r = results[name]
+        if "error" in r:
+            print(f"{name:<40} ERROR {r['error']}")
+        else:
+            print(f"{name:<40} {r['median_s'] * 1e6:12.1f} us/op  (best {r['min_s'] * 1e6:.1f})")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of benchmarks slower than baseline * (1 + threshold)."""
+    regressions = []
+    print(f"\n{'benchmark':<40}{'baseline':>12}{'now':>12}{'change':>9}")
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if "error" in r or not base or "error" in base:
+            continue
+        change = r["median_s"] / base["median_s"] - 1
+        flag = "  <-- regression" if change > threshold else ""
+        print(f"{name:<40}{base['median_s'] * 1e6:>10.1f}us{r['median_s'] * 1e6:>10.1f}us{change:>+8.0%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Taxi swarm benchmark suite")
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose names start with these")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        sys.exit(0)
+    names = [n for n in BENCHMARKS if not args.only or any(n.startswith(p) for p in args.only)]
+    results = run(names, args.rounds, args.min_time)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.platform(),
+                       "created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} benchmark(s) regressed more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+    else:
+        print(f"No baseline at {args.baseline}: regression check skipped "
+              "(run with --save on this machine to record one)")
+    if any("error" in r for r in results.values()):
+        sys.exit(2)
@@ -0,0 +1,39 @@
+import numpy as np # type: ignore
+
+# -----------------------------
+# Build candidate grid (NYC area: Manhattan/Brooklyn/Queens)
+# -----------------------------
+# Shared by Backend.py (where /predict looks) and Models.py (where the
+# spatial model learns), so both agree on the exact cell coordinates.
+LAT_MIN, LAT_MAX = 40.64, 40.82
+LON_MIN, LON_MAX = -74.05, -73.85
+# 25 x 25 = 625 candidates (tweak as you like)
+GRID_STEPS = 25
+
+def on_land(la, lo):
+    """quick-and-dirty water masks (avoid obvious rivers/bay)"""
+    if lo < -74.02:      # Hudson
+        return False
+    if -73.99 < lo < -73.94:  # East River band
+        return False
+    if la < 40.68 and lo < -74.0:  # Upper Bay
+        return False
+    return True
+
+def candidate_points():
+    lats = np.linspace(LAT_MIN, LAT_MAX, GRID_STEPS)
+    lons = np.linspace(LON_MIN, LON_MAX, GRID_STEPS)
+    pts = []
+    for la in lats:
+        for lo in lons:
+            if on_land(la, lo):
+                pts.append((float(la), float(lo)))
+    return pts
+
+# Feature columns a spatial model is trained on, in order
+TEMPORAL_FEATURES = ["day_enc", "time_enc", "type_enc"]
+SPATIAL_FEATURES = TEMPORAL_FEATURES + ["lat", "lon"]
+
+def is_spatial(model):
+    """True if the model was trained with cell coordinates (see Models.py)."""
+    return getattr(model, "n_features_in_", len(TEMPORAL_FEATURES)) == len(SPATIAL_FEATURES)
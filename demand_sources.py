@@ -0,0 +1,124 @@
+import numpy as np # type: ignore
+
+# ---------------- DEMAND SOURCES ----------------
+# Live demand events (mouse clicks, scripted arrivals) as parallel arrays
+# instead of a list of dicts. One tick of every source is a single masked
+# scatter-add into demand_map, and expired sources are dropped in bulk.
+
+
+class DemandSources:
+    """
+    Columns, one entry per live source, oldest first:
+      x, y       cell
+      intensity  demand added per tick
+      duration   ticks the source lasts
+      ticks      ticks it has run so far
+
+    Also accepts the old event dicts ({"x", "y", "intensity", "duration",
+    "ticks"}) through append / extend.
+    """
+
+    _COLUMNS = (("x", np.int32), ("y", np.int32), ("intensity", np.float64),
+                ("duration", np.int64), ("ticks", np.int64))
+
+    def __init__(self, capacity=64):
+        for name, dtype in self._COLUMNS:
+            setattr(self, "_" + name, np.zeros(capacity, dtype=dtype))
+        self.n = 0
+        self.total_added = 0.0  # demand put into the map over the object's lifetime
+
+    def __len__(self):
+        return self.n
+
+    # Views of the live part of each column
+    x = property(lambda self: self._x[:self.n])
+    y = property(lambda self: self._y[:self.n])
+    intensity = property(lambda self: self._intensity[:self.n])
+    duration = property(lambda self: self._duration[:self.n])
+    ticks = property(lambda self: self._ticks[:self.n])
+
+    def add_many(self, xs, ys, intensity, duration, ticks=0):
+        """Append sources; scalar intensity / duration / ticks apply to all of them."""
+        xs = np.asarray(xs, dtype=np.int32).ravel()
+        k = len(xs)
+        need = self.n + k
+        if need > len(self._x):
+            size = max(need, 2 * len(self._x))
+            for name, _ in self._COLUMNS:
+                col = getattr(self, "_" + name)
+                grown = np.zeros(size, dtype=col.dtype)
+                grown[:self.n] = col[:self.n]
+                setattr(self, "_" + name, grown)
+        s = slice(self.n, need)
+        self._x[s] = xs
+        self._y[s] = ys
+        self._intensity[s] = intensity
+        self._duration[s] = duration
+        self._ticks[s] = ticks
+        self.n = need
+
+    def add(self, x, y, intensity, duration):
+        self.add_many([x], [y], intensity, duration)
+
+    def append(self, event):
+        self.add_many([event["x"]], [event["y"]], event["intensity"], event["duration"],
+                      event.get("ticks", 0))
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def clear(self):
+        self.n = 0
+
+    def _keep(self, mask):
+        """Drop every source where mask is False, keeping the others in order."""
+        kept = int(np.count_nonzero(mask))
+        if kept == self.n:
+            return
+        for name, _ in self._COLUMNS:
+            col = getattr(self, "_" + name)
+            col[:kept] = col[:self.n][mask]
+        self.n = kept
+
+    def columns(self):
+        """{name: live column}, for snapshots (snapshot.py)."""
+        return {name: getattr(self, name) for name, _ in self._COLUMNS}
+
+    def load_columns(self, columns, total_added=0.0):
+        """Replace every source with columns as given by columns(); the arrays are used as-is."""
+        self.n = len(columns["x"])
+        for name, dtype in self._COLUMNS:
+            col = np.asarray(columns[name], dtype=dtype)
+            # Zero capacity would never grow in add_many
+            setattr(self, "_" + name, col if len(col) else np.zeros(64, dtype=dtype))
+        self.total_added = float(total_added)
+
+    def remove_at(self, x, y):
+        """Drop every source on cell (x, y)."""
+        self._keep((self.x != x) | (self.y != y))
+
+    def apply(self, demand_map, serviced=None):
+        """
+        One tick: every running source adds its intensity to its cell unless
+        serviced[x, y] (a bool grid) is set, then ages by one tick. Sources
+        that had already run their full duration are removed instead.
+        Returns (xs, ys) of the cells that changed.
+        """
+        live = self.ticks < self.duration
+        active = live.copy()
+        if serviced is not None:
+            active &= ~serviced[self.x, self.y]
+        width = demand_map.shape[1]
+        cells = self.x[active].astype(np.int64) * width + self.y[active]
+        self.total_added += float(self.intensity[active].sum())
+        # add.at adds repeated cells one source at a time, in list order
+        if demand_map.flags.c_contiguous:
+            np.add.at(demand_map.reshape(-1), cells, self.intensity[active])
+        else:
+            np.add.at(demand_map, np.divmod(cells, width), self.intensity[active])
+        self.ticks[live] += 1
+        self._keep(live)
+        # Changed cells, each once; sorting the live sources' cells costs far
+        # less than clearing a grid-sized mask every tick
+        return np.divmod(np.unique(cells), width)
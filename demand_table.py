@@ -0,0 +1,299 @@
+import glob
+import hashlib
+import os
+import sys
+import time as _time
+
+import joblib
+import numpy as np # type: ignore
+
+from candidate_grid import SPATIAL_FEATURES, TEMPORAL_FEATURES, candidate_points
+from encoders import CompiledEncoder
+from flat_forest import file_digest
+
+# -----------------------------
+# Precomputed demand table
+# -----------------------------
+# /predict only depends on (day, time, type) and the candidate cell, so every
+# answer the model can give is known up front. The table holds the intensity
+# for each encoded combination, indexed as
+# table[day_code, time_code, type_code, cell], and is cached next to the model
+# as a .npy so it can be memory-mapped by any process. Temporal-only models
+# have a single cell that every candidate shares.
+
+TABLE_PREFIX = "demand_table_"
+TABLE_FORMAT = 3  # bump when the table layout changes so old caches are rebuilt
+
+
+def model_intensities(model, X, high_idx):
+    """Same intensity rule as /predict: P(High) if known, else the max class prob."""
+    proba = model.predict_proba(X)
+    if high_idx is not None and high_idx < proba.shape[1]:
+        return proba[:, high_idx]
+    return proba.max(axis=1)
+
+
+def table_fingerprint(model_path, enc_day, enc_time, enc_type, high_idx, cells=None,
+                      kind="intensity"):
+    """Hash of the model pickle plus everything that shapes the table layout."""
+    h = hashlib.sha1(f"format={TABLE_FORMAT};kind={kind}".encode())
+    h.update(file_digest(model_path).encode())
+    for enc in (enc_day, enc_time, enc_type):
+        h.update(repr(enc.classes_.tolist()).encode())
+    h.update(repr(high_idx).encode())
+    if cells is not None:
+        h.update(np.ascontiguousarray(cells, dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def _evaluate_grid(score, shape, cells, dtype):
+    """
+    score(X) over every encoded (day, time, type) combination, and over every
+    cell's (lat, lon) if cells is given; shape (days, times, types, cells).
+    """
+    grid = np.indices(shape).reshape(3, -1).T
+    if cells is None:
+        return np.asarray(score(grid)).astype(dtype).reshape(shape + (1,))
+
+    cells = np.asarray(cells, dtype=np.float64)
+    table = np.empty(shape + (len(cells),), dtype=dtype)
+    per_day = grid[grid[:, 0] == 0]
+    # One day at a time keeps the feature matrix to ~T*types*cells rows
+    for d in range(shape[0]):
+        per_day[:, 0] = d
+        X = np.column_stack([np.repeat(per_day, len(cells), axis=0),
+                             np.tile(cells, (len(per_day), 1))])
+        table[d] = np.asarray(score(X)).reshape(shape[1:] + (len(cells),))
+    return table
+
+
+def build_table(model, enc_day, enc_time, enc_type, high_idx, cells=None):
+    """
+    Evaluate the model once over every encoded (day, time, type) combination,
+    and over every cell's (lat, lon) if the model is spatial.
+    """
+    shape = (len(enc_day), len(enc_time), len(enc_type))
+    return _evaluate_grid(lambda X: model_intensities(model, X, high_idx), shape, cells, np.float64)
+
+
+def model_cells(model, candidates):
+    """
+    The cells a table for model needs: candidates for a spatial model, None
+    for a temporal-only one. Any other feature count is rejected.
+    """
+    n_features = getattr(model, "n_features_in_", len(TEMPORAL_FEATURES))
+    if n_features == len(TEMPORAL_FEATURES):
+        return None
+    if n_features == len(SPATIAL_FEATURES):
+        return np.asarray(candidates, dtype=np.float64).reshape(-1, 2)
+    raise ValueError(f"model expects {n_features} features; only {TEMPORAL_FEATURES} "
+                     f"or {SPATIAL_FEATURES} are supported")
+
+
+def save_table(path, table, prefix):
+    """Atomically write table to path and drop older tables with the same prefix."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp, path)
+    # Drop tables built from older models
+    for old in glob.glob(os.path.join(os.path.dirname(path), f"{prefix}*.npy")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def high_index(le_label):
+    """Index of the "High" class in the label encoder, or None (use the max class prob)."""
+    try:
+        return int(np.where(le_label.classes_ == "High")[0][0])
+    except Exception:
+        return None
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class DemandTable:
+    """
+    Lookup table for /predict, rebuilt whenever the model pickle changes.
+
+    The layout follows the model: a retrained pickle may switch between a
+    temporal-only and a spatial model, and the cell axis switches with it
+    (cells is None or the candidates). Callers index table[d, t, ty] and get
+    a row of length 1 or len(candidates).
+
+    A retrain rewrites the label encoders along with the model. Given
+    encoder_paths ({"day", "time", "type", "label"} -> pickle path), a change
+    to any of those files also triggers a refresh, and the encoders (and the
+    High index, from the label encoder) are reloaded with the table. lookup()
+    and lookup_many() read encoders and table from one consistent version.
+    """
+
+    def __init__(self, model_path, enc_day, enc_time, enc_type, high_idx,
+                 candidates=None, cache_dir=None, model=None, check_interval=5.0,
+                 encoder_paths=None):
+        self.model_path = model_path
+        self.encoder_paths = dict(encoder_paths or {})
+        self.high_idx = high_idx
+        self.candidates = candidate_points() if candidates is None else candidates
+        self.cells = None  # (lat, lon) per candidate for spatial models, else None
+        self.cache_dir = cache_dir or os.path.dirname(os.path.abspath(model_path))
+        self.check_interval = check_interval
+
+        self.table = None
+        self.path = None
+        self.last_error = None
+        self._state = (enc_day, enc_time, enc_type, None)
+        self._stat = None
+        self._failed_stat = None
+        self._last_check = 0.0
+        self.refresh(model=model)
+
+    enc_day = property(lambda self: self._state[0])
+    enc_time = property(lambda self: self._state[1])
+    enc_type = property(lambda self: self._state[2])
+
+    def _table_path(self, digest):
+        return os.path.join(self.cache_dir, f"{TABLE_PREFIX}{digest}.npy")
+
+    def _load_layout(self, model):
+        # The table cache for a spatial model is keyed on its cells too, so
+        # which cache to look for depends on the model's feature count
+        if model is None:
+            model = joblib.load(self.model_path)
+        return model, model_cells(model, self.candidates)
+
+    def _files_stat(self):
+        return (_stat_key(self.model_path),) + tuple(
+            _stat_key(path) for _, path in sorted(self.encoder_paths.items()))
+
+    def _load_encoders(self):
+        """Encoders (day, time, type) and high_idx from the pickles in encoder_paths."""
+        paths = self.encoder_paths
+        encoders = []
+        for name, current in zip(("day", "time", "type"), self._state[:3]):
+            path = paths.get(name)
+            if path is None:
+                encoders.append(current)
+            elif os.path.exists(path):
+                encoders.append(CompiledEncoder.from_pickle(path, unseen=current.unseen))
+            else:
+                # Model trained without this feature
+                encoders.append(CompiledEncoder(None, unseen=current.unseen))
+        high_idx = self.high_idx
+        if paths.get("label") is not None:
+            high_idx = high_index(joblib.load(paths["label"]))
+        return encoders, high_idx
+
+    def refresh(self, model=None):
+        """
+        Reload (or rebuild) the table, and the encoders from encoder_paths, if
+        the model pickle or any encoder pickle changed on disk. Returns True
+        when a new table was loaded.
+        """
+        self._last_check = _time.monotonic()
+        stat_key = self._files_stat()
+        if stat_key == self._stat:
+            return False
+
+        if self._stat is None:
+            # First load: the encoders passed in are the ones to use
+            (enc_day, enc_time, enc_type), high_idx = self._state[:3], self.high_idx
+        else:
+            (enc_day, enc_time, enc_type), high_idx = self._load_encoders()
+        model, cells = self._load_layout(model)
+        digest = table_fingerprint(self.model_path, enc_day, enc_time, enc_type, high_idx, cells)
+        path = self._table_path(digest)
+        if not os.path.exists(path):
+            table = build_table(model, enc_day, enc_time, enc_type, high_idx, cells)
+            save_table(path, table, TABLE_PREFIX)
+
+        table = np.load(path, mmap_mode="r")
+        self._state = (enc_day, enc_time, enc_type, table)
+        self.table = table
+        self.high_idx = high_idx
+        self.cells = cells
+        self.path = path
+        self._stat = stat_key
+        return True
+
+    def maybe_refresh(self):
+        """Cheap per-request check, rate-limited to one stat() per file per check_interval."""
+        if _time.monotonic() - self._last_check < self.check_interval:
+            return False
+        try:
+            return self.refresh()
+        except Exception as e:
+            # Half-written or unsupported pickles: keep serving the old table,
+            # and say so once per version of the files rather than on every check
+            self._last_check = _time.monotonic()
+            failed = self._files_stat()
+            if failed != self._failed_stat:
+                self._failed_stat = failed
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Keeping the previous demand table, reloading {self.model_path} failed: "
+                      f"{self.last_error}", file=sys.stderr)
+            return False
+
+    def lookup(self, day, time, typ):
+        """Intensity per cell (length 1 for temporal-only models)."""
+        enc_day, enc_time, enc_type, table = self._state
+        return table[enc_day.encode_one(day), enc_time.encode_one(time), enc_type.encode_one(typ)]
+
+    def lookup_many(self, days, times, types):
+        """lookup() for whole columns: shape (n_queries, n_cells)."""
+        enc_day, enc_time, enc_type, table = self._state
+        return np.asarray(table[enc_day.encode(days), enc_time.encode(times), enc_type.encode(types)],
+                          dtype=float)
+
+
+# -----------------------------
+# Label schedule
+# -----------------------------
+# model.predict for every encoded (day, time, type): the demand label
+# Backend_2.py hands out for each tick of the week.
+
+SCHEDULE_PREFIX = "label_schedule_"
+
+
+def load_label_schedule(model_path, enc_day, enc_time, enc_type, model=None, cache_dir=None,
+                        candidates=None):
+    """
+    Label per [day_code, time_code, type_code, cell], cached as a memory-mapped
+    .npy. Like DemandTable, the cell axis is the candidates for a spatial model
+    and a single cell for a temporal-only one. Returns (schedule, cells).
+    """
+    cache_dir = cache_dir or os.path.dirname(os.path.abspath(model_path))
+    if model is None:
+        model = joblib.load(model_path)
+    cells = model_cells(model, candidate_points() if candidates is None else candidates)
+    digest = table_fingerprint(model_path, enc_day, enc_time, enc_type, None, cells, kind="labels")
+    path = os.path.join(cache_dir, f"{SCHEDULE_PREFIX}{digest}.npy")
+    if not os.path.exists(path):
+        shape = (len(enc_day), len(enc_time), len(enc_type))
+        save_table(path, _evaluate_grid(model.predict, shape, cells, np.int64), SCHEDULE_PREFIX)
+    return np.load(path, mmap_mode="r"), cells
+
+
+if __name__ == "__main__":
+    # Offline build: python demand_table.py
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Trained models")
+    model = joblib.load(os.path.join(base, "landmark_demand_predictor.pkl"))
+    high_idx = high_index(joblib.load(os.path.join(base, "label_encoder_label.pkl")))
+    dt = DemandTable(
+        os.path.join(base, "landmark_demand_predictor.pkl"),
+        CompiledEncoder.from_pickle(os.path.join(base, "label_encoder_day.pkl")),
+        CompiledEncoder.from_pickle(os.path.join(base, "label_encoder_time.pkl")),
+        CompiledEncoder.from_pickle(os.path.join(base, "label_encoder_type.pkl")),
+        high_idx,
+        model=model,
+    )
+    print(f"✅ Demand table {dt.table.shape} saved to {dt.path}")
@@ -0,0 +1,134 @@
+import glob
+import os
+
+import joblib
+import numpy as np # type: ignore
+
+from flat_forest import file_digest
+
+# -----------------------------
+# Compiled label encoders
+# -----------------------------
+# sklearn's LabelEncoder.transform does validation + a searchsorted on every
+# call, which is a lot of overhead for encoding one string. CompiledEncoder
+# takes the fitted classes once and keeps a value -> code dict for scalars
+# and a vectorized searchsorted path for whole columns.
+
+
+class CompiledEncoder:
+    """
+    Fast stand-in for a fitted LabelEncoder.
+
+    unseen controls what happens to values the encoder was never fitted on:
+      "first" -> code of classes_[0] (what safe_transform used to do)
+      "error" -> raise ValueError, like LabelEncoder.transform
+      an int  -> that code, e.g. -1 as a sentinel
+    """
+
+    def __init__(self, le, unseen="first"):
+        if le is None:
+            # Model wasn't trained with this feature: everything encodes to 0
+            self.classes_ = np.array([], dtype=str)
+        else:
+            self.classes_ = np.asarray(le.classes_)
+        self.unseen = unseen
+        self.codes = {c: i for i, c in enumerate(self.classes_.tolist())}
+        self._str_keys = self.classes_.dtype.kind in "UO"
+        if le is None:
+            self.fallback = 0
+        elif unseen == "first":
+            self.fallback = 0
+        elif unseen == "error":
+            self.fallback = None
+        else:
+            self.fallback = int(unseen)
+
+    @classmethod
+    def from_pickle(cls, path, unseen="first"):
+        return cls(joblib.load(path), unseen=unseen)
+
+    @classmethod
+    def from_classes(cls, classes, unseen="first"):
+        return cls(_Classes(classes), unseen=unseen)
+
+    def __len__(self):
+        return max(1, len(self.classes_))
+
+    def _unseen(self, values):
+        if self.fallback is None:
+            raise ValueError(f"y contains previously unseen labels: {list(values)[:5]}")
+        return self.fallback
+
+    def encode_one(self, value):
+        code = self.codes.get(str(value) if self._str_keys else value)
+        if code is None:
+            if not self.codes:
+                return 0
+            return self._unseen([value])
+        return code
+
+    def encode(self, values):
+        """Encode a whole column in one pass. Returns an int array."""
+        values = np.asarray(values)
+        if not self.codes:
+            return np.zeros(len(values), dtype=int)
+        if self._str_keys:
+            values = values.astype(str)
+        # classes_ is sorted (LabelEncoder uses np.unique), so searchsorted finds the slot
+        idx = np.searchsorted(self.classes_, values)
+        idx = np.clip(idx, 0, len(self.classes_) - 1)
+        seen = self.classes_[idx] == values
+        if not seen.all():
+            idx = np.where(seen, idx, self._unseen(values[~seen]))
+        return idx.astype(int)
+
+    def full(self, value, n_rows):
+        """Column of n_rows copies of one value, encoded once."""
+        return np.full(n_rows, self.encode_one(value), dtype=int)
+
+
+class _Classes:
+    """Minimal LabelEncoder stand-in: just the fitted classes_."""
+
+    def __init__(self, classes):
+        self.classes_ = classes
+
+
+# -----------------------------
+# Exported encoder classes
+# -----------------------------
+# The only state a LabelEncoder has is classes_, so it is saved as a plain
+# .npy next to the pickle (named after the pickle's hash, like the flat
+# forest). Loading that never imports sklearn. Encoders fitted on pandas
+# columns have object-dtype classes, which np.load can't memory-map, so
+# classes are always written as fixed-width strings.
+
+CLASSES_SUFFIX = ".classes.npy"
+
+
+def export_classes(pkl_path):
+    """Write le.classes_ for the pickle at pkl_path (once per pickle version)."""
+    root, _ = os.path.splitext(pkl_path)
+    path = f"{root}.{file_digest(pkl_path)}{CLASSES_SUFFIX}"
+    if os.path.exists(path):
+        return path
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        classes = np.asarray(joblib.load(pkl_path).classes_)
+        if classes.dtype == object:
+            classes = classes.astype(str)
+        np.save(f, classes)
+    os.replace(tmp, path)
+    for old in glob.glob(f"{root}.*{CLASSES_SUFFIX}"):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def load_encoder(pkl_path, unseen="first", mmap=True):
+    """CompiledEncoder for the LabelEncoder pickle at pkl_path, via its exported classes."""
+    classes = np.load(export_classes(pkl_path), mmap_mode="r" if mmap else None)
+    return CompiledEncoder.from_classes(np.asarray(classes), unseen=unseen)
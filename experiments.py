@@ -0,0 +1,118 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np # type: ignore
+
+from simulation import Simulation, ScriptedDemand
+
+# -----------------------------
+# Monte Carlo experiment runner
+# -----------------------------
+# Runs many seeded, headless Simulation instances over a parameter grid and
+# aggregates their service metrics. Every (parameters, seed) job is
+# independent, so jobs are spread over a process pool and throughput grows
+# with the number of cores.
+#
+# Run: python experiments.py --taxis 5 10 20 --reduction 15 30 --seeds 16 --ticks 2000
+
+# Parameters a sweep may vary: Simulation keyword arguments plus the
+# scripted demand ones
+DEMAND_PARAMS = ("demand_rate", "demand_intensity", "demand_duration")
+
+
+def road_layout(spacing, size):
+    """Evenly spaced roads, e.g. spacing 3 on a 20-cell side gives 3, 6, ... 18."""
+    return list(range(spacing, size, spacing))
+
+
+def run_one(job):
+    """One headless run. job = (params, seed, ticks); returns the params, seed and metrics."""
+    params, seed, ticks = job
+    sim_kwargs = {k: v for k, v in params.items() if k not in DEMAND_PARAMS and k != "road_spacing"}
+    if "road_spacing" in params:
+        sim_kwargs["horizontal_roads"] = road_layout(params["road_spacing"], sim_kwargs.get("height", 20))
+        sim_kwargs["vertical_roads"] = road_layout(params["road_spacing"], sim_kwargs.get("width", 20))
+    sim = Simulation(seed=seed, **sim_kwargs)
+    demand = ScriptedDemand(rate=params.get("demand_rate", 0.2),
+                            intensity=params.get("demand_intensity", 15),
+                            duration=params.get("demand_duration", 20), seed=seed)
+    run = sim.run_headless(max_ticks=ticks, demand=demand)
+    metrics = sim.metrics()
+    metrics["ticks_per_second"] = run["ticks_per_second"]
+    return {"params": params, "seed": seed, "metrics": metrics}
+
+
+def expand(grid):
+    """Every combination of a {name: [values]} grid, as a list of dicts."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def aggregate(results):
+    """Mean / std / min / max of every metric, per parameter combination."""
+    groups = {}
+    for r in results:
+        groups.setdefault(json.dumps(r["params"], sort_keys=True), []).append(r)
+    summary = []
+    for key, runs in groups.items():
+        row = {"params": json.loads(key), "runs": len(runs)}
+        for name in runs[0]["metrics"]:
+            values = np.array([run["metrics"][name] for run in runs], dtype=float)
+            row[name] = {"mean": float(values.mean()), "std": float(values.std()),
+                         "min": float(values.min()), "max": float(values.max())}
+        summary.append(row)
+    return summary
+
+
+def sweep(grid, seeds, ticks, workers=None, base_seed=0):
+    """
+    Run every parameter combination of grid with seeds different seeds each.
+    Returns (per-run results, aggregated summary, wall seconds).
+    """
+    jobs = [(params, base_seed + s, ticks) for params in expand(grid) for s in range(seeds)]
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if workers == 1:
+        results = [run_one(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Jobs are similar in size; a few per task keeps IPC overhead low
+            chunk = max(1, len(jobs) // (workers * 4))
+            results = list(pool.map(run_one, jobs, chunksize=chunk))
+    return results, aggregate(results), time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seeded parameter sweeps of the taxi swarm")
+    parser.add_argument("--taxis", type=int, nargs="+", default=[10], help="N_TAXIS values")
+    parser.add_argument("--reduction", type=float, nargs="+", default=[30],
+                        help="DEMAND_REDUCTION_RATE_PER_SECOND values")
+    parser.add_argument("--road-spacing", type=int, nargs="+", default=[3], help="cells between roads")
+    parser.add_argument("--demand-rate", type=float, nargs="+", default=[0.2], help="demand events per tick")
+    parser.add_argument("--seeds", type=int, default=8, help="runs per parameter combination")
+    parser.add_argument("--base-seed", type=int, default=0)
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, help="processes (default: all cores)")
+    parser.add_argument("--out", help="write per-run results and the summary to this JSON file")
+    args = parser.parse_args()
+
+    grid = {"n_taxis": args.taxis, "demand_reduction_rate": args.reduction,
+            "road_spacing": args.road_spacing, "demand_rate": args.demand_rate}
+    results, summary, seconds = sweep(grid, args.seeds, args.ticks, args.workers, args.base_seed)
+
+    print(f"{len(results)} runs x {args.ticks} ticks in {seconds:.1f}s "
+          f"({len(results) * args.ticks / seconds:.0f} ticks/s)")
+    print(f"{'taxis':>6}{'reduce':>8}{'roads':>6}{'rate':>6}{'services':>10}{'served %':>10}{'idle %':>8}")
+    for row in summary:
+        p = row["params"]
+        print(f"{p['n_taxis']:>6}{p['demand_reduction_rate']:>8g}{p['road_spacing']:>6}{p['demand_rate']:>6g}"
+              f"{row['services']['mean']:>10.1f}{100 * row['served_fraction']['mean']:>9.1f}%"
+              f"{100 * row['idle_fraction']['mean']:>7.1f}%")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"runs": results, "summary": summary}, f, indent=2)
+        print(f"✅ Results saved to {args.out}")
@@ -0,0 +1,189 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np # type: ignore
+
+# -----------------------------
+# Flattened random forest
+# -----------------------------
+# A RandomForestClassifier stored as a handful of contiguous node arrays
+# (every tree concatenated), evaluated for all trees and rows at once with
+# NumPy. It reproduces sklearn's predict_proba bit for bit but skips the
+# per-call validation and per-tree dispatch that dominate small batches.
+#
+# On disk it is a directory of .npy files next to the pickle, named after the
+# pickle's hash, so any process can memory-map it without unpickling sklearn.
+
+FLAT_SUFFIX = ".flat"
+_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "classes")
+# Rows per evaluation chunk, so (rows x trees) index arrays stay small
+_CHUNK_NODES = 1 << 18
+
+
+def file_digest(path):
+    """sha1 of a file's contents (first 16 hex chars)."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+class FlatForest:
+    """
+    Drop-in for RandomForestClassifier.predict / predict_proba.
+
+    Node arrays (one entry per node, trees concatenated):
+      feature    split feature (0 on leaves)
+      threshold  go left if x[feature] <= threshold
+      left/right child node ids; leaves point at themselves
+      value      per-node class probabilities (normalised like sklearn)
+      roots      node id of each tree's root
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes,
+                 max_depth, n_features_in):
+        # np.asarray drops the memmap subclass (still backed by the mapping),
+        # which keeps fancy indexing on the fast ndarray path
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        self.left = np.asarray(left)
+        self.right = np.asarray(right)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots)
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_estimators = len(roots)
+        self.n_features_in_ = int(n_features_in)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for est in forest.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            ids = np.arange(n)
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, ids, tree.children_right) + offset)
+            # Same normalisation DecisionTreeClassifier.predict_proba applies per row
+            proba = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+            offset += n
+        return cls(
+            np.concatenate(features).astype(np.int32),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(lefts).astype(np.int32),
+            np.concatenate(rights).astype(np.int32),
+            np.ascontiguousarray(np.concatenate(values)),
+            np.array(roots, dtype=np.int32),
+            np.asarray(forest.classes_),
+            max(est.tree_.max_depth for est in forest.estimators_),
+            forest.n_features_in_,
+        )
+
+    # -------- persistence --------
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            arr = self.classes_ if name == "classes" else getattr(self, name)
+            np.save(os.path.join(path, f"{name}.npy"), arr)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"max_depth": self.max_depth, "n_features_in": self.n_features_in_}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                  for name in _ARRAYS}
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+                   arrays["value"], arrays["roots"], np.asarray(arrays["classes"]),
+                   meta["max_depth"], meta["n_features_in"])
+
+    # -------- inference --------
+    def apply(self, X):
+        """Leaf node id per (row, tree), like forest.apply but in flat ids."""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat_x = X.ravel()
+        row_base = (np.arange(len(X), dtype=np.int32) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_estimators))
+        for _ in range(self.max_depth):
+            go_left = flat_x[row_base + self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        step = max(1, _CHUNK_NODES // max(1, self.n_estimators))
+        for start in range(0, len(X), step):
+            leaves = self.apply(X[start:start + step])
+            # (trees, rows, classes): summing over axis 0 adds one tree at a
+            # time, in the same order sklearn accumulates them
+            per_tree = self.value[leaves.T]
+            out[start:start + step] = per_tree.sum(axis=0) / self.n_estimators
+        return out
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def flat_path(model_path, digest):
+    root, _ = os.path.splitext(model_path)
+    return f"{root}.{digest}{FLAT_SUFFIX}"
+
+
+def export(model_path, model=None):
+    """Flatten the pickle at model_path (once per pickle version). Returns the directory."""
+    digest = file_digest(model_path)
+    path = flat_path(model_path, digest)
+    if os.path.isdir(path):
+        return path
+    if model is None:
+        model = joblib.load(model_path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    FlatForest.from_sklearn(model).save(tmp)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another worker finished the same export first
+        shutil.rmtree(tmp, ignore_errors=True)
+    root, _ = os.path.splitext(model_path)
+    for old in glob.glob(f"{root}.*{FLAT_SUFFIX}"):
+        if old != path:
+            shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def load_forest(model_path, model=None, mmap=True):
+    """
+    FlatForest for the pickle at model_path, exporting it first if needed.
+    Falls back to the sklearn model itself if flattening isn't possible.
+    """
+    try:
+        return FlatForest.load(export(model_path, model), mmap=mmap)
+    except Exception:
+        return model if model is not None else joblib.load(model_path)
+
+
+if __name__ == "__main__":
+    # Offline export: python flat_forest.py [path/to/model.pkl]
+    import sys
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Trained models")
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base, "landmark_demand_predictor.pkl")
+    print(f"✅ Flat forest saved to {export(src)}")
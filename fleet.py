@@ -0,0 +1,312 @@
+import numpy as np # type: ignore
+
+# ---------------- FLEET ----------------
+# The whole fleet as parallel NumPy arrays (struct of arrays) instead of one
+# Python object per taxi, so a tick moves and re-states every taxi in a few
+# array operations.
+#
+# Routes live in one shared, growable cell buffer: taxi i's remaining route
+# is path_x/path_y[path_pos[i]:path_end[i]], and a move just advances
+# path_pos. Dead segments are compacted away when the buffer fills up.
+
+IDLE, EN_ROUTE, SERVICING, DROPPING_OFF, ROAMING = range(5)
+STATE_NAMES = ("IDLE", "EN_ROUTE", "SERVICING", "DROPPING_OFF", "ROAMING")
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
+# States in which a taxi follows its route
+MOVING = np.zeros(len(STATE_NAMES), dtype=bool)
+MOVING[[EN_ROUTE, DROPPING_OFF, ROAMING]] = True
+
+TRAIL_LENGTH = 2
+NO_TILE = -1
+
+
+class Fleet:
+    """
+    Taxi state for n taxis. route(start, end) returns a path list shaped like
+    find_path's ([start, ..., end], [] if unreachable).
+    """
+
+    def __init__(self, route, positions=()):
+        self.route = route
+        self.reset(positions)
+
+    def reset(self, positions):
+        pos = np.array(positions, dtype=np.int32).reshape(-1, 2)
+        n = len(pos)
+        self.x = pos[:, 0].copy()
+        self.y = pos[:, 1].copy()
+        self.display_x = self.x.astype(float)
+        self.display_y = self.y.astype(float)
+        self.state = np.full(n, IDLE, dtype=np.int8)
+        self.dest_x = self.x.copy()
+        self.dest_y = self.y.copy()
+        self.last_x = np.full(n, NO_TILE, dtype=np.int32)
+        self.last_y = np.full(n, NO_TILE, dtype=np.int32)
+        self.trail = np.zeros((n, TRAIL_LENGTH, 2), dtype=np.int32)
+        self.trail_len = np.zeros(n, dtype=np.int8)
+        self.path_pos = np.zeros(n, dtype=np.int64)
+        self.path_end = np.zeros(n, dtype=np.int64)
+        self.path_x = np.zeros(max(64, 16 * n), dtype=np.int32)
+        self.path_y = np.zeros_like(self.path_x)
+        self._path_used = 0
+        self._views = [Taxi(self, i) for i in range(n)]
+
+    # -------- sequence of Taxi views --------
+    def __len__(self):
+        return len(self._views)
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __getitem__(self, i):
+        return self._views[i]
+
+    # -------- routes --------
+    def path_length(self, i):
+        return int(self.path_end[i] - self.path_pos[i])
+
+    def path_cells(self, i):
+        s, e = self.path_pos[i], self.path_end[i]
+        return list(zip(self.path_x[s:e].tolist(), self.path_y[s:e].tolist()))
+
+    def set_path(self, i, cells):
+        cells = np.asarray(cells, dtype=np.int32).reshape(-1, 2)
+        n = len(cells)
+        if self._path_used + n > len(self.path_x):
+            self._compact(n)
+        start = self._path_used
+        self.path_x[start:start + n] = cells[:, 0]
+        self.path_y[start:start + n] = cells[:, 1]
+        self.path_pos[i] = start
+        self.path_end[i] = start + n
+        self._path_used = start + n
+
+    def _compact(self, extra):
+        """Drop consumed route cells, growing the buffer if live routes still don't fit."""
+        starts, length, src = self._live_cells()
+        live = len(src)
+        size = len(self.path_x)
+        while live + extra > size // 2:
+            size *= 2
+        new_x = np.zeros(size, dtype=np.int32)
+        new_y = np.zeros(size, dtype=np.int32)
+        new_x[:live] = self.path_x[src]
+        new_y[:live] = self.path_y[src]
+        self.path_x, self.path_y = new_x, new_y
+        self.path_pos = starts
+        self.path_end = starts + length
+        self._path_used = live
+
+    def _live_cells(self):
+        """(starts, lengths, buffer indices) of every remaining route, packed back to back."""
+        length = self.path_end - self.path_pos
+        starts = np.cumsum(length) - length
+        # Gather every live segment in one go: cell k of taxi i comes from path_pos[i] + k
+        src = np.repeat(self.path_pos - starts, length) + np.arange(int(length.sum()))
+        return starts, length, src
+
+    def set_destination(self, i, target_x, target_y):
+        self.dest_x[i] = target_x
+        self.dest_y[i] = target_y
+        start = (int(self.x[i]), int(self.y[i]))
+        if start == (target_x, target_y):
+            path = []
+        else:
+            path = self.route(start, (target_x, target_y))
+        if len(path) > 1:
+            self.set_path(i, path[1:])
+        else:
+            self.path_pos[i] = self.path_end[i] = 0
+
+    # -------- snapshots --------
+    _ARRAYS = ("x", "y", "display_x", "display_y", "state", "dest_x", "dest_y",
+               "last_x", "last_y", "trail", "trail_len")
+
+    def arrays(self):
+        """
+        The whole fleet as {name: array}, for snapshots (snapshot.py). Routes
+        come out compacted: route_len per taxi plus the remaining cells of
+        every route back to back in route_x / route_y.
+        """
+        out = {name: getattr(self, name) for name in self._ARRAYS}
+        _, length, src = self._live_cells()
+        out["route_len"] = length
+        out["route_x"] = self.path_x[src]
+        out["route_y"] = self.path_y[src]
+        return out
+
+    def load_arrays(self, arrays):
+        """Restore a fleet saved with arrays(); the arrays are used as-is, not copied."""
+        self.reset(np.zeros((len(arrays["x"]), 2)))
+        for name in self._ARRAYS:
+            setattr(self, name, arrays[name])
+        length = np.asarray(arrays["route_len"], dtype=np.int64)
+        self.path_pos = np.cumsum(length) - length
+        self.path_end = self.path_pos + length
+        self._path_used = int(length.sum())
+        if self._path_used:
+            self.path_x, self.path_y = arrays["route_x"], arrays["route_y"]
+
+    # -------- per-tick updates, whole fleet at once --------
+    def move(self):
+        """One step along the route for every moving taxi that has one."""
+        moving = np.nonzero(MOVING[self.state] & (self.path_pos < self.path_end))[0]
+        if len(moving):
+            self._step(moving)
+        return moving
+
+    def _step(self, moving):
+        step = self.path_pos[moving]
+        nx = self.path_x[step]
+        ny = self.path_y[step]
+        self.x[moving] = nx
+        self.y[moving] = ny
+        self.path_pos[moving] = step + 1
+
+        # Trail keeps the last TRAIL_LENGTH positions, oldest first
+        n = self.trail_len[moving]
+        full = moving[n == TRAIL_LENGTH]
+        self.trail[full, :-1] = self.trail[full, 1:]
+        slot = np.minimum(n, TRAIL_LENGTH - 1)
+        self.trail[moving, slot, 0] = nx
+        self.trail[moving, slot, 1] = ny
+        self.trail_len[moving] = np.minimum(n + 1, TRAIL_LENGTH)
+
+    # -------- lagging taxis (event-driven runs) --------
+    # Between its own events a moving taxi can be left where it was last
+    # updated, `behind` moves short of where move() would have put it. Its
+    # route still holds every cell it skipped, so catching up is exact.
+    def positions_ahead(self, behind):
+        """(x, y) of every taxi once it has made behind[i] more moves (0 = where it is)."""
+        lag = np.nonzero(behind)[0]
+        if len(lag) == 0:
+            return self.x, self.y
+        step = self.path_pos[lag] + behind[lag] - 1
+        x, y = self.x.copy(), self.y.copy()
+        x[lag] = self.path_x[step]
+        y[lag] = self.path_y[step]
+        return x, y
+
+    def catch_up(self, idx, behind):
+        """Make behind[j] moves for taxi idx[j] at once; same end state as that many move() calls."""
+        if len(idx) == 0:
+            return
+        few = behind < TRAIL_LENGTH
+        if few.any():
+            for k in range(1, TRAIL_LENGTH):
+                self._step(idx[few & (behind >= k)])
+            idx, behind = idx[~few], behind[~few]
+        far, k = idx, behind
+        if len(far) == 0:
+            return
+        pos = self.path_pos[far] + k
+        self.x[far] = self.path_x[pos - 1]
+        self.y[far] = self.path_y[pos - 1]
+        for j in range(TRAIL_LENGTH):
+            self.trail[far, j, 0] = self.path_x[pos - TRAIL_LENGTH + j]
+            self.trail[far, j, 1] = self.path_y[pos - TRAIL_LENGTH + j]
+        self.trail_len[far] = TRAIL_LENGTH
+        self.path_pos[far] = pos
+
+    def arrive(self):
+        """Taxis at the end of their route: EN_ROUTE -> SERVICING, others -> IDLE."""
+        done = self.path_pos >= self.path_end
+        self.state[done & (self.state == EN_ROUTE)] = SERVICING
+        self.state[done & ((self.state == DROPPING_OFF) | (self.state == ROAMING))] = IDLE
+
+    def update_display_positions(self, alpha=0.2):
+        self.display_x += (self.x - self.display_x) * alpha
+        self.display_y += (self.y - self.display_y) * alpha
+
+    # -------- queries --------
+    def indices(self, state):
+        return np.nonzero(self.state == state)[0]
+
+    def cells(self, idx):
+        return set(zip(self.x[idx].tolist(), self.y[idx].tolist()))
+
+    def busy_destinations(self):
+        """Destinations of every non-IDLE taxi."""
+        busy = self.state != IDLE
+        return set(zip(self.dest_x[busy].tolist(), self.dest_y[busy].tolist()))
+
+    def idle_taxis(self):
+        return [self._views[i] for i in self.indices(IDLE).tolist()]
+
+
+# ---------------- TAXI VIEW ----------------
+class Taxi:
+    """
+    One taxi of a Fleet, with the old per-object attributes (x, y, state,
+    path, trail, ...) read from and written to the fleet arrays.
+    """
+    __slots__ = ("fleet", "i")
+
+    def __init__(self, fleet, i):
+        self.fleet = fleet
+        self.i = i
+
+    x = property(lambda self: int(self.fleet.x[self.i]))
+    y = property(lambda self: int(self.fleet.y[self.i]))
+    display_x = property(lambda self: float(self.fleet.display_x[self.i]))
+    display_y = property(lambda self: float(self.fleet.display_y[self.i]))
+
+    @x.setter
+    def x(self, value):
+        self.fleet.x[self.i] = value
+
+    @y.setter
+    def y(self, value):
+        self.fleet.y[self.i] = value
+
+    @property
+    def state(self):
+        return STATE_NAMES[self.fleet.state[self.i]]
+
+    @state.setter
+    def state(self, name):
+        self.fleet.state[self.i] = STATE_CODES[name]
+
+    @property
+    def destination(self):
+        return (int(self.fleet.dest_x[self.i]), int(self.fleet.dest_y[self.i]))
+
+    @property
+    def last_serviced_tile(self):
+        x = int(self.fleet.last_x[self.i])
+        return None if x == NO_TILE else (x, int(self.fleet.last_y[self.i]))
+
+    @last_serviced_tile.setter
+    def last_serviced_tile(self, tile):
+        self.fleet.last_x[self.i], self.fleet.last_y[self.i] = (NO_TILE, NO_TILE) if tile is None else tile
+
+    @property
+    def path(self):
+        """Remaining route (a copy; use set_destination to change it)."""
+        return self.fleet.path_cells(self.i)
+
+    @property
+    def trail(self):
+        n = self.fleet.trail_len[self.i]
+        return [tuple(p) for p in self.fleet.trail[self.i, :n].tolist()]
+
+    def set_destination(self, target_x, target_y):
+        self.fleet.set_destination(self.i, target_x, target_y)
+
+    def move(self):
+        f, i = self.fleet, self.i
+        if MOVING[f.state[i]] and f.path_pos[i] < f.path_end[i]:
+            step = f.path_pos[i]
+            f.x[i], f.y[i] = f.path_x[step], f.path_y[step]
+            f.path_pos[i] = step + 1
+            n = f.trail_len[i]
+            if n == TRAIL_LENGTH:
+                f.trail[i, :-1] = f.trail[i, 1:]
+            f.trail[i, min(n, TRAIL_LENGTH - 1)] = (f.x[i], f.y[i])
+            f.trail_len[i] = min(n + 1, TRAIL_LENGTH)
+
+    def update_display_position(self, alpha=0.2):
+        f, i = self.fleet, self.i
+        f.display_x[i] += (f.x[i] - f.display_x[i]) * alpha
+        f.display_y[i] += (f.y[i] - f.display_y[i]) * alpha
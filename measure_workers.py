@@ -0,0 +1,106 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+# -----------------------------
+# Gunicorn worker memory / startup measurement
+# -----------------------------
+# Starts Backend_2 under gunicorn in each loading mode and reports startup
+# time plus RSS and PSS per worker (PSS splits shared pages between the
+# processes mapping them, so it shows what sharing actually saves).
+# Linux only: reads /proc/<pid>/smaps_rollup.
+#
+# Run: python measure_workers.py --workers 4
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODES = [
+    # label, MODEL_LOAD_MODE, extra gunicorn args
+    ("before: pickle per worker", "pickle", []),
+    ("after: mmap + --preload", "mmap", ["--preload"]),
+]
+
+
+def memory_kb(pid):
+    """(rss, pss) in kB for one process."""
+    rss = pss = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.02)
+    return False
+
+
+def measure(label, load_mode, extra, workers, port, requests):
+    env = dict(os.environ, MODEL_LOAD_MODE=load_mode)
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers),
+           "-b", f"127.0.0.1:{port}", *extra, "Backend_2:app"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(f"http://127.0.0.1:{port}/", timeout=60):
+            raise RuntimeError(f"{label}: gunicorn did not come up")
+        startup = time.perf_counter() - t0
+        # Wait for every worker to boot, then spread requests so each one
+        # has imported and touched the model
+        while len(children(proc.pid)) < workers:
+            time.sleep(0.05)
+        for _ in range(requests):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/next_demand").read()
+        time.sleep(0.5)
+
+        pids = children(proc.pid)
+        mem = [memory_kb(p) for p in pids]
+        master = memory_kb(proc.pid)
+        return {
+            "label": label,
+            "startup_s": startup,
+            "rss_per_worker_mb": sum(r for r, _ in mem) / len(mem) / 1024,
+            "pss_per_worker_mb": sum(p for _, p in mem) / len(mem) / 1024,
+            "pss_total_mb": (sum(p for _, p in mem) + master[1]) / 1024,
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    # Make sure the .npy exports exist so the mmap run measures loading, not exporting
+    subprocess.run([sys.executable, "-c", "import Backend_2"], cwd=BASE_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    print(f"{'mode':<28}{'startup s':>10}{'RSS/worker':>12}{'PSS/worker':>12}{'PSS total':>11}")
+    for label, load_mode, extra in MODES:
+        r = measure(label, load_mode, extra, args.workers, args.port, args.requests)
+        print(f"{r['label']:<28}{r['startup_s']:>10.2f}{r['rss_per_worker_mb']:>10.1f}MB"
+              f"{r['pss_per_worker_mb']:>10.1f}MB{r['pss_total_mb']:>9.1f}MB")
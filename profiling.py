@@ -0,0 +1,209 @@
+import inspect
+import json
+import math
+import os
+import time
+import weakref
+from multiprocessing.util import Finalize, register_after_fork
+
+# -----------------------------
+# Simulation profiling
+# -----------------------------
+# Per-phase timers with percentile summaries, plus plain counters (A* calls,
+# nodes expanded, assignments, ...). Off by default; set
+#
+#   TAXI_PROFILE=taxi_profile.json   (or TAXI_PROFILE=1 for that default name)
+#
+# and the process-wide PROFILER records everything, dumping it as JSON at
+# exit. "{pid}" in the path is replaced by the process id, for pools where
+# every worker writes its own file: pool workers (forked or spawned) leave
+# through os._exit and never run atexit handlers, so the dump is registered
+# with multiprocessing's exit finalizers, which they do run. With profiling off, PROFILER is a
+# NullProfiler whose hooks do nothing.
+#
+# Timings go into log-spaced histogram buckets (~5% wide), so memory stays
+# fixed however long the run and percentiles are accurate to one bucket.
+
+ENV_VAR = "TAXI_PROFILE"
+DEFAULT_PATH = "taxi_profile.json"
+
+_BASE = 1e-7      # seconds; bucket 0 holds everything faster
+_STEP = 1.05
+_BUCKETS = 500    # up to ~4 minutes
+_LOG_STEP = math.log(_STEP)
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = [0] * _BUCKETS
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        i = 0 if seconds <= _BASE else min(_BUCKETS - 1, int(math.log(seconds / _BASE) / _LOG_STEP) + 1)
+        self.buckets[i] += 1
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile (capped at the true max)."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(self.max, _BASE * _STEP ** i)
+        return self.max
+
+    def summary(self):
+        ms = 1e3
+        return {"count": self.count, "total_s": self.total,
+                "mean_ms": self.total / self.count * ms if self.count else 0.0,
+                "min_ms": (self.min if self.count else 0.0) * ms,
+                "p50_ms": self.percentile(50) * ms, "p90_ms": self.percentile(90) * ms,
+                "p99_ms": self.percentile(99) * ms, "max_ms": self.max * ms}
+
+
+class _Phase:
+    """
+    Reusable `with` block that times itself into a histogram. One object per
+    phase name is shared by every caller, so nesting the same phase (e.g. in
+    a recursive call) only times the outermost block; the inner ones would
+    otherwise overwrite its start and be counted twice. Not thread-safe.
+    """
+    __slots__ = ("hist", "start", "depth")
+
+    def __init__(self, hist):
+        self.hist = hist
+        self.start = 0.0
+        self.depth = 0
+
+    def __enter__(self):
+        if not self.depth:
+            self.start = time.perf_counter()
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if not self.depth:
+            self.hist.record(time.perf_counter() - self.start)
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        self._sources = {}
+        self.reset()
+
+    def reset(self):
+        """Drop every timing and counter recorded so far; sources stay."""
+        self.timers = {}
+        self.counters = {}
+        self._phases = {}
+        self.started = time.time()
+
+    def phase(self, name):
+        """with profiler.phase("move"): ... times the block."""
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self._timer(name))
+        return phase
+
+    def _timer(self, name):
+        hist = self.timers.get(name)
+        if hist is None:
+            hist = self.timers[name] = Histogram()
+        return hist
+
+    def add(self, name, seconds):
+        """Record a duration measured elsewhere."""
+        self._timer(name).record(seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_source(self, name, stats):
+        """
+        Include stats() (a dict) under name in every report, e.g. a route cache.
+        Registering a name again replaces the earlier source. A bound method is
+        held weakly, so the profiler doesn't keep its object alive; once the
+        object is gone its entry is dropped.
+        """
+        self._sources[name] = weakref.WeakMethod(stats) if inspect.ismethod(stats) else (lambda: stats)
+
+    def report(self):
+        out = {"pid": os.getpid(), "started": self.started, "wall_s": time.time() - self.started,
+               "phases": {name: hist.summary() for name, hist in sorted(self.timers.items())},
+               "counters": dict(sorted(self.counters.items()))}
+        for name, ref in list(self._sources.items()):
+            stats = ref()
+            if stats is None:
+                del self._sources[name]
+            else:
+                out[name] = stats()
+        return out
+
+    def dump(self, path=DEFAULT_PATH):
+        path = path.replace("{pid}", str(os.getpid()))
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullProfiler:
+    """Same hooks as Profiler, all no-ops."""
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def add(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def add_source(self, name, stats):
+        pass
+
+
+def from_env():
+    """Profiler dumping to $TAXI_PROFILE at exit, or a NullProfiler if it isn't set."""
+    value = os.environ.get(ENV_VAR, "").strip()
+    if not value or value == "0":
+        return NullProfiler()
+    path = DEFAULT_PATH if value == "1" else value
+    profiler = Profiler()
+    _dump_at_exit(profiler, path)
+    # multiprocessing drops inherited finalizers in a forked child, which
+    # then starts a report of its own
+    register_after_fork(profiler, lambda child: (child.reset(), _dump_at_exit(child, path)))
+    return profiler
+
+
+def _dump_at_exit(profiler, path):
+    Finalize(None, profiler.dump, args=(path,), exitpriority=10)
+
+
+PROFILER = from_env()
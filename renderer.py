@@ -0,0 +1,156 @@
+from fleet import DROPPING_OFF, SERVICING
+
+# ---------------- PYGAME RENDERER ----------------
+# Dirty-rectangle drawing for basic.py's window. The road layer never
+# changes between road edits, so it is drawn once into a background surface.
+# Each frame then only touches:
+#   - cells whose overlay changed (demand appeared or expired, drop-off
+#     point set or cleared)
+#   - the areas taxis (with their trails) covered last frame and cover now
+#   - the time label
+# Those areas are restored from the background, overlays and taxis are
+# redrawn in the original order, and pygame.display.update() pushes just
+# those rectangles. The picture is the same as a full redraw (draw_full).
+
+BACKGROUND = (30, 30, 30)
+ROAD = (50, 50, 50)
+BORDER = (80, 80, 80)
+DROP_OFF = (0, 200, 0)
+DEMAND = (255, 50, 50)
+TRAIL = (180, 180, 0)
+LABEL_HEIGHT = 40
+
+
+class Renderer:
+    def __init__(self, pygame, screen, sim, cell_size, font, drop_offs=True):
+        self.pygame = pygame
+        self.screen = screen
+        self.sim = sim
+        self.cell = cell_size
+        self.font = font
+        # Drop-off cells come from taxi destinations, which replays don't have
+        self.drop_offs = drop_offs
+        self.label_rect = pygame.Rect(0, sim.height * cell_size, sim.width * cell_size, LABEL_HEIGHT)
+        self.background = None
+        self._roads_version = None
+        self._overlay = {}
+        self._taxi_rects = []
+        self._label_text = None
+
+    # -------- layers --------
+    def _cell_rect(self, x, y):
+        return self.pygame.Rect(x*self.cell, y*self.cell, self.cell, self.cell)
+
+    def _build_background(self):
+        pygame, roads = self.pygame, self.sim.roads
+        surface = pygame.Surface(self.screen.get_size()).convert()
+        surface.fill(BACKGROUND)
+        for x in range(self.sim.width):
+            for y in range(self.sim.height):
+                rect = self._cell_rect(x, y)
+                pygame.draw.rect(surface, ROAD if roads[x,y] else BACKGROUND, rect)
+                pygame.draw.rect(surface, BORDER, rect, 1)
+        self.background = surface
+        self._roads_version = self.sim.roads.version
+
+    def _current_overlay(self):
+        """(x, y) -> colour for every cell that differs from the road layer."""
+        taxis, sources = self.sim.taxis, self.sim.click_events
+        overlay = {}
+        if self.drop_offs:
+            dropping = taxis.state == DROPPING_OFF
+            overlay = dict.fromkeys(zip(taxis.dest_x[dropping].tolist(), taxis.dest_y[dropping].tolist()), DROP_OFF)
+        # Demand is painted over drop-off points, as in a full redraw
+        overlay.update(dict.fromkeys(zip(sources.x.tolist(), sources.y.tolist()), DEMAND))
+        return overlay
+
+    def _draw_overlay_cell(self, x, y, color):
+        rect = self._cell_rect(x, y)
+        self.pygame.draw.rect(self.screen, color, rect)
+        if color == DROP_OFF:
+            self.pygame.draw.rect(self.screen, BORDER, rect, 1)
+
+    def _draw_taxis(self):
+        """Draw every taxi; returns the screen area each one covers."""
+        pygame, screen, c = self.pygame, self.screen, self.cell
+        taxis = self.sim.taxis
+        half = c // 2
+        rects = []
+        trail, trail_len = taxis.trail.tolist(), taxis.trail_len.tolist()
+        for i, (dx, dy, state) in enumerate(zip(taxis.display_x.tolist(), taxis.display_y.tolist(),
+                                                taxis.state.tolist())):
+            area = None
+            points = trail[i][:trail_len[i]]
+            for t in range(1, len(points)):
+                (x1, y1), (x2, y2) = points[t-1], points[t]
+                line = pygame.draw.line(screen, TRAIL, (x1*c+half, y1*c+half), (x2*c+half, y2*c+half), 2)
+                area = line if area is None else area.union(line)
+            rect = pygame.Rect(dx*c+6, dy*c+6, c-12, c-12)
+            color = (255,255,0) if state == SERVICING else (0,150,255) if state == DROPPING_OFF else (200,200,200)
+            pygame.draw.rect(screen, color, rect, border_radius=4)
+            pygame.draw.rect(screen, (0,0,0), rect, 1, border_radius=4)
+            area = rect if area is None else area.union(rect)
+            # Anti-aliasing and rounding can spill a pixel past the reported rect
+            rects.append(area.inflate(4, 4))
+        return rects
+
+    def _draw_label(self, text):
+        self.screen.blit(self.background, self.label_rect, self.label_rect)
+        label = self.font.render(text, True, (255,255,255))
+        self.screen.blit(label, (10, self.label_rect.top + 10))
+        self._label_text = text
+
+    # -------- frames --------
+    def draw_full(self, time_tick, text=None):
+        """Redraw everything (first frame, and after the road layout changes)."""
+        if self.background is None or self._roads_version != self.sim.roads.version:
+            self._build_background()
+        self.sim.taxis.update_display_positions()
+        self.screen.blit(self.background, (0, 0))
+        self._overlay = self._current_overlay()
+        for (x, y), color in self._overlay.items():
+            self._draw_overlay_cell(x, y, color)
+        self._taxi_rects = self._draw_taxis()
+        self._draw_label(text or f"Time: {time_tick}")
+        self.pygame.display.flip()
+
+    def draw(self, time_tick, text=None):
+        """Draw one frame, touching only what changed since the last one; text replaces the time label."""
+        if self.background is None or self._roads_version != self.sim.roads.version:
+            return self.draw_full(time_tick, text)
+        pygame = self.pygame
+        self.sim.taxis.update_display_positions()
+
+        overlay = self._current_overlay()
+        changed = {cell for cell in overlay.keys() | self._overlay.keys()
+                   if overlay.get(cell) != self._overlay.get(cell)}
+        dirty = list(self._taxi_rects)
+        dirty.extend(self._cell_rect(x, y) for x, y in changed)
+
+        # Restore the road layer under last frame's taxis and changed cells
+        screen_rect = self.screen.get_rect()
+        for rect in dirty:
+            self.screen.blit(self.background, rect, rect)
+        # ...then repaint overlays that were uncovered
+        touched = self._cells_under(dirty)
+        for cell, color in overlay.items():
+            if cell in touched:
+                self._draw_overlay_cell(cell[0], cell[1], color)
+        self._overlay = overlay
+
+        self._taxi_rects = self._draw_taxis()
+        dirty.extend(self._taxi_rects)
+        text = text or f"Time: {time_tick}"
+        if text != self._label_text:
+            self._draw_label(text)
+            dirty.append(self.label_rect)
+        pygame.display.update([r.clip(screen_rect) for r in dirty])
+
+    def _cells_under(self, rects):
+        cells = set()
+        c = self.cell
+        for r in rects:
+            x0, x1 = max(0, r.left // c), min(self.sim.width - 1, (r.right - 1) // c)
+            y0, y1 = max(0, r.top // c), min(self.sim.height - 1, (r.bottom - 1) // c)
+            cells.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+        return cells
@@ -0,0 +1,334 @@
+import argparse
+import bisect
+import os
+import time
+
+import numpy as np # type: ignore
+
+from fleet import TRAIL_LENGTH
+from trajectory import index_chunks, map_chunk
+
+# -----------------------------
+# Trajectory replay
+# -----------------------------
+# Plays back a trajectory log (time,taxi_id,x,y CSV or binary .trj, see
+# trajectory.py) without re-running the simulation, either in the pygame
+# window or as one PNG per tick. Logs are streamed, never loaded whole:
+#
+#   .trj  the chunk records are the index (read from their .npy headers);
+#         a tick is one row of a memory-mapped chunk
+#   .csv  the first open scans the file once and keeps the byte offset of
+#         every INDEX_EVERY-th tick, cached next to the log as <log>.idx.npz;
+#         a seek reads at most INDEX_EVERY ticks from the nearest offset
+#
+# Frames depend on the tick alone, so a replay looks the same at any speed
+# and after any seek.
+#
+#   python replay.py taxi_swarm_log.csv                    # window
+#   python replay.py run.csv --start 5000 --speed 50
+#   python replay.py run.trj --export frames/ --stop 2000  # PNG per tick
+#
+# Window keys: space pause, left/right one tick, up/down double/halve the
+# speed, home/end jump, click the bottom strip to scrub.
+
+INDEX_EVERY = 1024
+
+
+class TrjLog:
+    """Random access to the ticks of a binary .trj log."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = index_chunks(path)
+        counts = [n for _, _, n in self.entries]
+        self.starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.n_ticks = int(self.starts[-1])
+        self._mapped = (None, None)
+        # First time of every chunk: the sparse time index
+        self.first_times = [int(self._chunk(j)["time"][0]) for j in range(len(self.entries))]
+
+    def _chunk(self, j):
+        if self._mapped[0] != j:
+            self._mapped = (j, map_chunk(self.path, self.entries[j]))
+        return self._mapped[1]
+
+    def frame(self, i):
+        """(time, x, y, state) of tick index i, as fresh arrays."""
+        j = int(np.searchsorted(self.starts, i, "right")) - 1
+        row = self._chunk(j)[i - self.starts[j]]
+        return int(row["time"]), row["x"].astype(np.int32), row["y"].astype(np.int32), row["state"].copy()
+
+    def seek_time(self, t):
+        """Index of the first tick at or after time t (n_ticks if none)."""
+        j = max(0, bisect.bisect_right(self.first_times, t) - 1)
+        if not self.entries:
+            return 0
+        row = int(np.searchsorted(self._chunk(j)["time"], t))
+        return min(self.n_ticks, int(self.starts[j]) + row)
+
+    def close(self):
+        self._mapped = (None, None)
+
+
+class CsvLog:
+    """Random access to the ticks of a time,taxi_id,x,y CSV log, through a sparse index."""
+
+    def __init__(self, path, every=INDEX_EVERY):
+        self.path = path
+        self.every = every
+        self._file = open(path, "rb")
+        self.times, self.offsets, self.n_ticks, self.n_taxis = self._load_index()
+        self._cursor = None   # tick index the file is positioned at
+        self._pending = None  # line read ahead of the cursor
+
+    def _load_index(self):
+        stat = os.stat(self.path)
+        cache = self.path + ".idx.npz"
+        try:
+            with np.load(cache) as idx:
+                if (int(idx["size"]) == stat.st_size and int(idx["mtime_ns"]) == stat.st_mtime_ns
+                        and int(idx["every"]) == self.every):
+                    return idx["times"].tolist(), idx["offsets"].tolist(), int(idx["n_ticks"]), int(idx["n_taxis"])
+        except (OSError, KeyError, ValueError):
+            pass
+        times, offsets, n_ticks, n_taxis = self._build_index()
+        try:
+            np.savez(cache, times=times, offsets=offsets, n_ticks=n_ticks, n_taxis=n_taxis,
+                     size=stat.st_size, mtime_ns=stat.st_mtime_ns, every=self.every)
+        except OSError:  # read-only directory: rebuild next time
+            pass
+        return times, offsets, n_ticks, n_taxis
+
+    def _build_index(self):
+        """One pass over the file: offset and time of every `every`-th tick."""
+        f = self._file
+        f.seek(0)
+        offset = len(f.readline())  # header
+        times, offsets = [], []
+        prev, n_ticks, rows, n_taxis = None, 0, 0, 0
+        for line in f:
+            comma = line.find(b",")
+            if comma > 0:
+                t = line[:comma]
+                if t != prev:
+                    if n_ticks % self.every == 0:
+                        times.append(int(t))
+                        offsets.append(offset)
+                    n_ticks += 1
+                    prev, rows = t, 0
+                rows += 1
+                n_taxis = max(n_taxis, rows)
+            offset += len(line)
+        return times, offsets, n_ticks, n_taxis
+
+    def _read_tick(self, parse=True):
+        line = self._pending or self._file.readline()
+        prefix = line[:line.index(b",") + 1]
+        rows = [line]
+        while True:
+            line = self._file.readline()
+            if not line.startswith(prefix):
+                break
+            rows.append(line)
+        self._pending = line or None
+        self._cursor += 1
+        if not parse:
+            return int(prefix[:-1])
+        values = np.array(b",".join(r.rstrip() for r in rows).split(b",")).astype(np.int64).reshape(-1, 4)
+        n = max(self.n_taxis, int(values[:, 1].max()) + 1)
+        x = np.zeros(n, dtype=np.int32)
+        y = np.zeros(n, dtype=np.int32)
+        x[values[:, 1]] = values[:, 2]
+        y[values[:, 1]] = values[:, 3]
+        # The CSV schema has no state column
+        return int(values[0, 0]), x, y, np.zeros(n, dtype=np.int8)
+
+    def _goto(self, k):
+        """Position the file at indexed tick k * every."""
+        self._file.seek(self.offsets[k])
+        self._cursor = k * self.every
+        self._pending = None
+
+    def frame(self, i):
+        """(time, x, y, state) of tick index i; consecutive calls just read on."""
+        if not 0 <= i < self.n_ticks:
+            raise IndexError(i)
+        if self._cursor is None or not self._cursor <= i < self._cursor + self.every:
+            self._goto(i // self.every)
+        while self._cursor < i:
+            self._read_tick(parse=False)
+        return self._read_tick()
+
+    def seek_time(self, t):
+        """Index of the first tick at or after time t (n_ticks if none)."""
+        k = max(0, bisect.bisect_right(self.times, t) - 1)
+        if not self.times:
+            return 0
+        self._goto(k)
+        while self._cursor < self.n_ticks:
+            i = self._cursor
+            pos, pending = self._file.tell(), self._pending
+            if self._read_tick(parse=False) >= t:
+                # Step back so the next frame(i) reads this tick
+                self._file.seek(pos)
+                self._cursor, self._pending = i, pending
+                return i
+        return self.n_ticks
+
+    def close(self):
+        self._file.close()
+
+
+def open_log(path):
+    """CsvLog for *.csv paths, TrjLog for anything else."""
+    return CsvLog(path) if path.lower().endswith(".csv") else TrjLog(path)
+
+
+# ---------------- PLAYBACK ----------------
+def show_frame(fleet, frame, prev=None):
+    """Put a logged tick into a Fleet for the renderer; taxis that moved since prev get a trail."""
+    _, x, y, state = frame
+    if len(fleet) != len(x):
+        fleet.reset(np.stack([x, y], axis=1))
+    fleet.x[:], fleet.y[:], fleet.state[:] = x, y, state
+    fleet.display_x[:], fleet.display_y[:] = x, y
+    fleet.trail_len[:] = 0
+    if prev is not None and len(prev[1]) == len(x):
+        moved = (prev[1] != x) | (prev[2] != y)
+        fleet.trail[moved, TRAIL_LENGTH - 2] = np.stack([prev[1][moved], prev[2][moved]], axis=1)
+        fleet.trail[moved, TRAIL_LENGTH - 1] = np.stack([x[moved], y[moved]], axis=1)
+        fleet.trail_len[moved] = 2
+
+
+def _scene(width, height, road_spacing, snapshot_path=None):
+    """A Simulation used only as the renderer's grid and fleet."""
+    from simulation import Simulation
+    if snapshot_path:
+        from snapshot import load
+        sim = load(snapshot_path)[0]
+        sim.click_events.clear()
+        return sim
+    roads = list(range(road_spacing, max(width, height), road_spacing))
+    return Simulation(width, height, 0, horizontal_roads=[r for r in roads if r < height],
+                      vertical_roads=[r for r in roads if r < width])
+
+
+def _frame_pair(log, i, last=None):
+    """
+    Tick i and the one before it (for trails). last is the (index, frame) of
+    the previous call; when it holds tick i - 1 it is reused, otherwise i - 1
+    is read before i. Either way reads only move forward, which CsvLog needs
+    to keep reading on instead of going back to an index entry.
+    """
+    if i == 0:
+        prev = None
+    elif last is not None and last[0] == i - 1:
+        prev = last[1]
+    else:
+        prev = log.frame(i - 1)
+    return log.frame(i), prev
+
+
+def play(log, scene, speed=2.0, start=0, cell_size=30, fps=30):
+    """Replay in a window, speed in ticks per second."""
+    import pygame # type: ignore
+    from renderer import Renderer, LABEL_HEIGHT
+    pygame.init()
+    screen = pygame.display.set_mode((scene.width*cell_size, scene.height*cell_size+LABEL_HEIGHT))
+    pygame.display.set_caption(f"Replay: {os.path.basename(log.path)}")
+    font = pygame.font.SysFont("Consolas", 12)
+    clock = pygame.time.Clock()
+    renderer = Renderer(pygame, screen, scene, cell_size, font, drop_offs=False)
+    strip = renderer.label_rect
+
+    last = log.n_ticks - 1
+    pos, paused, shown, frame = float(start), False, None, None
+    before = time.perf_counter()
+    running = log.n_ticks > 0
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.MOUSEBUTTONDOWN and strip.collidepoint(event.pos):
+                pos = float(int(last * event.pos[0] / max(1, strip.width - 1)))
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    paused = True
+                    pos = float(int(pos) + (1 if event.key == pygame.K_RIGHT else -1))
+                elif event.key == pygame.K_UP:
+                    speed *= 2
+                elif event.key == pygame.K_DOWN:
+                    speed /= 2
+                elif event.key == pygame.K_HOME:
+                    pos = 0.0
+                elif event.key == pygame.K_END:
+                    pos = float(last)
+
+        now = time.perf_counter()
+        if not paused:
+            pos += speed * (now - before)
+        before = now
+        pos = min(max(pos, 0.0), float(last))
+        i = int(pos)
+        if i != shown:
+            # At high speed only the latest due tick is read and drawn
+            frame, prev = _frame_pair(log, i, (shown, frame))
+            show_frame(scene.taxis, frame, prev)
+            shown = i
+        state = "paused" if paused else f"{speed:g} ticks/s"
+        renderer.draw(frame[0], f"Replay  t={frame[0]}  tick {i + 1}/{log.n_ticks}  {state}")
+        clock.tick(fps)
+    pygame.quit()
+
+
+def export_frames(log, scene, out_dir, start=0, stop=None, step=1, cell_size=30):
+    """Write frame_<time>.png for every step-th tick in [start, stop); returns how many."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame # type: ignore
+    from renderer import Renderer, LABEL_HEIGHT
+    pygame.init()
+    screen = pygame.display.set_mode((scene.width*cell_size, scene.height*cell_size+LABEL_HEIGHT))
+    font = pygame.font.SysFont("Consolas", 12)
+    renderer = Renderer(pygame, screen, scene, cell_size, font, drop_offs=False)
+    os.makedirs(out_dir, exist_ok=True)
+    stop = log.n_ticks if stop is None else min(stop, log.n_ticks)
+    written, last = 0, None
+    for i in range(start, stop, step):
+        frame, prev = _frame_pair(log, i, last)
+        last = (i, frame)
+        show_frame(scene.taxis, frame, prev)
+        renderer.draw(frame[0])
+        pygame.image.save(screen, os.path.join(out_dir, f"frame_{frame[0]:06d}.png"))
+        written += 1
+    pygame.quit()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a taxi swarm trajectory log")
+    parser.add_argument("log", help=".csv or .trj trajectory log")
+    parser.add_argument("--speed", type=float, default=2.0, help="ticks per second")
+    parser.add_argument("--start", type=int, help="time to start at")
+    parser.add_argument("--stop", type=int, help="export: time to stop before")
+    parser.add_argument("--step", type=int, default=1, help="export: every n-th tick")
+    parser.add_argument("--export", metavar="DIR", help="write PNG frames instead of opening a window")
+    parser.add_argument("--snapshot", help="take the road grid from this snapshot (snapshot.py)")
+    parser.add_argument("--width", type=int, default=20)
+    parser.add_argument("--height", type=int, default=20)
+    parser.add_argument("--road-spacing", type=int, default=3)
+    args = parser.parse_args()
+
+    opened = time.perf_counter()
+    log = open_log(args.log)
+    print(f"{args.log}: {log.n_ticks} ticks, indexed in {time.perf_counter() - opened:.2f}s")
+    scene = _scene(args.width, args.height, args.road_spacing, args.snapshot)
+    start = 0 if args.start is None else log.seek_time(args.start)
+    if args.export:
+        stop = None if args.stop is None else log.seek_time(args.stop)
+        n = export_frames(log, scene, args.export, start, stop, args.step)
+        print(f"✅ {n} frames written to {args.export}")
+    else:
+        play(log, scene, args.speed, start)
+    log.close()
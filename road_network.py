@@ -0,0 +1,397 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np # type: ignore
+from flask import jsonify, request # type: ignore
+from scipy.sparse import csr_matrix # type: ignore
+from scipy.sparse.csgraph import dijkstra # type: ignore
+from scipy.spatial import cKDTree # type: ignore
+
+from candidate_grid import on_land
+
+# -----------------------------
+# Local road routing
+# -----------------------------
+# Routes for the Leaflet front ends, served by the backends instead of the
+# public OSRM demo server. The road graph is loaded once from an edge list:
+#
+#   .csv      lat1,lon1,lat2,lon2 per road segment (two-way)
+#   .geojson  LineString / MultiLineString features, e.g. an OSM export;
+#             "oneway": "yes" / true in the properties makes them one-way
+#
+# ROAD_NETWORK_PATH points the backends at the edge list, which they load
+# once when they are imported. If it is unset, or the file is missing or
+# unreadable, the backends still start: the routing endpoints answer 503,
+# the front ends fall back to straight lines, and the rest of the API is
+# unaffected.
+#
+# RoadNetwork.synthetic_grid() is a SYNTHETIC street grid for tests and
+# benchmarks: a regular grid over the NYC box with candidate_grid's water
+# masks and three made-up East River crossings. It is not road data, and
+# the backends never fall back to it. `python road_network.py --build-grid
+# grid.csv` writes it out as an edge list.
+#
+# Shortest-path trees (scipy's Dijkstra) are cached per source node, so
+# every route from a recently used node is a predecessor walk. A batch of
+# legs runs Dijkstra once for all its new sources together. The cache is an
+# LRU bounded by the bytes of the trees it holds (each is two arrays over
+# every node), not by how many.
+
+ENV_VAR = "ROAD_NETWORK_PATH"
+
+EARTH_RADIUS_M = 6371000.0
+MAX_BATCH_LEGS = 5000
+MAX_TABLE_CELLS = 1000000
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def densify(lats, lons, step_m):
+    """Resample a polyline to a point every step_m metres (the front ends move one point per frame)."""
+    along = np.concatenate([[0.0], np.cumsum(haversine_m(lats[:-1], lons[:-1], lats[1:], lons[1:]))])
+    if along[-1] <= step_m:
+        return np.column_stack([lats, lons])
+    at = np.append(np.arange(0.0, along[-1], step_m), along[-1])
+    return np.column_stack([np.interp(at, along, lats), np.interp(at, along, lons)])
+
+
+class RoadNetwork:
+    """
+    Directed road graph: node coordinates plus (src, dst) edges. Edge
+    lengths default to the great-circle distance between their ends.
+    """
+
+    def __init__(self, lat, lon, src, dst, length_m=None, cache_bytes=128 * 1024 * 1024):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if length_m is None:
+            length_m = haversine_m(self.lat[src], self.lon[src], self.lat[dst], self.lon[dst])
+        length_m = np.asarray(length_m, dtype=float)
+        # csr_matrix sums duplicate edges; keep the shortest of each instead
+        order = np.lexsort((length_m, dst, src))
+        src, dst, length_m = src[order], dst[order], length_m[order]
+        first = np.ones(len(src), dtype=bool)
+        first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        n = len(self.lat)
+        self.graph = csr_matrix((length_m[first], (src[first], dst[first])), shape=(n, n))
+        self.n_edges = int(first.sum())
+
+        # Nearest-node lookups on an equirectangular projection around the centre
+        self._lon_scale = math.cos(math.radians(float(self.lat.mean()))) if n else 1.0
+        self._tree = cKDTree(np.column_stack([self.lat, self.lon * self._lon_scale])) if n else None
+
+        # source node -> (distances, predecessors); threads share one network
+        self._trees = OrderedDict()
+        self.cache_bytes = cache_bytes
+        self.tree_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.source = None  # where the graph came from, for stats()
+
+    def __len__(self):
+        return len(self.lat)
+
+    # -------- loading --------
+    @classmethod
+    def from_segments(cls, lat1, lon1, lat2, lon2, oneway=None):
+        """Graph from segment end points; ends closer than ~1 m become one node."""
+        ends = np.column_stack([np.concatenate([lat1, lat2]), np.concatenate([lon1, lon2])])
+        nodes, ids = np.unique(np.round(ends, 5), axis=0, return_inverse=True)
+        ids = ids.ravel()
+        k = len(lat1)
+        u, v = ids[:k], ids[k:]
+        two_way = np.ones(k, dtype=bool) if oneway is None else ~np.asarray(oneway, dtype=bool)
+        src = np.concatenate([u, v[two_way]])
+        dst = np.concatenate([v, u[two_way]])
+        keep = src != dst
+        return cls(nodes[:, 0], nodes[:, 1], src[keep], dst[keep])
+
+    @classmethod
+    def load(cls, path=None):
+        """The edge list at path or $ROAD_NETWORK_PATH; None if neither is set."""
+        path = path or os.environ.get(ENV_VAR)
+        if not path:
+            return None
+        if path.lower().endswith((".geojson", ".json")):
+            network = cls._load_geojson(path)
+        else:
+            data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+            network = cls.from_segments(data[:, 0], data[:, 1], data[:, 2], data[:, 3])
+        if not len(network):
+            raise ValueError(f"{path}: no road segments")
+        network.source = path
+        return network
+
+    @classmethod
+    def synthetic_grid(cls):
+        """The generated grid (see grid_segments) for tests and benchmarks; not real roads."""
+        s = np.array(grid_segments(), dtype=float)
+        network = cls.from_segments(s[:, 0], s[:, 1], s[:, 2], s[:, 3])
+        network.source = "synthetic grid"
+        return network
+
+    @classmethod
+    def _load_geojson(cls, path):
+        with open(path) as f:
+            features = json.load(f).get("features", [])
+        segments, oneway = [], []
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            lines = {"LineString": [geometry.get("coordinates")],
+                     "MultiLineString": geometry.get("coordinates")}.get(geometry.get("type"), [])
+            flag = (feature.get("properties") or {}).get("oneway") in (True, "yes", "true", "1")
+            for line in lines:
+                # GeoJSON positions are [lon, lat]
+                for (lo1, la1, *_), (lo2, la2, *_) in zip(line, line[1:]):
+                    segments.append((la1, lo1, la2, lo2))
+                    oneway.append(flag)
+        s = np.array(segments, dtype=float).reshape(-1, 4)
+        return cls.from_segments(s[:, 0], s[:, 1], s[:, 2], s[:, 3], oneway)
+
+    # -------- queries --------
+    def nearest(self, lat, lon):
+        """Closest node to each point (arrays or scalars)."""
+        lat, lon = np.broadcast_arrays(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+        _, idx = self._tree.query(np.column_stack([lat.ravel(), lon.ravel() * self._lon_scale]))
+        return idx.reshape(lat.shape)
+
+    def _shortest_trees(self, sources):
+        """{source: (distances, predecessors)}, running Dijkstra once for every uncached source."""
+        sources = list(dict.fromkeys(int(s) for s in sources))
+        with self._lock:
+            found = {s: self._trees[s] for s in sources if s in self._trees}
+            for s in found:
+                self._trees.move_to_end(s)
+        missing = [s for s in sources if s not in found]
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            dist, pred = dijkstra(self.graph, indices=missing, return_predecessors=True)
+            with self._lock:
+                for s, d, p in zip(missing, dist, pred):
+                    found[s] = (d, p)
+                    size = d.nbytes + p.nbytes
+                    if s in self._trees or size > self.cache_bytes:
+                        continue
+                    self._trees[s] = (d, p)
+                    self.tree_bytes += size
+                while self.tree_bytes > self.cache_bytes:
+                    _, (d, p) = self._trees.popitem(last=False)
+                    self.tree_bytes -= d.nbytes + p.nbytes
+                    self.evictions += 1
+        return found
+
+    def _node_path(self, tree, target):
+        dist, pred = tree
+        if not np.isfinite(dist[target]):
+            return None
+        path = [int(target)]
+        while pred[path[-1]] >= 0:
+            path.append(int(pred[path[-1]]))
+        return path[::-1]
+
+    def _leg(self, tree, start, end, target, step_m=None):
+        """Route dict: the raw start, the road nodes, the raw end."""
+        nodes = self._node_path(tree, target)
+        if nodes is None:
+            return {"coordinates": [], "distance_m": None}
+        # Getting on and off the network at the snapped nodes
+        lats = np.concatenate([[start[0]], self.lat[nodes], [end[0]]])
+        lons = np.concatenate([[start[1]], self.lon[nodes], [end[1]]])
+        access = haversine_m(lats[0], lons[0], lats[1], lons[1]) + haversine_m(lats[-2], lons[-2], lats[-1], lons[-1])
+        coords = densify(lats, lons, step_m) if step_m else np.column_stack([lats, lons])
+        return {"coordinates": coords.tolist(), "distance_m": float(tree[0][target] + access)}
+
+    def route(self, start, end, step_m=None):
+        """Shortest road route between two (lat, lng) points."""
+        return self.routes([(start, end)], step_m)[0]
+
+    def routes(self, legs, step_m=None):
+        """
+        Routes for [((lat, lng), (lat, lng)), ...], in order. With step_m,
+        the coordinates are resampled to one point every step_m metres.
+        """
+        if not legs:
+            return []
+        starts = np.array([leg[0] for leg in legs], dtype=float).reshape(-1, 2)
+        ends = np.array([leg[1] for leg in legs], dtype=float).reshape(-1, 2)
+        s_nodes = self.nearest(starts[:, 0], starts[:, 1]).tolist()
+        e_nodes = self.nearest(ends[:, 0], ends[:, 1]).tolist()
+        trees = self._shortest_trees(s_nodes)
+        return [self._leg(trees[s], tuple(a), tuple(b), e, step_m)
+                for s, e, a, b in zip(s_nodes, e_nodes, starts.tolist(), ends.tolist())]
+
+    def table(self, sources, targets):
+        """(len(sources), len(targets)) road distances in metres between snapped points; inf if unreachable."""
+        sources = np.array(sources, dtype=float).reshape(-1, 2)
+        targets = np.array(targets, dtype=float).reshape(-1, 2)
+        s_nodes = self.nearest(sources[:, 0], sources[:, 1])
+        t_nodes = self.nearest(targets[:, 0], targets[:, 1])
+        trees = self._shortest_trees(s_nodes.tolist())
+        return np.array([trees[s][0][t_nodes] for s in s_nodes.tolist()]).reshape(len(sources), len(targets))
+
+    def stats(self):
+        return {"source": self.source, "nodes": len(self), "edges": self.n_edges,
+                "cached_trees": len(self._trees), "cache_bytes": self.tree_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def load_network(path=None):
+    """RoadNetwork.load(), or None (with a warning) if no edge list is set or it can't be read."""
+    try:
+        network = RoadNetwork.load(path)
+    except Exception as e:
+        print(f"⚠️ Routing disabled, could not load the road network: {type(e).__name__}: {e}",
+              file=sys.stderr)
+        return None
+    if network is None:
+        print(f"⚠️ Routing disabled: ${ENV_VAR} is not set", file=sys.stderr)
+    return network
+
+
+# ---------------- FLASK ENDPOINTS ----------------
+def _point(value):
+    """[lat, lng] or "lat,lng" -> (lat, lng)."""
+    if isinstance(value, str):
+        value = value.split(",")
+    lat, lng = (float(v) for v in value)
+    return lat, lng
+
+
+def _step(value):
+    """Optional step_m: None or a positive number of metres."""
+    if value is None:
+        return None
+    step = float(value)
+    if not step > 0:
+        raise ValueError(value)
+    return step
+
+
+def add_routing_endpoints(app, network):
+    """
+    GET  /nearest?lat=..&lng=..           closest road node
+    GET  /route?from=lat,lng&to=lat,lng   one route
+    POST /route/batch                     many routes in one request:
+      {"legs": [{"from": [lat, lng], "to": [lat, lng]}, ...], "step_m": 25}
+        -> {"routes": [{"coordinates": [[lat, lng], ...], "distance_m": ...}, ...]}
+      {"sources": [[lat, lng], ...], "targets": [[lat, lng], ...]}
+        -> {"distance_m": [[...], ...]}   (null where unreachable)
+    step_m (optional, also a /route parameter) resamples the coordinates to
+    one point every step_m metres. Unreachable legs come back with empty
+    coordinates and a null distance. With network None (see load_network)
+    every endpoint answers 503.
+    """
+    if network is None:
+        def unavailable():
+            return jsonify({"error": "road network unavailable"}), 503
+        for rule, name, methods in (("/nearest", "nearest", ["GET"]), ("/route", "route", ["GET"]),
+                                    ("/route/batch", "route_batch", ["POST"])):
+            app.add_url_rule(rule, name, unavailable, methods=methods)
+        return
+
+    @app.route("/nearest")
+    def nearest():
+        try:
+            lat, lng = _point((request.args["lat"], request.args["lng"]))
+        except (KeyError, ValueError):
+            return jsonify({"error": "lat and lng are required"}), 400
+        node = int(network.nearest(lat, lng))
+        return jsonify({"lat": float(network.lat[node]), "lng": float(network.lon[node])})
+
+    @app.route("/route")
+    def route():
+        try:
+            start, end = _point(request.args["from"]), _point(request.args["to"])
+            step_m = _step(request.args.get("step_m"))
+        except (KeyError, ValueError):
+            return jsonify({"error": "from and to must be lat,lng, step_m a positive number"}), 400
+        return jsonify(network.route(start, end, step_m))
+
+    @app.route("/route/batch", methods=["POST"])
+    def route_batch():
+        payload = request.get_json(force=True) or {}
+        try:
+            if "sources" in payload:
+                sources = [_point(p) for p in payload["sources"]]
+                targets = [_point(p) for p in payload.get("targets", payload["sources"])]
+                if len(sources) * len(targets) > MAX_TABLE_CELLS:
+                    return jsonify({"error": f"table too large ({len(sources) * len(targets)} > {MAX_TABLE_CELLS})"}), 400
+                dist = network.table(sources, targets) if sources and targets else np.zeros((len(sources), 0))
+                return jsonify({"distance_m": [[d if np.isfinite(d) else None for d in row]
+                                               for row in dist.tolist()]})
+            legs = [(_point(leg["from"]), _point(leg["to"])) for leg in payload.get("legs", [])]
+            step_m = _step(payload.get("step_m"))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "points must be [lat, lng], step_m a positive number"}), 400
+        if len(legs) > MAX_BATCH_LEGS:
+            return jsonify({"error": f"batch too large ({len(legs)} > {MAX_BATCH_LEGS})"}), 400
+        return jsonify({"routes": network.routes(legs, step_m)})
+
+
+# ---------------- SYNTHETIC GRID ----------------
+# Generated, not surveyed: evenly spaced streets and invented bridges.
+GRID_BOX = (40.60, 40.85, -74.05, -73.80)  # the front ends' random-point box
+GRID_SPACING = 0.004                       # degrees between streets (~400 m)
+# Crossings of the East River band (lat): Brooklyn, Williamsburg, Queensboro bridges
+BRIDGES = (40.706, 40.713, 40.757)
+
+
+def grid_segments(box=GRID_BOX, spacing=GRID_SPACING, bridges=BRIDGES):
+    """Street grid segments on land, plus a bridge over the East River band at each latitude."""
+    lat_min, lat_max, lon_min, lon_max = box
+    lats = np.round(np.arange(lat_min, lat_max + spacing / 2, spacing), 6)
+    lons = np.round(np.arange(lon_min, lon_max + spacing / 2, spacing), 6)
+    land = np.array([[on_land(la, lo) for lo in lons] for la in lats])
+    segments = []
+    for i, la in enumerate(lats):
+        for j, lo in enumerate(lons):
+            if not land[i, j]:
+                continue
+            if j + 1 < len(lons) and land[i, j + 1]:
+                segments.append((la, lo, la, lons[j + 1]))
+            if i + 1 < len(lats) and land[i + 1, j]:
+                segments.append((la, lo, lats[i + 1], lo))
+    for bridge in bridges:
+        i = int(np.abs(lats - bridge).argmin())
+        west = [j for j in range(len(lons)) if land[i, j] and lons[j] <= -73.99]
+        east = [j for j in range(len(lons)) if land[i, j] and lons[j] >= -73.94]
+        if west and east:
+            segments.append((lats[i], lons[west[-1]], lats[i], lons[east[0]]))
+    return segments
+
+
+def write_segments(path, segments):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["lat1", "lon1", "lat2", "lon2"])
+        writer.writerows((f"{a:.6f}", f"{b:.6f}", f"{c:.6f}", f"{d:.6f}") for a, b, c, d in segments)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Road graph for the routing endpoints")
+    parser.add_argument("--build-grid", metavar="CSV", help="write the synthetic street grid as an edge list")
+    parser.add_argument("--path", help="edge list to inspect (default: $ROAD_NETWORK_PATH or the synthetic grid)")
+    args = parser.parse_args()
+
+    if args.build_grid:
+        segments = grid_segments()
+        write_segments(args.build_grid, segments)
+        print(f"✅ {len(segments)} synthetic road segments written to {args.build_grid}")
+    else:
+        network = RoadNetwork.load(args.path) or RoadNetwork.synthetic_grid()
+        print(network.stats())
@@ -0,0 +1,237 @@
+from collections import OrderedDict
+
+import numpy as np # type: ignore
+
+try:
+    from scipy.sparse import coo_matrix # type: ignore
+    from scipy.sparse.csgraph import shortest_path # type: ignore
+except ImportError:  # routing tables are an optimisation; A* still works without scipy
+    shortest_path = None
+
+# ---------------- ROUTING TABLES ----------------
+# The road grid is static, so every shortest path can be worked out once.
+# Road cells become graph nodes; a BFS from every node (scipy's unweighted
+# shortest_path) gives an all-pairs distance table and a next-hop table, and
+# a route is read off the next-hop table in O(path length).
+#
+# Tables cost 2 * n_nodes^2 small ints, so grids with more than
+# MAX_PRECOMPUTE_NODES road cells keep using A* on demand.
+
+MAX_PRECOMPUTE_NODES = 2048
+UNREACHABLE = -1
+
+_STEPS = [(0,1),(0,-1),(1,0),(-1,0)]
+
+
+class RoadRouter:
+    def __init__(self, roads):
+        roads = np.asarray(roads, dtype=bool)
+        self.shape = roads.shape
+        self.cells = np.argwhere(roads)  # node id -> (x, y)
+        n = len(self.cells)
+        self.node_of = np.full(roads.shape, -1, dtype=np.int32)  # (x, y) -> node id
+        self.node_of[roads] = np.arange(n, dtype=np.int32)
+
+        # 4-neighbour road adjacency
+        src, dst = [], []
+        for dx, dy in _STEPS:
+            nx = self.cells[:, 0] + dx
+            ny = self.cells[:, 1] + dy
+            ok = (nx >= 0) & (nx < roads.shape[0]) & (ny >= 0) & (ny < roads.shape[1])
+            ids = np.nonzero(ok)[0]
+            nbr = self.node_of[nx[ok], ny[ok]]
+            keep = nbr >= 0
+            src.append(ids[keep])
+            dst.append(nbr[keep])
+        src = np.concatenate(src)
+        dst = np.concatenate(dst)
+        graph = coo_matrix((np.ones(len(src)), (src, dst)), shape=(n, n)).tocsr()
+
+        dist, pred = shortest_path(graph, method="D", unweighted=True,
+                                   directed=False, return_predecessors=True)
+        idx_dtype = np.int16 if n < np.iinfo(np.int16).max else np.int32
+        reachable = np.isfinite(dist)
+        self.dist = np.where(reachable, dist, UNREACHABLE).astype(idx_dtype)
+        # pred[t, s] is the node before s on the BFS path from t, i.e. the
+        # first step from s towards t (roads are undirected): row t is a
+        # next-hop table for every route ending at t.
+        self.next_hop = pred.astype(idx_dtype)
+        self._cell_tuples = [(int(x), int(y)) for x, y in self.cells]
+
+    @classmethod
+    def build(cls, roads, max_nodes=MAX_PRECOMPUTE_NODES):
+        """RoadRouter for the grid, or None if it's too big (or scipy is missing)."""
+        if shortest_path is None or int(np.count_nonzero(roads)) > max_nodes:
+            return None
+        return cls(roads)
+
+    def _node(self, pos):
+        x, y = pos
+        if not (0 <= x < self.shape[0] and 0 <= y < self.shape[1]):
+            return -1
+        return int(self.node_of[x, y])
+
+    def distance(self, start_pos, end_pos):
+        """Road distance in steps, UNREACHABLE if there's no route, None if off-road."""
+        s, t = self._node(start_pos), self._node(end_pos)
+        if s < 0 or t < 0:
+            return None
+        return int(self.dist[s, t])
+
+    def path(self, start_pos, end_pos):
+        """
+        Same shape as find_path: [start, ..., end], [] if unreachable.
+        None if either end is off the road network (caller falls back to A*).
+        """
+        s, t = self._node(start_pos), self._node(end_pos)
+        if s < 0 or t < 0:
+            return None
+        if self.dist[s, t] == UNREACHABLE:
+            return []
+        hops = self.next_hop[t]
+        cells = self._cell_tuples
+        path = [tuple(start_pos)]
+        while s != t:
+            s = int(hops[s])
+            path.append(cells[s])
+        return path
+
+
+# ---------------- ROAD GRID ----------------
+class RoadGrid(np.ndarray):
+    """
+    Boolean road array that counts its own edits, which is how route caches
+    and tables know they are stale. .version is bumped by:
+      - assignment, including through slices such as roads[:, y] = True
+      - ufuncs writing into it: roads |= mask, np.logical_not(m, out=roads)
+      - roads.fill(), roads.put() and np.copyto / np.putmask / np.place /
+        np.put / np.fill_diagonal with it as the destination
+    Writes that bypass numpy's dispatch (roads.flat[i] = ..., another array
+    sharing its memory, raw buffer access) are not seen; call
+    Simulation.rebuild_router() after those.
+    """
+
+    def __new__(cls, shape):
+        obj = np.zeros(shape, dtype=bool).view(cls)
+        obj._owner = None
+        obj._version = 0
+        return obj
+
+    def __array_finalize__(self, obj):
+        # Views write into their parent's memory, so edits count against the
+        # parent; results of ufuncs like roads & mask have their own memory
+        base = self.base
+        if isinstance(obj, RoadGrid) and base is not None and (base is obj or base is obj.base):
+            self._owner = obj._owner if obj._owner is not None else obj
+        else:
+            self._owner = None
+        self._version = 0
+
+    @property
+    def version(self):
+        return (self._owner if self._owner is not None else self)._version
+
+    def _touch(self):
+        (self._owner if self._owner is not None else self)._version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch()
+
+    def __array_ufunc__(self, ufunc, method, *inputs, out=None, **kwargs):
+        # Run the ufunc on plain arrays, then count an edit on every RoadGrid
+        # it wrote into (in-place operators arrive here with out=(self,))
+        plain = tuple(x.view(np.ndarray) if isinstance(x, RoadGrid) else x for x in inputs)
+        if out is not None:
+            kwargs["out"] = tuple(o.view(np.ndarray) if isinstance(o, RoadGrid) else o for o in out)
+        result = getattr(ufunc, method)(*plain, **kwargs)
+        if out is not None:
+            for o in out:
+                if isinstance(o, RoadGrid):
+                    o._touch()
+            return out[0] if len(out) == 1 else out
+        if isinstance(result, np.ndarray):
+            return result.view(RoadGrid)
+        return result
+
+    def __array_function__(self, func, types, args, kwargs):
+        result = super().__array_function__(func, types, args, kwargs)
+        if func in _WRITES_FIRST_ARG and args and isinstance(args[0], RoadGrid):
+            args[0]._touch()
+        return result
+
+    def fill(self, value):
+        super().fill(value)
+        self._touch()
+
+    def put(self, *args, **kwargs):
+        super().put(*args, **kwargs)
+        self._touch()
+
+
+# numpy functions that write into their first argument
+_WRITES_FIRST_ARG = {np.copyto, np.putmask, np.place, np.fill_diagonal}
+
+
+# ---------------- ROUTE CACHE ----------------
+# Bytes charged per cached route, roughly what CPython spends on the key,
+# the path tuple and its (x, y) tuples
+_ENTRY_BYTES = 200
+_CELL_BYTES = 72
+
+
+class RouteCache:
+    """
+    Bounded LRU of (start, end) -> path, sized by estimated memory rather than
+    entry count, and cleared whenever the road grid's version changes.
+    """
+
+    def __init__(self, roads, max_bytes=32 * 1024 * 1024):
+        self.roads = roads
+        self.max_bytes = max_bytes
+        self._routes = OrderedDict()
+        self._version = getattr(roads, "version", 0)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def clear(self):
+        self._routes.clear()
+        self.bytes = 0
+
+    def _check_version(self):
+        version = getattr(self.roads, "version", 0)
+        if version != self._version:
+            self._version = version
+            self.invalidations += 1
+            self.clear()
+
+    def get(self, start_pos, end_pos, compute):
+        """Cached path, or compute(start_pos, end_pos) stored for next time. Returns a fresh list."""
+        self._check_version()
+        key = (start_pos, end_pos)
+        path = self._routes.get(key)
+        if path is not None:
+            self._routes.move_to_end(key)
+            self.hits += 1
+            return list(path)
+
+        self.misses += 1
+        path = tuple(compute(start_pos, end_pos))
+        size = _ENTRY_BYTES + _CELL_BYTES * len(path)
+        if size <= self.max_bytes:
+            self._routes[key] = path
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, old = self._routes.popitem(last=False)
+                self.bytes -= _ENTRY_BYTES + _CELL_BYTES * len(old)
+                self.evictions += 1
+        return list(path)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._routes), "bytes": self.bytes, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations}
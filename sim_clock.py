@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+# -----------------------------
+# Shared simulation clock
+# -----------------------------
+# One tick counter for every gunicorn worker and thread, kept in a small
+# SQLite file. Each advance() is a single write transaction, so concurrent
+# callers get distinct, strictly increasing ticks no matter which process
+# answers.
+#
+# The file outlives the server, but a restart still starts the week over at
+# Monday 00:00, as the old in-process counter did: Backend_2 opens the clock
+# with reset=True at import. The Procfile runs gunicorn with --preload, so
+# that import (and the reset) happens once in the master, not per worker,
+# and a respawned worker picks up the running clock. Set SIM_CLOCK_KEEP=1 to
+# continue from the stored tick after a restart instead.
+
+TICKS_PER_DAY = 96  # 24h * 4 ticks per hour (15 min each)
+DAYS_PER_WEEK = 7
+
+DEFAULT_PATH = os.environ.get(
+    "SIM_CLOCK_PATH", os.path.join(tempfile.gettempdir(), "taxi_swarm_clock.sqlite"))
+KEEP_ENV = "SIM_CLOCK_KEEP"
+
+
+def keep_on_start():
+    """True if $SIM_CLOCK_KEEP asks to continue from the stored tick after a restart."""
+    return os.environ.get(KEEP_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+class SharedClock:
+    def __init__(self, path=DEFAULT_PATH, reset=False):
+        """reset=True puts a clock left over from an earlier run back to tick 0."""
+        self.path = path
+        self._local = threading.local()
+        # Set up on a connection of its own and close it again: the clock is
+        # built in the gunicorn --preload master, and SQLite's locking breaks
+        # in children forked while their parent has the file open
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS clock (id INTEGER PRIMARY KEY, tick INTEGER NOT NULL)")
+                conn.execute("INSERT OR IGNORE INTO clock (id, tick) VALUES (0, 0)")
+                if reset:
+                    conn.execute("UPDATE clock SET tick = 0 WHERE id = 0")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # SQLite connections must not cross threads or a fork (gunicorn --preload),
+        # so each thread of each process opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def advance(self, n=1):
+        """Atomically claim ticks [t, t + n) and return t."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (tick,) = conn.execute("SELECT tick FROM clock WHERE id = 0").fetchone()
+            conn.execute("UPDATE clock SET tick = ? WHERE id = 0", (tick + n,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return tick
+
+    def peek(self):
+        """Next tick advance() would hand out."""
+        (tick,) = self._conn().execute("SELECT tick FROM clock WHERE id = 0").fetchone()
+        return tick
+
+    def reset(self, tick=0):
+        self._conn().execute("UPDATE clock SET tick = ? WHERE id = 0", (tick,))
+
+
+def split_tick(tick):
+    """(day_index, time_index) for an absolute tick; day 0 = Monday."""
+    day, time_index = divmod(tick, TICKS_PER_DAY)
+    return day % DAYS_PER_WEEK, time_index
@@ -0,0 +1,497 @@
+import heapq
+import random
+import time
+
+import numpy as np # type: ignore
+
+from assignment import AssignmentEngine
+from demand_sources import DemandSources
+from fleet import Fleet, MOVING, STATE_CODES, STATE_NAMES, IDLE, EN_ROUTE, SERVICING, DROPPING_OFF
+from profiling import PROFILER
+from routing import RoadGrid, RoadRouter, RouteCache
+from trajectory import open_sink
+
+# ---------------- SIMULATION ----------------
+# Everything one taxi swarm run needs: city grid, demand, fleet, routing,
+# random number generators and trajectory log. Separate Simulation objects
+# share nothing, so many runs can live in one process, or one per worker
+# (see experiments.py). basic.py drives a single instance for the
+# pygame window and its headless mode.
+
+DEFAULT_ROADS = [3, 6, 9, 12, 15, 18]
+
+
+class Simulation:
+    def __init__(self, width=20, height=20, n_taxis=10, horizontal_roads=DEFAULT_ROADS,
+                 vertical_roads=DEFAULT_ROADS, demand_reduction_rate=30, ticks_per_second=2,
+                 assignment_mode="greedy", seed=None, profiler=None):
+        self.width = width
+        self.height = height
+        self.demand_reduction_per_tick = demand_reduction_rate / ticks_per_second
+
+        # Same streams as the module-level random / np.random the simulation
+        # used to draw from, so a given seed replays the same run
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.RandomState(seed)
+
+        self.demand_map = np.zeros((width, height))
+        self.demand_history_map = np.zeros((width, height))
+        # Live demand events (clicks / scripted arrivals), stored column-wise
+        self.click_events = DemandSources()
+
+        # RoadGrid is a bool array that tracks edits, so routing caches notice changes
+        self.roads = RoadGrid((width, height))
+        for y in horizontal_roads:
+            self.roads[:, y] = True
+        for x in vertical_roads:
+            self.roads[x, :] = True
+        self.road_positions = [(x, y) for x in range(width) for y in range(height) if self.roads[x,y]]
+
+        # All-pairs tables for the road grid (routing.py); None on grids too
+        # big to precompute, which then route with A* behind an LRU cache
+        self.router = RoadRouter.build(self.roads)
+        self.router_version = self.roads.version
+        self.route_cache = RouteCache(self.roads)
+
+        # Keeps its own index of positive demand cells; every write to
+        # demand_map below is mirrored into assigner.index
+        self.assigner = AssignmentEngine(self.roads, mode=assignment_mode, router=self.router,
+                                         rng=self.np_rng)
+
+        # The fleet keeps every taxi in NumPy arrays (fleet.py); iterating it
+        # or indexing it gives Taxi views with the usual x / y / state / path
+        self.taxis = Fleet(self.find_path)
+        self.trajectory_sink = None
+        # Phase timers and counters (profiling.py); no-ops unless TAXI_PROFILE is set
+        self.profiler = PROFILER if profiler is None else profiler
+        self.profiler.add_source("route_cache", self.route_cache.stats)
+        self._reset_counters()
+        self.init_taxis(n_taxis)
+
+    # -------- setup --------
+    def init_taxis(self, n):
+        self.taxis.reset([self.rng.choice(self.road_positions) for _ in range(n)])
+
+    def reset(self, seed=None, n_taxis=None):
+        """Fresh demand maps and fleet; with a seed, runs are reproducible."""
+        if seed is not None:
+            self.rng.seed(seed)
+            self.np_rng.seed(seed)
+        self.demand_map[:] = 0
+        self.assigner.index.rebuild(self.demand_map)
+        self.demand_history_map[:] = 0
+        self.click_events.clear()
+        self._reset_counters()
+        self.init_taxis(len(self.taxis) if n_taxis is None else n_taxis)
+
+    def _reset_counters(self):
+        self.ticks = 0
+        self.services = 0
+        self.demand_added = 0.0
+        self.demand_served = 0.0
+        self.state_ticks = np.zeros(len(STATE_NAMES), dtype=np.int64)
+
+    # -------- pathfinding --------
+    def rebuild_router(self):
+        """Rebuild the precomputed tables; find_path does this itself when roads change."""
+        self.router = RoadRouter.build(self.roads)
+        self.router_version = self.roads.version
+        self.assigner.router = self.router
+
+    def find_path(self, start_pos, end_pos):
+        """Shortest path restricted to roads: table lookup, or cached A* as a fallback."""
+        if not self.profiler.enabled:
+            return self._find_path(start_pos, end_pos)
+        start = time.perf_counter()
+        path = self._find_path(start_pos, end_pos)
+        self.profiler.add("find_path", time.perf_counter() - start)
+        return path
+
+    def _find_path(self, start_pos, end_pos):
+        if self.router_version != self.roads.version:
+            self.rebuild_router()
+        if self.router is not None:
+            path = self.router.path(start_pos, end_pos)
+            if path is not None:
+                self.profiler.count("router_paths")
+                return path
+        return self.route_cache.get(start_pos, end_pos, self.astar_path)
+
+    def astar_path(self, start_pos, end_pos):
+        """A* pathfinding restricted to roads."""
+        def heuristic(a, b):
+            return abs(a[0]-b[0]) + abs(a[1]-b[1])
+
+        roads = self.roads
+        open_list = []
+        heapq.heappush(open_list, (0, start_pos))
+        came_from = {}
+        g_score = {start_pos: 0}
+        expanded = 0
+
+        while open_list:
+            _, current = heapq.heappop(open_list)
+            expanded += 1
+
+            if current == end_pos:
+                self._count_astar(expanded)
+                path = []
+                while current in came_from:
+                    path.append(current)
+                    current = came_from[current]
+                path.append(start_pos)
+                return path[::-1]
+
+            for dx, dy in [(0,1),(0,-1),(1,0),(-1,0)]:
+                neighbor = (current[0]+dx, current[1]+dy)
+                if not (0 <= neighbor[0] < self.width and 0 <= neighbor[1] < self.height):
+                    continue
+                if not roads[neighbor]:
+                    continue  # only move on roads
+                tentative_g_score = g_score[current]+1
+                if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
+                    g_score[neighbor] = tentative_g_score
+                    f_score = tentative_g_score + heuristic(neighbor, end_pos)
+                    heapq.heappush(open_list, (f_score, neighbor))
+                    came_from[neighbor] = current
+        self._count_astar(expanded)
+        return []
+
+    def _count_astar(self, expanded):
+        self.profiler.count("astar_calls")
+        self.profiler.count("astar_nodes_expanded", expanded)
+
+    # -------- demand --------
+    def update_demand(self, time_tick, serviced):
+        """Apply every demand source for one tick; serviced is a bool grid of cells being serviced."""
+        before = self.click_events.total_added
+        xs, ys = self.click_events.apply(self.demand_map, serviced)
+        self.demand_added += self.click_events.total_added - before
+        self.assigner.index.set_many(xs, ys, self.demand_map[xs, ys])
+
+    def assign_unique_targets(self):
+        return self.assigner.assign(self.taxis)
+
+    def service_demand(self, servicing):
+        """
+        Wear down demand under SERVICING taxis; return the ones whose cell is
+        used up (they drop off next), in fleet order.
+        """
+        taxis, demand_map, reduction = self.taxis, self.demand_map, self.demand_reduction_per_tick
+        sx, sy = taxis.x[servicing], taxis.y[servicing]
+        if len(set(zip(sx.tolist(), sy.tolist()))) < len(servicing):
+            # Two taxis on one cell: the later one sees the earlier one's update
+            finished = []
+            for i, x, y in zip(servicing.tolist(), sx.tolist(), sy.tolist()):
+                if demand_map[x,y]>0:
+                    left = max(0,demand_map[x,y]-reduction)
+                    self.demand_served += demand_map[x,y] - left
+                    demand_map[x,y]=left
+                    self.assigner.index.set(x, y, left)
+                else:
+                    finished.append(i)
+            return finished
+        level = demand_map[sx, sy]
+        busy = level > 0
+        left = np.maximum(0, level[busy] - reduction)
+        self.demand_served += float((level[busy] - left).sum())
+        demand_map[sx[busy], sy[busy]] = left
+        self.assigner.index.set_many(sx[busy], sy[busy], left)
+        return servicing[~busy].tolist()
+
+    # -------- trajectory log --------
+    def open_log(self, path, flush_interval=None):
+        """
+        .csv paths keep the time,taxi_id,x,y text; anything else gets a binary
+        .trj log. flush_interval: see TrajectorySink.
+        """
+        self.close_log()
+        self.trajectory_sink = open_sink(path, flush_interval=flush_interval)
+
+    def close_log(self):
+        if self.trajectory_sink is not None:
+            self.trajectory_sink.close()
+        self.trajectory_sink = None
+
+    # -------- stepping --------
+    def step(self, time_tick):
+        prof = self.profiler
+        with prof.phase("tick"):
+            taxis = self.taxis
+            with prof.phase("update_demand"):
+                servicing = taxis.indices(SERVICING)
+                serviced = np.zeros((self.width, self.height), dtype=bool)
+                serviced[taxis.x[servicing], taxis.y[servicing]] = True
+                self.update_demand(time_tick, serviced)
+
+            # Moves and arrivals for the whole fleet in one go
+            with prof.phase("move"):
+                taxis.move()
+                taxis.arrive()
+
+            with prof.phase("service"):
+                servicing = taxis.indices(SERVICING)
+                if len(servicing):
+                    for i in self.service_demand(servicing):
+                        self.finish_service(i)
+
+            if self.trajectory_sink is not None:
+                with prof.phase("log"):
+                    self.trajectory_sink.record(time_tick, taxis.x, taxis.y, taxis.state)
+            self.state_ticks += np.bincount(taxis.state, minlength=len(STATE_NAMES))
+            self.ticks += 1
+
+            with prof.phase("assign"):
+                assignments = self.assign_unique_targets()
+            with prof.phase("dispatch"):
+                self.dispatch(assignments)
+            prof.count("ticks")
+
+    def finish_service(self, i):
+        """Taxi i used up its cell: record the service and send it to a random drop-off."""
+        taxis = self.taxis
+        x, y = int(taxis.x[i]), int(taxis.y[i])
+        self.demand_history_map[x,y]+=1
+        self.services += 1
+        taxis.last_x[i], taxis.last_y[i] = x, y
+        drop_x, drop_y = self.rng.choice(self.road_positions)
+        taxis.set_destination(i, drop_x, drop_y)
+        taxis.state[i] = DROPPING_OFF if taxis.path_length(i) else IDLE
+
+    def dispatch(self, assignments):
+        taxis = self.taxis
+        for (tx,ty), taxi, new_state in assignments:
+            taxis.set_destination(taxi.i, tx, ty)
+            taxis.state[taxi.i] = STATE_CODES[new_state] if taxis.path_length(taxi.i) else IDLE
+        prof = self.profiler
+        if prof.enabled:
+            roaming = sum(1 for _, _, new_state in assignments if new_state == "ROAMING")
+            prof.count("assignments", len(assignments) - roaming)
+            prof.count("roams", roaming)
+
+    def _serviced_cells(self):
+        servicing = self.taxis.indices(SERVICING)
+        if len(servicing) == 0:
+            return None
+        serviced = np.zeros((self.width, self.height), dtype=bool)
+        serviced[self.taxis.x[servicing], self.taxis.y[servicing]] = True
+        return serviced
+
+    def run_events(self, time_tick, stop, demand, deadline=None):
+        """
+        Event-driven run of ticks time_tick .. stop-1, with the same results
+        as demand.events_for(tick) + step(tick) for each of them (metrics,
+        random streams, logged rows and end state).
+
+        Every taxi has one pending event in a heap: the tick its route ends,
+        or the next tick while it is idle or servicing. On a tick only the
+        taxis due are moved (Fleet.catch_up) and re-stated; the rest are left
+        behind on their routes until their own event. Ticks with no taxi due
+        only apply demand sources and log rows; with no source live and no
+        log open, the run jumps straight to the next event or demand arrival.
+        Servicing stays one pass over all servicing taxis per tick, so
+        demand_served adds up in step()'s order.
+
+        Returns (tick reached, ticks with events); the tick is short of stop
+        only if the perf_counter() deadline passed. The fleet is caught up
+        on return.
+        """
+        taxis, sink, prof = self.taxis, self.trajectory_sink, self.profiler
+        n_states = len(STATE_NAMES)
+        arrivals = hasattr(demand, "next_tick")
+        # Taxi i is up to date as of the end of tick synced[i]
+        synced = np.full(len(taxis), time_tick - 1, dtype=np.int64)
+        moving = MOVING[taxis.state]
+        due = np.where(moving, time_tick - 1 + taxis.path_end - taxis.path_pos, time_tick)
+        heap = list(zip(np.maximum(due, time_tick).tolist(), range(len(taxis))))
+        heapq.heapify(heap)
+        serviced = self._serviced_cells()
+        counts = np.bincount(taxis.state, minlength=n_states)
+        t, handled = time_tick, 0
+        while t < stop:
+            end = min(heap[0][0], stop) if heap else stop
+            if t < end:
+                # Nobody due: demand and log only
+                tick = t
+                while tick < end:
+                    if arrivals and sink is None and not len(self.click_events):
+                        if demand.next_tick > tick:
+                            tick = min(end, demand.next_tick)
+                            continue
+                    self.click_events.extend(demand.events_for(tick))
+                    if len(self.click_events):
+                        self.update_demand(tick, serviced)
+                    if sink is not None:
+                        x, y = taxis.positions_ahead(np.where(moving, tick - synced, 0))
+                        sink.record(tick, x, y, taxis.state)
+                    tick += 1
+                self.state_ticks += (end - t) * counts
+                self.ticks += end - t
+                prof.count("skipped_ticks", end - t)
+                t = end
+            else:
+                due_now = []
+                while heap and heap[0][0] == t:
+                    due_now.append(heapq.heappop(heap)[1])
+                due_now = np.array(sorted(due_now), dtype=np.int64)
+                self.click_events.extend(demand.events_for(t))
+                if len(self.click_events):
+                    self.update_demand(t, serviced)
+
+                arrived = due_now[moving[due_now]]
+                taxis.catch_up(arrived, t - synced[arrived])
+                synced[due_now] = t
+                taxis.state[arrived] = np.where(taxis.state[arrived] == EN_ROUTE, SERVICING, IDLE)
+
+                states = taxis.state[due_now]
+                if (states == SERVICING).any():
+                    for i in self.service_demand(taxis.indices(SERVICING)):
+                        self.finish_service(i)
+                    states = taxis.state[due_now]
+                moving[due_now] = MOVING[states]
+                if sink is not None:
+                    x, y = taxis.positions_ahead(np.where(moving, t - synced, 0))
+                    sink.record(t, x, y, taxis.state)
+                self.state_ticks += np.bincount(taxis.state, minlength=n_states)
+                self.ticks += 1
+                # Idle taxis are always due, so there is nothing to assign otherwise
+                if (states == IDLE).any():
+                    self.dispatch(self.assign_unique_targets())
+                    states = taxis.state[due_now]
+                    moving[due_now] = MOVING[states]
+
+                for i, busy in zip(due_now.tolist(), moving[due_now].tolist()):
+                    heapq.heappush(heap, (t + taxis.path_length(i) if busy else t + 1, i))
+                if (states == SERVICING).any() or serviced is not None:
+                    serviced = self._serviced_cells()
+                counts = np.bincount(taxis.state, minlength=n_states)
+                handled += 1
+                t += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+        behind = np.where(moving, t - 1 - synced, 0)
+        lag = np.nonzero(behind)[0]
+        taxis.catch_up(lag, behind[lag])
+        prof.count("event_ticks", handled)
+        return t, handled
+
+    def run_headless(self, max_ticks=None, max_seconds=None, demand=None, log_path=None, seed=None,
+                     events=False, start_tick=0, checkpoint=None, checkpoint_every=None):
+        """
+        Run step() as fast as the CPU allows, from start_tick (e.g. the tick
+        a restored snapshot was taken at).
+        Stops at tick max_ticks and/or after max_seconds of wall clock.
+        events=True runs event-driven (run_events) with identical results.
+        With checkpoint and checkpoint_every set, the full state is saved to
+        that path every checkpoint_every ticks and at the end (snapshot.py).
+        Returns {"ticks", "seconds", "ticks_per_second", "stepped"}.
+        """
+        if max_ticks is None and max_seconds is None:
+            raise ValueError("run_headless needs max_ticks or max_seconds")
+        if seed is not None:
+            self.reset(seed)
+        if demand is None:
+            demand = ScriptedDemand(seed=seed)
+        if demand.cells is None:
+            demand.cells = self.road_positions
+        if log_path:
+            self.open_log(log_path)
+
+        save = None
+        if checkpoint and checkpoint_every:
+            from snapshot import save  # snapshot.py imports this module
+        time_tick = start_tick
+        stepped = 0  # ticks that went through step(), or had events with events=True
+        start = time.perf_counter()
+        deadline = None if max_seconds is None else start + max_seconds
+        try:
+            while max_ticks is None or time_tick < max_ticks:
+                if events:
+                    stop = (1 << 62) if max_ticks is None else max_ticks
+                    if save is not None:
+                        # Land exactly on checkpoint ticks
+                        stop = min(stop, time_tick + checkpoint_every - time_tick % checkpoint_every)
+                    time_tick, handled = self.run_events(time_tick, stop, demand, deadline)
+                    stepped += handled
+                else:
+                    self.click_events.extend(demand.events_for(time_tick))
+                    self.step(time_tick)
+                    time_tick += 1
+                    stepped += 1
+                if save is not None and time_tick % checkpoint_every == 0:
+                    save(self, checkpoint, time_tick, demand)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+        finally:
+            if log_path:
+                self.close_log()
+        if save is not None and time_tick % checkpoint_every:
+            save(self, checkpoint, time_tick, demand)
+        elapsed = time.perf_counter() - start
+        return {"ticks": time_tick - start_tick, "seconds": elapsed, "stepped": stepped,
+                "ticks_per_second": (time_tick - start_tick) / elapsed if elapsed > 0 else float("inf")}
+
+    # -------- results --------
+    def metrics(self):
+        """Service metrics since the last reset."""
+        taxi_ticks = max(1, int(self.state_ticks.sum()))
+        out = {"ticks": self.ticks, "taxis": len(self.taxis), "services": self.services,
+               "demand_added": self.demand_added, "demand_served": self.demand_served,
+               "served_fraction": self.demand_served / self.demand_added if self.demand_added else 0.0,
+               "outstanding_demand": float(self.demand_map.sum())}
+        for code, name in enumerate(STATE_NAMES):
+            out[name.lower() + "_fraction"] = int(self.state_ticks[code]) / taxi_ticks
+        return out
+
+
+# ---------------- SCRIPTED DEMAND ----------------
+# A run is usually given one seed for both the Simulation and its demand.
+# Seeding both random.Random streams with the same value would make the
+# demand draws mirror the fleet's, so the demand stream is seeded from an
+# independent child of the run seed instead.
+DEMAND_STREAM = 1
+
+
+def stream_seed(seed, stream):
+    """Seed for child stream `stream` of a run seed (None stays None)."""
+    if seed is None:
+        return None
+    return int(np.random.SeedSequence(seed).spawn(stream + 1)[stream].generate_state(1)[0])
+
+
+class ScriptedDemand:
+    """
+    Stand-in for mouse clicks in headless runs: demand events arrive at random
+    road cells, on average `rate` per tick. Uses its own RNG so the arrival
+    schedule is fixed by the seed and can be peeked ahead (next_tick); the
+    same seed as the Simulation's still gives an independent stream.
+    cells defaults to the road cells of the simulation it is run in.
+    """
+    def __init__(self, rate=0.2, intensity=15, duration=20, seed=None, cells=None):
+        self.rate = rate
+        self.intensity = intensity
+        self.duration = duration
+        self.cells = cells
+        self.rng = random.Random(stream_seed(seed, DEMAND_STREAM))
+        self.next_tick = self._gap(0)
+
+    def reseed(self, seed, time_tick=0):
+        """Start a fresh arrival schedule from time_tick, as if created with seed."""
+        self.rng.seed(stream_seed(seed, DEMAND_STREAM))
+        self.next_tick = self._gap(time_tick)
+
+    def _gap(self, tick):
+        if self.rate <= 0:
+            return float("inf")
+        # Exponential inter-arrival times -> Poisson arrivals per tick
+        return tick + int(self.rng.expovariate(self.rate))
+
+    def events_for(self, time_tick):
+        events = []
+        while self.next_tick <= time_tick:
+            x, y = self.rng.choice(self.cells)
+            events.append({"x":x,"y":y,"intensity":self.intensity,
+                           "duration":self.duration,"ticks":0})
+            self.next_tick = self._gap(self.next_tick)
+        return events
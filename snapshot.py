@@ -0,0 +1,197 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np # type: ignore
+
+from simulation import Simulation, ScriptedDemand
+
+# ---------------- SIMULATION SNAPSHOTS ----------------
+# The full state of a Simulation (grid, demand maps, demand sources, fleet,
+# counters and both random streams, plus the scripted demand generator and
+# the tick to resume from) in one binary file:
+#
+#   8 bytes   magic "TAXISNAP"
+#   u32, u32  format version, header length
+#   header    JSON: scalars and {array name: [dtype, shape, offset]}
+#   blobs     raw array bytes, each starting on a 64-byte boundary
+#
+# load() maps the file copy-on-write and wraps the blobs with np.frombuffer,
+# so restoring reads no more than the pages the run touches and never
+# modifies the file. Forked variants (fork()) share those pages until they
+# diverge.
+#
+#   python basic.py --headless --ticks 100000 --checkpoint run.snap --checkpoint-every 5000
+#   python basic.py --headless --ticks 100000 --resume run.snap   # after a crash
+#   python snapshot.py run.snap                                   # what's in it
+
+MAGIC = b"TAXISNAP"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+# -------- file format --------
+def write_arrays(path, meta, arrays):
+    """Write meta (JSON-able) and {name: array}; replaces path atomically."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    table, offset = {}, 0
+    for name, a in arrays.items():
+        table[name] = [a.dtype.str, list(a.shape), offset]
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"meta": meta, "arrays": table}).encode()
+    # Blob offsets count from the first aligned byte after the header
+    start = -(-(_PREFIX.size + len(header)) // ALIGN) * ALIGN
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, a in arrays.items():
+            f.seek(start + table[name][2])
+            f.write(a.data)
+        f.truncate(start + offset)
+    # A crash mid-write leaves the previous checkpoint in place
+    os.replace(tmp, path)
+
+
+def read_arrays(path):
+    """(meta, {name: array}); arrays are copy-on-write views of the mapped file."""
+    with open(path, "rb") as f:
+        magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a simulation snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: snapshot format {version}, expected {FORMAT_VERSION}")
+        header = json.loads(f.read(header_len))
+        size = os.fstat(f.fileno()).st_size
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) if size else b""
+    start = -(-(_PREFIX.size + header_len) // ALIGN) * ALIGN
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if count == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = np.frombuffer(buf, dtype, count, start + offset).reshape(shape)
+    return header["meta"], arrays
+
+
+# -------- random streams --------
+def _py_rng_state(rng):
+    version, internal, gauss = rng.getstate()
+    return {"version": version, "gauss_next": gauss}, np.array(internal, dtype=np.uint32)
+
+
+def _set_py_rng(rng, meta, internal):
+    rng.setstate((meta["version"], tuple(int(v) for v in internal), meta["gauss_next"]))
+
+
+# -------- simulation state --------
+def save(sim, path, time_tick=0, demand=None):
+    """Snapshot sim (and the demand generator feeding it) to resume at time_tick."""
+    rng_meta, rng_internal = _py_rng_state(sim.rng)
+    kind, keys, pos, has_gauss, cached_gauss = sim.np_rng.get_state()
+    meta = {"created": time.time(), "time_tick": int(time_tick),
+            "width": sim.width, "height": sim.height,
+            "demand_reduction_per_tick": sim.demand_reduction_per_tick,
+            "assignment_mode": sim.assigner.mode, "demand_weight": sim.assigner.demand_weight,
+            "ticks": sim.ticks, "services": sim.services,
+            "demand_added": sim.demand_added, "demand_served": sim.demand_served,
+            "demand_total_added": sim.click_events.total_added,
+            "rng": rng_meta,
+            "np_rng": {"kind": kind, "pos": int(pos), "has_gauss": int(has_gauss),
+                       "cached_gaussian": float(cached_gauss)}}
+    arrays = {"roads": np.asarray(sim.roads), "demand_map": sim.demand_map,
+              "demand_history_map": sim.demand_history_map, "state_ticks": sim.state_ticks,
+              "rng_internal": rng_internal, "np_rng_keys": keys}
+    arrays.update({"sources." + k: v for k, v in sim.click_events.columns().items()})
+    arrays.update({"fleet." + k: v for k, v in sim.taxis.arrays().items()})
+    if demand is not None:
+        demand_meta, demand_internal = _py_rng_state(demand.rng)
+        meta["demand"] = {"rate": demand.rate, "intensity": demand.intensity,
+                          "duration": demand.duration, "next_tick": demand.next_tick,
+                          "rng": demand_meta}
+        arrays["demand.rng_internal"] = demand_internal
+        # Default cells (the road cells) are rebuilt on load
+        if demand.cells is not None and demand.cells is not sim.road_positions:
+            arrays["demand.cells"] = np.array(demand.cells, dtype=np.int32).reshape(-1, 2)
+    write_arrays(path, meta, arrays)
+    return path
+
+
+def load(path, profiler=None):
+    """
+    Restore a snapshot: returns (sim, time_tick, demand). demand is the
+    ScriptedDemand saved with it (None if there was none); continuing with
+    both gives exactly the run that was snapshotted.
+    """
+    meta, arrays = read_arrays(path)
+    sim = Simulation(meta["width"], meta["height"], 0, horizontal_roads=(), vertical_roads=(),
+                     demand_reduction_rate=meta["demand_reduction_per_tick"], ticks_per_second=1,
+                     assignment_mode=meta["assignment_mode"], profiler=profiler)
+    sim.assigner.demand_weight = meta["demand_weight"]
+
+    # Roads first: road_positions keeps __init__'s order (x, then y)
+    sim.roads[:] = arrays["roads"]
+    sim.road_positions = list(zip(*(a.tolist() for a in np.nonzero(arrays["roads"]))))
+    sim.rebuild_router()
+
+    sim.demand_map = arrays["demand_map"]
+    sim.demand_history_map = arrays["demand_history_map"]
+    sim.assigner.index.rebuild(sim.demand_map)
+    sim.click_events.load_columns({k[len("sources."):]: v for k, v in arrays.items()
+                                   if k.startswith("sources.")}, meta["demand_total_added"])
+    sim.taxis.load_arrays({k[len("fleet."):]: v for k, v in arrays.items() if k.startswith("fleet.")})
+
+    sim.ticks, sim.services = meta["ticks"], meta["services"]
+    sim.demand_added, sim.demand_served = meta["demand_added"], meta["demand_served"]
+    sim.state_ticks = arrays["state_ticks"]
+    _set_py_rng(sim.rng, meta["rng"], arrays["rng_internal"])
+    np_meta = meta["np_rng"]
+    sim.np_rng.set_state((np_meta["kind"], arrays["np_rng_keys"], np_meta["pos"],
+                          np_meta["has_gauss"], np_meta["cached_gaussian"]))
+
+    demand = None
+    if "demand" in meta:
+        d = meta["demand"]
+        cells = arrays.get("demand.cells")
+        demand = ScriptedDemand(d["rate"], d["intensity"], d["duration"],
+                                cells=sim.road_positions if cells is None else [tuple(c) for c in cells.tolist()])
+        _set_py_rng(demand.rng, d["rng"], arrays["demand.rng_internal"])
+        demand.next_tick = d["next_tick"]
+    return sim, meta["time_tick"], demand
+
+
+def fork(path, seeds, profiler=None):
+    """
+    One restored (sim, time_tick, demand) per seed, for what-if runs from a
+    warm state. A seed of None continues the snapshot's own random streams;
+    any other seed reseeds the simulation and its demand so the variants
+    diverge from the snapshot tick on.
+    """
+    variants = []
+    for seed in seeds:
+        sim, time_tick, demand = load(path, profiler)
+        if seed is not None:
+            sim.rng.seed(seed)
+            sim.np_rng.seed(seed)
+            if demand is not None:
+                demand.reseed(seed, time_tick)
+        variants.append((sim, time_tick, demand))
+    return variants
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show what a simulation snapshot holds")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    meta, arrays = read_arrays(args.path)
+    print(f"{args.path}: tick {meta['time_tick']}, {meta['width']}x{meta['height']} grid, "
+          f"{len(arrays['fleet.x'])} taxis, {len(arrays['sources.x'])} demand sources, "
+          f"{meta['services']} services, saved {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta['created']))}")
+    for name, a in arrays.items():
+        print(f"  {name:<24}{str(a.dtype):>9}  {str(a.shape):<14}{a.nbytes:>12,} bytes")
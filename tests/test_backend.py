@@ -0,0 +1,34 @@
+import pytest
+
+Backend = pytest.importorskip("Backend")
+
+
+@pytest.fixture(scope="module")
+def client():
+    return Backend.app.test_client()
+
+
+@pytest.mark.parametrize("body", [
+    ["not", "an", "object"],
+    {"product": ["Monday"]},
+    {"product": {"day": "Monday"}},
+    {"queries": {"day": "Monday"}},
+    {"queries": ["Monday"]},
+    {"queries": [{}], "top_k": "a"},
+    {"queries": [{}], "top_k": None},
+])
+def test_predict_batch_rejects_malformed_input(client, body):
+    resp = client.post("/predict/batch", json=body)
+    assert resp.status_code == 400
+    assert "error" in resp.get_json()
+
+
+@pytest.mark.parametrize("top_k, expected", [(0, 1), (-3, 1), (2, 2), (10**9, None)])
+def test_predict_batch_clamps_top_k(client, top_k, expected):
+    expected = len(Backend.CANDIDATES) if expected is None else expected
+    resp = client.post("/predict/batch", json={"product": {"day": ["Monday", "Sunday"], "time": ["36"]},
+                                               "top_k": top_k})
+    assert resp.status_code == 200
+    out = resp.get_json()
+    assert out["day"] == ["Monday", "Sunday"]
+    assert [len(row) for row in out["top_idx"]] == [expected, expected]
@@ -0,0 +1,39 @@
+import os
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from demand_table import DemandTable
+from encoders import CompiledEncoder
+
+DAYS, TIMES, TYPES = ["Monday", "Tuesday"], ["0", "1", "2"], ["Mall", "Metro"]
+
+
+def _fit(high_day):
+    """Temporal-only model: "High" (class 1) on every slot of high_day."""
+    X = np.array([(d, t, ty) for d in range(2) for t in range(3) for ty in range(2)])
+    y = (X[:, 0] == high_day).astype(int)
+    return RandomForestClassifier(n_estimators=5, bootstrap=False, random_state=0).fit(X, y)
+
+
+def test_table_reloads_when_the_model_pickle_changes(tmp_path):
+    encoders = [CompiledEncoder(LabelEncoder().fit(values)) for values in (DAYS, TIMES, TYPES)]
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(_fit(high_day=0), model_path)
+    table = DemandTable(model_path, *encoders, high_idx=1, candidates=[(40.7, -73.9)],
+                        check_interval=0)
+    assert table.lookup("Monday", "1", "Mall")[0] == 1.0
+    assert table.lookup("Tuesday", "1", "Mall")[0] == 0.0
+    assert not table.maybe_refresh()  # nothing changed on disk
+
+    # A retrain in place; bump the mtime in case the clock didn't tick
+    st = os.stat(model_path)
+    joblib.dump(_fit(high_day=1), model_path)
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    assert table.maybe_refresh()
+    assert table.lookup("Monday", "1", "Mall")[0] == 0.0
+    assert table.lookup("Tuesday", "1", "Mall")[0] == 1.0
+    assert table.last_error is None
@@ -0,0 +1,21 @@
+import joblib
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+from encoders import export_classes, load_encoder
+
+
+def test_object_dtype_encoder_round_trips_through_mmap(tmp_path):
+    # Encoders fitted on pandas columns carry object-dtype classes_
+    le = LabelEncoder().fit(np.array(["Low", "High", "Low"], dtype=object))
+    assert le.classes_.dtype == object
+    pkl = tmp_path / "label_encoder_label.pkl"
+    joblib.dump(le, pkl)
+
+    enc = load_encoder(str(pkl), mmap=True)
+
+    assert enc.classes_.tolist() == ["High", "Low"]
+    assert enc.encode_one("Low") == le.transform(["Low"])[0]
+    assert enc.encode(["High", "Low"]).tolist() == le.transform(["High", "Low"]).tolist()
+    # The exported file is reused, not rewritten, on the next load
+    assert export_classes(str(pkl)) == export_classes(str(pkl))
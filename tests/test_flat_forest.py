@@ -0,0 +1,23 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from flat_forest import FlatForest
+
+
+def test_predict_proba_matches_sklearn_bit_for_bit(tmp_path):
+    rng = np.random.RandomState(0)
+    # Encoded-style integer features, so test rows land exactly on thresholds too
+    X = rng.randint(0, 10, (400, 4)).astype(float)
+    y = rng.randint(0, 3, 400)
+    forest = RandomForestClassifier(n_estimators=7, random_state=0).fit(X, y)
+    flat = FlatForest.from_sklearn(forest)
+    flat.save(str(tmp_path / "model.flat"))
+    mapped = FlatForest.load(str(tmp_path / "model.flat"), mmap=True)
+
+    X_test = np.vstack([X[:50], rng.rand(200, 4) * 10])
+    expected = forest.predict_proba(X_test)
+
+    assert np.array_equal(flat.predict_proba(X_test), expected)
+    assert np.array_equal(mapped.predict_proba(X_test), expected)
+    assert np.array_equal(mapped.predict(X_test), forest.predict(X_test))
+    assert np.array_equal(flat.predict_proba(X_test[0]), forest.predict_proba(X_test[:1]))
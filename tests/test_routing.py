@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from routing import RoadGrid, RouteCache
+
+
+def _setitem(roads):
+    roads[0, 0] = True
+
+
+def _view_setitem(roads):
+    roads[:, 3][5] = False
+
+
+def _inplace_operator(roads):
+    roads &= np.ones(roads.shape, dtype=bool)
+
+
+def _ufunc_out(roads):
+    np.logical_or(roads, False, out=roads)
+
+
+def _copyto(roads):
+    np.copyto(roads, np.zeros(roads.shape, dtype=bool))
+
+
+def _putmask(roads):
+    np.putmask(roads, np.eye(*roads.shape, dtype=bool), True)
+
+
+def _fill(roads):
+    roads.fill(True)
+
+
+def _put(roads):
+    roads.put([0], [True])
+
+
+@pytest.mark.parametrize("write", [_setitem, _view_setitem, _inplace_operator, _ufunc_out,
+                                   _copyto, _putmask, _fill, _put])
+def test_route_cache_is_invalidated_by_road_grid_writes(write):
+    roads = RoadGrid((10, 10))
+    roads[:, 3] = True
+    cache = RouteCache(roads)
+    calls = []
+
+    def compute(start, end):
+        calls.append((start, end))
+        return [start, end]
+
+    cache.get((0, 3), (9, 3), compute)
+    cache.get((0, 3), (9, 3), compute)
+    assert len(calls) == 1
+
+    write(roads)
+    cache.get((0, 3), (9, 3), compute)
+    assert len(calls) == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_reads_keep_the_route_cache():
+    roads = RoadGrid((10, 10))
+    roads[:, 3] = True
+    cache = RouteCache(roads)
+    cache.get((0, 3), (9, 3), lambda s, e: [s, e])
+
+    # New arrays computed from the grid are not edits of it
+    _ = roads & np.ones(roads.shape, dtype=bool)
+    _ = np.copy(roads)
+    _ = roads.sum()
+    cache.get((0, 3), (9, 3), lambda s, e: pytest.fail("cache was cleared"))
+    assert cache.stats()["invalidations"] == 0
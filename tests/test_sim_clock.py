@@ -0,0 +1,28 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from sim_clock import SharedClock
+
+CLAIMS = 200
+
+
+def _claim(path):
+    clock = SharedClock(path)
+    return [clock.advance() for _ in range(CLAIMS)] + [clock.advance(3)]
+
+
+def test_ticks_are_unique_and_increasing_across_processes(tmp_path):
+    path = str(tmp_path / "clock.sqlite")
+    SharedClock(path, reset=True)
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        runs = list(pool.map(_claim, [path] * 4))
+
+    for ticks in runs:
+        assert all(a < b for a, b in zip(ticks, ticks[1:]))
+    # Every tick is handed out exactly once; advance(3) claims three at a time
+    claimed = []
+    for ticks in runs:
+        *singles, batch = ticks
+        claimed += singles + [batch, batch + 1, batch + 2]
+    assert sorted(claimed) == list(range(4 * (CLAIMS + 3)))
+    assert SharedClock(path).peek() == 4 * (CLAIMS + 3)
@@ -0,0 +1,55 @@
+import filecmp
+
+import numpy as np
+import pytest
+
+import snapshot
+from simulation import ScriptedDemand, Simulation
+
+FLEET_ARRAYS = ("x", "y", "state", "dest_x", "dest_y", "trail", "trail_len")
+
+
+def _assert_same_run(a, b):
+    assert a.metrics() == b.metrics()
+    assert a.rng.getstate() == b.rng.getstate()
+    for x, y in zip(a.np_rng.get_state(), b.np_rng.get_state()):
+        assert np.array_equal(x, y)
+    for name in FLEET_ARRAYS:
+        assert np.array_equal(getattr(a.taxis, name), getattr(b.taxis, name)), name
+    assert np.array_equal(a.taxis.arrays()["route_x"], b.taxis.arrays()["route_x"])
+    assert np.array_equal(a.demand_map, b.demand_map)
+
+
+@pytest.mark.parametrize("mode, n_taxis, rate", [
+    ("greedy", 10, 0.0),
+    ("greedy", 10, 1.5),
+    ("nearest", 40, 0.5),
+    ("optimal", 5, 0.2),
+])
+def test_event_mode_matches_the_tick_loop(tmp_path, mode, n_taxis, rate):
+    runs = {}
+    for events in (False, True):
+        sim = Simulation(n_taxis=n_taxis, seed=3, assignment_mode=mode)
+        log = tmp_path / f"events_{events}.trj"
+        sim.run_headless(800, demand=ScriptedDemand(rate=rate, seed=3), log_path=str(log), events=events)
+        runs[events] = sim, log
+
+    (ticked, ticked_log), (evented, evented_log) = runs[False], runs[True]
+    _assert_same_run(evented, ticked)
+    assert filecmp.cmp(evented_log, ticked_log, shallow=False)
+
+
+@pytest.mark.parametrize("events", [False, True])
+def test_snapshot_resume_continues_identically(tmp_path, events):
+    straight = Simulation(n_taxis=12, seed=4, assignment_mode="nearest")
+    straight.run_headless(600, demand=ScriptedDemand(rate=0.5, seed=4), events=events)
+
+    first = Simulation(n_taxis=12, seed=4, assignment_mode="nearest")
+    path = str(tmp_path / "run.snap")
+    first.run_headless(250, demand=ScriptedDemand(rate=0.5, seed=4), events=events,
+                       checkpoint=path, checkpoint_every=100)
+    resumed, tick, demand = snapshot.load(path)
+    assert tick == 250
+    resumed.run_headless(600, demand=demand, events=events, start_tick=tick)
+
+    _assert_same_run(resumed, straight)
@@ -0,0 +1,228 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+import numpy as np # type: ignore
+
+# -----------------------------
+# Trajectory logging
+# -----------------------------
+# step_simulation hands each tick's fleet arrays to a sink, which copies
+# them into a chunk buffer. Full chunks go to a background writer thread, so
+# the simulation never waits on disk. A chunk holds CHUNK_ROWS positions,
+# which a 10-taxi window at 2 ticks/s takes hours to fill, so sinks can also
+# hand off whatever is buffered every flush_interval seconds.
+#
+# Binary format (.trj): consecutive .npy records, one per chunk. Each record
+# is a structured array with one row per tick:
+#   time   int32
+#   x, y   coordinates of every taxi, (n_taxis,) of COORD_DTYPE
+#   state  fleet state code of every taxi, (n_taxis,) int8
+# The taxi id is the column position. That is 5 bytes per taxi per tick,
+# against ~12 for the CSV text. The number of taxis may differ between
+# records but not within one. Each record can be read on its own with
+# np.load, or in order with read_chunks().
+
+CSV_HEADER = ["time", "taxi_id", "x", "y"]
+COORD_DTYPE = np.int16  # grids up to 32767 cells a side
+CHUNK_ROWS = 1 << 18    # taxi positions buffered before a chunk is handed off
+
+
+def chunk_dtype(n_taxis, coord_dtype=COORD_DTYPE):
+    return np.dtype([("time", "<i4"), ("x", coord_dtype, (n_taxis,)),
+                     ("y", coord_dtype, (n_taxis,)), ("state", "i1", (n_taxis,))])
+
+
+class TrajectorySink:
+    """
+    Base sink: buffers ticks and writes full chunks on a writer thread.
+    Subclasses implement _open(), _write(chunk) and _close(); the last two
+    only ever run on the writer thread. With flush_interval (seconds) set, a
+    partial chunk is also handed off once its first tick is that old.
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, max_pending=4, coord_dtype=COORD_DTYPE,
+                 flush_interval=None):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.coord_dtype = coord_dtype
+        self.flush_interval = flush_interval
+        self._ticks = []  # (time, x, y, state) copies waiting for the next chunk
+        self._rows = 0
+        self._first_at = 0.0  # monotonic time the oldest buffered tick arrived
+        self._n_taxis = None
+        self._error = None
+        self._open()
+        # Bounded: if the disk falls behind, record() blocks instead of
+        # buffering without limit
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._writer, name="trajectory-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, time_tick, x, y, state=None):
+        """Log one tick: x, y (and optionally state) hold one entry per taxi."""
+        if self._error is not None:
+            raise self._error
+        n = len(x)
+        if n != self._n_taxis and self._ticks:
+            self._hand_off()
+        self._n_taxis = n
+        if not self._ticks and self.flush_interval is not None:
+            self._first_at = time.monotonic()
+        self._ticks.append((time_tick, np.array(x, dtype=self.coord_dtype),
+                            np.array(y, dtype=self.coord_dtype),
+                            np.zeros(n, np.int8) if state is None else np.array(state, dtype=np.int8)))
+        self._rows += n
+        if self._rows >= self.chunk_rows:
+            self._hand_off()
+        elif self.flush_interval is not None and time.monotonic() - self._first_at >= self.flush_interval:
+            self._hand_off()
+
+    def _hand_off(self):
+        times, xs, ys, states = zip(*self._ticks)
+        chunk = np.empty(len(times), dtype=chunk_dtype(self._n_taxis, self.coord_dtype))
+        chunk["time"] = times
+        chunk["x"] = np.stack(xs)
+        chunk["y"] = np.stack(ys)
+        chunk["state"] = np.stack(states)
+        self._ticks = []
+        self._rows = 0
+        self._queue.put(chunk)
+
+    def _writer(self):
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None:
+                    self._close()
+                    return
+                if self._error is None:
+                    self._write(chunk)
+            except Exception as exc:  # surfaced on the next record() / close()
+                self._error = exc
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Hand off the partial chunk and wait until everything is written."""
+        if self._ticks:
+            self._hand_off()
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        if self._thread is None:
+            return
+        try:
+            if self._ticks and self._error is None:
+                self._hand_off()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BinarySink(TrajectorySink):
+    """Chunks appended to a .trj file (see the format notes above)."""
+
+    def _open(self):
+        self._file = open(self.path, "wb")
+
+    def _write(self, chunk):
+        np.save(self._file, chunk, allow_pickle=False)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class CsvSink(TrajectorySink):
+    """The original time,taxi_id,x,y CSV, written a chunk at a time."""
+
+    def _open(self):
+        self._file = open(self.path, "w", newline="")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(CSV_HEADER)
+
+    def _write(self, chunk):
+        write_csv_rows(self._csv, chunk)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+def open_sink(path, **kwargs):
+    """CsvSink for *.csv paths, BinarySink for anything else."""
+    cls = CsvSink if path.lower().endswith(".csv") else BinarySink
+    return cls(path, **kwargs)
+
+
+# ---------------- READING / EXPORT ----------------
+def read_chunks(path):
+    """Yield the chunk records of a .trj file in order."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        while f.tell() < size:
+            yield np.load(f, allow_pickle=False)
+
+
+def index_chunks(path):
+    """
+    [(data_offset, dtype, n_ticks)] for every record of a .trj file, read
+    from the .npy headers alone, so chunks can be mapped in any order.
+    """
+    entries = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        while f.tell() < size:
+            version = np.lib.format.read_magic(f)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, _, dtype = read_header(f)
+            offset = f.tell()
+            entries.append((offset, dtype, shape[0]))
+            f.seek(offset + shape[0] * dtype.itemsize)
+    return entries
+
+
+def map_chunk(path, entry):
+    """Read-only memory map of one indexed record."""
+    offset, dtype, n_ticks = entry
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(n_ticks,))
+
+
+def write_csv_rows(writer, chunk):
+    n = chunk["x"].shape[1]
+    times = np.repeat(chunk["time"], n).tolist()
+    ids = np.tile(np.arange(n), len(chunk)).tolist()
+    writer.writerows(zip(times, ids, chunk["x"].ravel().tolist(), chunk["y"].ravel().tolist()))
+
+
+def export_csv(trj_path, csv_path):
+    """Rewrite a .trj log in the time,taxi_id,x,y CSV schema."""
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for chunk in read_chunks(trj_path):
+            write_csv_rows(writer, chunk)
+
+
+if __name__ == "__main__":
+    # python trajectory.py taxi_swarm_log.trj [out.csv]
+    import sys
+    src = sys.argv[1]
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(src)[0] + ".csv"
+    export_csv(src, dst)
+    print(f"✅ CSV written to {dst}")
@@ -0,0 +1,319 @@
+import argparse
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np # type: ignore
+
+from fleet import DROPPING_OFF, IDLE, SERVICING, STATE_NAMES
+from trajectory import index_chunks, map_chunk
+
+# -----------------------------
+# Streaming trajectory analytics
+# -----------------------------
+# Per-taxi totals and a visit heatmap for a trajectory log, read a block of
+# ticks at a time, so memory depends on fleet and grid size, not on how long
+# the run was.
+#
+#   distance        cells travelled (Manhattan steps between logged ticks)
+#   moving / idle   ticks on which the taxi did / didn't change cell
+#   pickups         SERVICING -> anything else (the demand cell is used up)
+#   dropoffs        DROPPING_OFF -> anything else, or SERVICING -> IDLE
+#                   when the drop-off point was the demand cell itself
+#   state_ticks     ticks logged in each fleet state
+#
+# .trj logs carry the fleet state; the CSV schema (time,taxi_id,x,y) does
+# not, so from CSV pickups / dropoffs / state_ticks stay None.
+#
+# Either kind of log can be split across a process pool: .trj logs into
+# runs of chunks, CSV logs into byte ranges that start on a line where a new
+# tick begins. The partial results merge exactly (see TrajectoryStats.merge).
+
+CSV_BLOCK_ROWS = 1 << 18
+
+
+class TrajectoryStats:
+    def __init__(self):
+        self.n_taxis = 0
+        self.ticks = 0
+        self.distance = np.zeros(0, dtype=np.int64)
+        self.moving = np.zeros(0, dtype=np.int64)
+        self.idle = np.zeros(0, dtype=np.int64)
+        self.pickups = None
+        self.dropoffs = None
+        self.state_ticks = None
+        self.heatmap = np.zeros((0, 0), dtype=np.int64)
+        # First and last logged row, (x, y, state); merge() uses them to add
+        # the step between two neighbouring ranges
+        self.first = None
+        self.last = None
+
+    # -------- accumulation --------
+    def _grow(self, n, with_state):
+        if n > self.n_taxis:
+            pad = n - self.n_taxis
+            self.distance = np.pad(self.distance, (0, pad))
+            self.moving = np.pad(self.moving, (0, pad))
+            self.idle = np.pad(self.idle, (0, pad))
+            if self.pickups is not None:
+                self.pickups = np.pad(self.pickups, (0, pad))
+                self.dropoffs = np.pad(self.dropoffs, (0, pad))
+                self.state_ticks = np.pad(self.state_ticks, ((0, pad), (0, 0)))
+            self.n_taxis = n
+        if with_state and self.pickups is None:
+            self.pickups = np.zeros(self.n_taxis, dtype=np.int64)
+            self.dropoffs = np.zeros(self.n_taxis, dtype=np.int64)
+            self.state_ticks = np.zeros((self.n_taxis, len(STATE_NAMES)), dtype=np.int64)
+
+    def _count_steps(self, x, y, state):
+        """Steps between consecutive rows of (T, n) blocks."""
+        n = x.shape[1]
+        dx = np.abs(np.diff(x, axis=0))
+        dy = np.abs(np.diff(y, axis=0))
+        step = dx + dy
+        self.distance[:n] += step.sum(axis=0)
+        moved = (step > 0).sum(axis=0)
+        self.moving[:n] += moved
+        self.idle[:n] += len(step) - moved
+        if state is not None and self.pickups is not None:
+            prev, cur = state[:-1], state[1:]
+            served = (prev == SERVICING) & (cur != SERVICING)
+            self.pickups[:n] += served.sum(axis=0)
+            self.dropoffs[:n] += (((prev == DROPPING_OFF) & (cur != DROPPING_OFF))
+                                  | (served & (cur == IDLE))).sum(axis=0)
+
+    def update(self, x, y, state=None):
+        """Add a block of consecutive ticks: x, y, state are (ticks, n_taxis)."""
+        x = np.asarray(x, dtype=np.int64)
+        y = np.asarray(y, dtype=np.int64)
+        if len(x) == 0:
+            return self
+        state = None if state is None else np.asarray(state, dtype=np.int64)
+        n_rows, n = x.shape
+        self._grow(n, state is not None)
+
+        # Heatmap: one visit per taxi per logged tick
+        width, height = int(x.max(initial=-1)) + 1, int(y.max(initial=-1)) + 1
+        if width > self.heatmap.shape[0] or height > self.heatmap.shape[1]:
+            self.heatmap = np.pad(self.heatmap, ((0, max(0, width - self.heatmap.shape[0])),
+                                                 (0, max(0, height - self.heatmap.shape[1]))))
+        flat = (x * self.heatmap.shape[1] + y).ravel()
+        self.heatmap += np.bincount(flat, minlength=self.heatmap.size).reshape(self.heatmap.shape)
+        if state is not None:
+            self.state_ticks[:n] += np.stack([(state == s).sum(axis=0) for s in range(len(STATE_NAMES))], axis=1)
+
+        # Join onto the previous block through its last row (same fleet only)
+        last_row = (x[-1], y[-1], None if state is None else state[-1])
+        if self.last is not None and len(self.last[0]) == n:
+            px, py, ps = self.last
+            x = np.vstack([px[None], x])
+            y = np.vstack([py[None], y])
+            if state is not None and ps is not None:
+                state = np.vstack([ps[None], state])
+            elif state is not None:
+                state = None  # no state to compare against; skip the transition counts
+        if self.first is None:
+            self.first = (x[0], y[0], None if state is None else state[0])
+        self._count_steps(x, y, state)
+        self.last = last_row
+        self.ticks += n_rows
+        return self
+
+    def merge(self, other):
+        """Fold in the stats of the range that directly follows this one."""
+        if other.n_taxis == 0:
+            return self
+        self._grow(other.n_taxis, other.pickups is not None)
+        n = other.n_taxis
+        self.distance[:n] += other.distance
+        self.moving[:n] += other.moving
+        self.idle[:n] += other.idle
+        if other.pickups is not None:
+            self.pickups[:n] += other.pickups
+            self.dropoffs[:n] += other.dropoffs
+            self.state_ticks[:n] += other.state_ticks
+        h = other.heatmap
+        if h.shape[0] > self.heatmap.shape[0] or h.shape[1] > self.heatmap.shape[1]:
+            self.heatmap = np.pad(self.heatmap, ((0, max(0, h.shape[0] - self.heatmap.shape[0])),
+                                                 (0, max(0, h.shape[1] - self.heatmap.shape[1]))))
+        self.heatmap[:h.shape[0], :h.shape[1]] += h
+        self.ticks += other.ticks
+
+        # The step from our last row to their first was counted by neither side
+        if self.last is not None and other.first is not None and len(self.last[0]) == len(other.first[0]):
+            (px, py, ps), (fx, fy, fs) = self.last, other.first
+            states = None if ps is None or fs is None else np.stack([ps, fs])
+            self._count_steps(np.stack([px, fx]), np.stack([py, fy]), states)
+        if self.first is None:
+            self.first = other.first
+        self.last = other.last
+        return self
+
+    # -------- results --------
+    def per_taxi(self):
+        """One dict per taxi."""
+        rows = []
+        for i in range(self.n_taxis):
+            row = {"taxi_id": i, "distance": int(self.distance[i]),
+                   "moving_ticks": int(self.moving[i]), "idle_ticks": int(self.idle[i])}
+            if self.pickups is not None:
+                row["pickups"] = int(self.pickups[i])
+                row["dropoffs"] = int(self.dropoffs[i])
+                for s, name in enumerate(STATE_NAMES):
+                    row[name.lower() + "_ticks"] = int(self.state_ticks[i, s])
+            rows.append(row)
+        return rows
+
+    def summary(self):
+        out = {"ticks": self.ticks, "taxis": self.n_taxis,
+               "distance": int(self.distance.sum()),
+               "moving_ticks": int(self.moving.sum()), "idle_ticks": int(self.idle.sum())}
+        if self.pickups is not None:
+            out["pickups"] = int(self.pickups.sum())
+            out["dropoffs"] = int(self.dropoffs.sum())
+        return out
+
+
+# ---------------- READERS ----------------
+def _range_stats(path, entries):
+    """Worker: stats for a run of .trj chunks."""
+    stats = TrajectoryStats()
+    for entry in entries:
+        chunk = map_chunk(path, entry)
+        stats.update(chunk["x"], chunk["y"], chunk["state"])
+    return stats
+
+
+def trj_stats(path, workers=1):
+    """Stats for a binary .trj log, optionally split across a process pool."""
+    entries = index_chunks(path)
+    if workers <= 1 or len(entries) < 2:
+        return _range_stats(path, entries)
+    # Contiguous chunk ranges, merged back in order
+    bounds = np.linspace(0, len(entries), min(workers, len(entries)) + 1).astype(int)
+    ranges = [entries[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    total = TrajectoryStats()
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        for part in pool.map(_range_stats, itertools.repeat(path), ranges):
+            total.merge(part)
+    return total
+
+
+def _csv_ticks(rows):
+    """(x, y) blocks of shape (ticks, n_taxis) from time,taxi_id,x,y rows."""
+    t, ids, x, y = rows.T
+    starts = np.flatnonzero(np.r_[True, t[1:] != t[:-1]])
+    n = int(ids.max()) + 1
+    xs = np.zeros((len(starts), n), dtype=np.int64)
+    ys = np.zeros((len(starts), n), dtype=np.int64)
+    tick = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(t)]))
+    xs[tick, ids] = x
+    ys[tick, ids] = y
+    return xs, ys
+
+
+def _lines(f, end):
+    """Lines of binary file f from where it is up to byte offset end (None: to the end)."""
+    pos = f.tell()
+    for line in f:
+        if end is not None and pos >= end:
+            break
+        pos += len(line)
+        yield line.decode()
+
+
+def _csv_bounds(path, parts):
+    """Byte offsets cutting the CSV rows into up to `parts` ranges, each starting a new tick."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()  # header
+        bounds = [f.tell()]
+        for k in range(1, parts):
+            f.seek(max(bounds[-1], size * k // parts))
+            f.readline()  # finish the line the offset landed in
+            # Walk on to the first row of the next tick
+            line = f.readline()
+            tick = line.split(b",", 1)[0]
+            while line:
+                cut = f.tell()
+                line = f.readline()
+                if line.split(b",", 1)[0] != tick:
+                    break
+            if not line:
+                break
+            if cut > bounds[-1]:
+                bounds.append(cut)
+        bounds.append(size)
+    return bounds
+
+
+def _csv_range_stats(path, start, end, block_rows=CSV_BLOCK_ROWS):
+    """Worker: stats for the CSV rows between byte offsets start and end."""
+    stats = TrajectoryStats()
+    with open(path, "rb") as f:
+        f.seek(start)
+        reader = csv.reader(_lines(f, end))
+        carry = np.zeros((0, 4), dtype=np.int64)
+        while True:
+            block = list(itertools.islice(reader, block_rows))
+            rows = np.array(block, dtype=np.int64).reshape(-1, 4)
+            if len(rows):
+                rows = np.concatenate([carry, rows])
+            elif len(carry):
+                rows, carry = carry, np.zeros((0, 4), dtype=np.int64)
+            else:
+                break
+            if block:
+                # The last tick may continue in the next block
+                cut = np.flatnonzero(rows[:, 0] != rows[-1, 0])
+                cut = cut[-1] + 1 if len(cut) else 0
+                rows, carry = rows[:cut], rows[cut:]
+            if len(rows):
+                stats.update(*_csv_ticks(rows))
+    return stats
+
+
+def csv_stats(path, workers=1, block_rows=CSV_BLOCK_ROWS):
+    """
+    Stats for a time,taxi_id,x,y CSV log, streamed block_rows rows at a time,
+    optionally split into byte ranges across a process pool.
+    """
+    bounds = _csv_bounds(path, max(1, workers))
+    if len(bounds) <= 2:
+        return _csv_range_stats(path, bounds[0], None, block_rows)
+    total = TrajectoryStats()
+    with ProcessPoolExecutor(max_workers=len(bounds) - 1) as pool:
+        for part in pool.map(_csv_range_stats, itertools.repeat(path), bounds[:-1], bounds[1:],
+                             itertools.repeat(block_rows)):
+            total.merge(part)
+    return total
+
+
+def log_stats(path, workers=1):
+    if path.lower().endswith(".csv"):
+        return csv_stats(path, workers)
+    return trj_stats(path, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-taxi statistics for a trajectory log")
+    parser.add_argument("log", help=".trj or .csv trajectory log")
+    parser.add_argument("--workers", type=int, default=1, help="processes to split the log across")
+    parser.add_argument("--per-taxi", help="write per-taxi totals to this CSV")
+    parser.add_argument("--heatmap", help="write the cell visit counts to this .npy")
+    args = parser.parse_args()
+
+    stats = log_stats(args.log, args.workers)
+    for key, value in stats.summary().items():
+        print(f"{key:>14}: {value}")
+    if args.per_taxi:
+        rows = stats.per_taxi()
+        with open(args.per_taxi, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["taxi_id"])
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"✅ Per-taxi totals saved to {args.per_taxi}")
+    if args.heatmap:
+        np.save(args.heatmap, stats.heatmap)
+        print(f"✅ Heatmap saved to {args.heatmap}")